@@ -0,0 +1,109 @@
+"""Benchmark EventEnvelope wire codecs.
+
+Compares encode/decode time and payload size of the JSON codec against the
+msgpack codecs for message histories of increasing length. Decode timings
+include pydantic validation of the envelope, since that is what every
+consuming node pays.
+
+Usage:
+    uv run python benchmarks/envelope_codec.py [--sizes 10 100 1000] [--repeat 20]
+"""
+
+import argparse
+import statistics
+import time
+
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+)
+from calfkit.broker.codec import EnvelopeCodec, JSONEnvelopeCodec, MsgPackEnvelopeCodec
+from calfkit.models.event_envelope import EventEnvelope
+
+
+def build_history(size: int) -> list[ModelMessage]:
+    """Build a realistic history: user prompts, tool calls, tool results and replies."""
+    history: list[ModelMessage] = []
+    i = 0
+    while len(history) < size:
+        turn: list[ModelMessage] = [
+            ModelRequest.user_text_prompt(f"What is the price of asset #{i}? " * 4),
+            ModelResponse(
+                parts=[
+                    ToolCallPart(
+                        tool_name="get_price",
+                        args={"symbol": f"ASSET-{i}", "window": "1h"},
+                        tool_call_id=f"call-{i}",
+                    )
+                ]
+            ),
+            ModelRequest(
+                parts=[
+                    ToolReturnPart(
+                        tool_name="get_price",
+                        content={"symbol": f"ASSET-{i}", "prices": [100.0 + j for j in range(24)]},
+                        tool_call_id=f"call-{i}",
+                    )
+                ]
+            ),
+            ModelResponse(parts=[TextPart(f"Asset #{i} traded between 100 and 123. " * 3)]),
+        ]
+        history.extend(turn)
+        i += 1
+    return history[:size]
+
+
+def time_codec(
+    codec: EnvelopeCodec, envelope: EventEnvelope, repeat: int
+) -> tuple[float, float, int]:
+    """Return the median encode time, median decode time (seconds) and payload size."""
+    encode_times: list[float] = []
+    decode_times: list[float] = []
+    payload = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = codec.encode(envelope)
+        encode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        EventEnvelope.model_validate(codec.decode(payload))
+        decode_times.append(time.perf_counter() - start)
+    return statistics.median(encode_times), statistics.median(decode_times), len(payload)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    codecs: list[tuple[str, EnvelopeCodec]] = [("json", JSONEnvelopeCodec())]
+    for name, codec in (
+        ("msgpack", MsgPackEnvelopeCodec()),
+        ("msgpack+zstd", MsgPackEnvelopeCodec(compress=True)),
+    ):
+        try:
+            codec.encode(EventEnvelope())
+        except ImportError as e:
+            print(f"skipping {name}: {e}")
+            continue
+        codecs.append((name, codec))
+
+    header = f"{'messages':>8}  {'codec':<13} {'encode ms':>10} {'decode ms':>10} {'bytes':>10}"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        envelope = EventEnvelope(trace_id="bench", thread_id="bench")
+        envelope.message_history = build_history(size)
+        for name, codec in codecs:
+            encode_s, decode_s, nbytes = time_codec(codec, envelope, args.repeat)
+            timings = f"{encode_s * 1e3:>10.3f} {decode_s * 1e3:>10.3f}"
+            print(f"{size:>8}  {name:<13} {timings} {nbytes:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,25 @@
 from importlib.metadata import version
 
-from calfkit.broker import BrokerClient
+from calfkit.blobs import BlobStore, FileSystemBlobStore, InMemoryBlobStore
+from calfkit.broker import (
+    BrokerClient,
+    EnvelopeCodec,
+    JSONEnvelopeCodec,
+    MsgPackEnvelopeCodec,
+    load_codec,
+    register_codec,
+)
+from calfkit.caches import FileSystemResponseCache, InMemoryResponseCache, ResponseCache
 from calfkit.gates import DecisionGate, GateResult, load_gate, register_gate
-from calfkit.messages import append_system_prompt, patch_system_prompts, validate_tool_call_pairs
+from calfkit.messages import (
+    ContextPolicy,
+    HistoryCompactor,
+    LastTurnsPolicy,
+    SlidingWindowPolicy,
+    append_system_prompt,
+    patch_system_prompts,
+    validate_tool_call_pairs,
+)
 from calfkit.nodes import (
     AgentRouterNode,
     BaseNode,
@@ -16,7 +33,7 @@ from calfkit.nodes import (
     returnpoint,
     subscribe_to,
 )
-from calfkit.providers import OpenAIModelClient
+from calfkit.providers import HedgedModel, OpenAIModelClient, ProviderRateLimiter
 from calfkit.runners import (
     AgentRouterRunner,
     ChatRunner,
@@ -25,19 +42,44 @@ from calfkit.runners import (
     RouterServiceClient,
     ToolRunner,
 )
-from calfkit.stores import InMemoryMessageHistoryStore, MessageHistoryStore
+from calfkit.stores import (
+    CachedMessageHistoryStore,
+    InMemoryMessageHistoryStore,
+    LogStructuredMessageHistoryStore,
+    MessageHistoryStore,
+    ShardedMessageHistoryStore,
+    SQLiteMessageHistoryStore,
+    VersionConflictError,
+)
 
 __version__ = version("calfkit")
 __all__ = [
     "__version__",
+    # blobs
+    "BlobStore",
+    "FileSystemBlobStore",
+    "InMemoryBlobStore",
+    # caches
+    "FileSystemResponseCache",
+    "InMemoryResponseCache",
+    "ResponseCache",
     # broker
     "BrokerClient",
+    "EnvelopeCodec",
+    "JSONEnvelopeCodec",
+    "MsgPackEnvelopeCodec",
+    "load_codec",
+    "register_codec",
     # gates
     "DecisionGate",
     "GateResult",
     "load_gate",
     "register_gate",
     # messages
+    "ContextPolicy",
+    "HistoryCompactor",
+    "LastTurnsPolicy",
+    "SlidingWindowPolicy",
     "append_system_prompt",
     "patch_system_prompts",
     "validate_tool_call_pairs",
@@ -54,7 +96,9 @@ __all__ = [
     "returnpoint",
     "subscribe_to",
     # providers
+    "HedgedModel",
     "OpenAIModelClient",
+    "ProviderRateLimiter",
     # runners
     "AgentRouterRunner",
     "ChatRunner",
@@ -63,6 +107,11 @@ __all__ = [
     "RouterServiceClient",
     "ToolRunner",
     # stores
+    "CachedMessageHistoryStore",
     "InMemoryMessageHistoryStore",
+    "LogStructuredMessageHistoryStore",
     "MessageHistoryStore",
+    "ShardedMessageHistoryStore",
+    "SQLiteMessageHistoryStore",
+    "VersionConflictError",
 ]
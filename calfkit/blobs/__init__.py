@@ -0,0 +1,43 @@
+"""Calf Blob Store System.
+
+Blob stores hold large payloads (images, documents, long tool outputs) that are
+offloaded from event envelopes using the claim-check pattern: the payload is
+written once and the message history only carries a content-addressed reference.
+
+Example:
+    from calfkit.blobs import FileSystemBlobStore
+
+    blob_store = FileSystemBlobStore("/mnt/shared/calfkit-blobs")
+
+    # The router offloads large content before persisting and forwarding it
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        tool_nodes=[read_document],
+        message_history_store=store,
+        blob_store=blob_store,
+    )
+
+    # The chat node resolves references before calling the model
+    chat_node = ChatNode(model_client, blob_store=blob_store)
+"""
+
+from calfkit.blobs.base import BlobStore, content_key
+from calfkit.blobs.claim_check import (
+    BLOB_REF_KEY,
+    has_blob_refs,
+    offload_large_content,
+    resolve_blob_refs,
+)
+from calfkit.blobs.filesystem import FileSystemBlobStore
+from calfkit.blobs.in_memory import InMemoryBlobStore
+
+__all__ = [
+    "BLOB_REF_KEY",
+    "BlobStore",
+    "FileSystemBlobStore",
+    "InMemoryBlobStore",
+    "content_key",
+    "has_blob_refs",
+    "offload_large_content",
+    "resolve_blob_refs",
+]
@@ -0,0 +1,42 @@
+import hashlib
+from abc import ABC, abstractmethod
+
+
+def content_key(data: bytes) -> str:
+    """Content address of a blob: the hex sha256 digest of its bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(ABC):
+    """Abstract content-addressed store for payloads offloaded from event envelopes.
+
+    Blobs are immutable and keyed by their content, so writing the same bytes
+    twice is a no-op and references can be shared freely between messages.
+    """
+
+    @abstractmethod
+    async def put(self, data: bytes) -> str:
+        """Store a blob.
+
+        Args:
+            data: The blob's bytes.
+
+        Returns:
+            The blob's key, as computed by ``content_key``.
+        """
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Load a blob.
+
+        Args:
+            key: The key returned by ``put``.
+
+        Returns:
+            The blob's bytes.
+
+        Raises:
+            KeyError: If no blob with this key exists.
+        """
+        ...
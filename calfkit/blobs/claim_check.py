@@ -0,0 +1,189 @@
+"""Claim-check offloading of large message content.
+
+Content above a size threshold is written once to a BlobStore and replaced in
+the message history by a reference, so it is not re-sent over the broker on
+every hop. Only nodes that need the content (usually the ChatNode) resolve the
+references back into the original content.
+
+References take two shapes:
+
+* ``BinaryContent`` keeps its media type but has empty ``data``, with the blob
+  key stored under ``vendor_metadata[BLOB_REF_KEY]``.
+* Any other ``ToolReturnPart.content`` is replaced by ``{BLOB_REF_KEY: key}``,
+  the blob holding the content serialized as JSON.
+"""
+
+import asyncio
+import dataclasses
+import json
+from typing import Any
+
+import pydantic_core
+
+from calfkit._vendor.pydantic_ai import (
+    BinaryContent,
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from calfkit.blobs.base import BlobStore
+
+BLOB_REF_KEY = "calfkit_blob_ref"
+
+
+def _binary_blob_key(content: BinaryContent) -> str | None:
+    return (content.vendor_metadata or {}).get(BLOB_REF_KEY)
+
+
+def _tool_content_blob_key(content: Any) -> str | None:
+    if isinstance(content, dict) and len(content) == 1:
+        key = content.get(BLOB_REF_KEY)
+        return key if isinstance(key, str) else None
+    return None
+
+
+async def _offload_binary(
+    content: BinaryContent, blob_store: BlobStore, threshold_bytes: int
+) -> BinaryContent:
+    if len(content.data) <= threshold_bytes or _binary_blob_key(content) is not None:
+        return content
+    key = await blob_store.put(content.data)
+    return BinaryContent(
+        data=b"",
+        media_type=content.media_type,
+        vendor_metadata={**(content.vendor_metadata or {}), BLOB_REF_KEY: key},
+    )
+
+
+async def _resolve_binary(content: BinaryContent, blob_store: BlobStore) -> BinaryContent:
+    key = _binary_blob_key(content)
+    if key is None:
+        return content
+    vendor_metadata = {
+        k: v for k, v in (content.vendor_metadata or {}).items() if k != BLOB_REF_KEY
+    }
+    return BinaryContent(
+        data=await blob_store.get(key),
+        media_type=content.media_type,
+        vendor_metadata=vendor_metadata or None,
+    )
+
+
+async def _offload_part(
+    part: ModelRequestPart, blob_store: BlobStore, threshold_bytes: int
+) -> ModelRequestPart:
+    if isinstance(part, UserPromptPart) and not isinstance(part.content, str):
+        content = [
+            await _offload_binary(item, blob_store, threshold_bytes)
+            if isinstance(item, BinaryContent)
+            else item
+            for item in part.content
+        ]
+        return dataclasses.replace(part, content=content)
+    if isinstance(part, ToolReturnPart):
+        if isinstance(part.content, BinaryContent):
+            binary = await _offload_binary(part.content, blob_store, threshold_bytes)
+            return dataclasses.replace(part, content=binary)
+        if _tool_content_blob_key(part.content) is not None:
+            return part
+        serialized = pydantic_core.to_json(part.content)
+        if len(serialized) > threshold_bytes:
+            key = await blob_store.put(serialized)
+            return dataclasses.replace(part, content={BLOB_REF_KEY: key})
+    return part
+
+
+async def _resolve_part(part: ModelRequestPart, blob_store: BlobStore) -> ModelRequestPart:
+    if isinstance(part, UserPromptPart) and not isinstance(part.content, str):
+        content = [
+            await _resolve_binary(item, blob_store) if isinstance(item, BinaryContent) else item
+            for item in part.content
+        ]
+        return dataclasses.replace(part, content=content)
+    if isinstance(part, ToolReturnPart):
+        if isinstance(part.content, BinaryContent):
+            return dataclasses.replace(
+                part, content=await _resolve_binary(part.content, blob_store)
+            )
+        key = _tool_content_blob_key(part.content)
+        if key is not None:
+            return dataclasses.replace(part, content=json.loads(await blob_store.get(key)))
+    return part
+
+
+async def offload_large_content(
+    messages: list[ModelMessage],
+    blob_store: BlobStore,
+    *,
+    threshold_bytes: int,
+) -> list[ModelMessage]:
+    """Replace content larger than ``threshold_bytes`` with blob references.
+
+    Offloads ``BinaryContent`` in user prompts and tool returns, and tool return
+    content whose JSON serialization exceeds the threshold.
+
+    Args:
+        messages: The messages to offload. Not modified.
+        blob_store: Where offloaded content is written.
+        threshold_bytes: Content strictly larger than this is offloaded.
+
+    Returns:
+        The messages, with large content replaced by references.
+    """
+    result: list[ModelMessage] = []
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            parts = [
+                await _offload_part(part, blob_store, threshold_bytes) for part in message.parts
+            ]
+            message = dataclasses.replace(message, parts=parts)
+        result.append(message)
+    return result
+
+
+def _part_has_blob_ref(part: ModelRequestPart) -> bool:
+    if isinstance(part, UserPromptPart) and not isinstance(part.content, str):
+        return any(
+            isinstance(item, BinaryContent) and _binary_blob_key(item) is not None
+            for item in part.content
+        )
+    if isinstance(part, ToolReturnPart):
+        if isinstance(part.content, BinaryContent):
+            return _binary_blob_key(part.content) is not None
+        return _tool_content_blob_key(part.content) is not None
+    return False
+
+
+def has_blob_refs(messages: list[ModelMessage]) -> bool:
+    """Check whether any message holds a reference created by ``offload_large_content``."""
+    return any(
+        isinstance(message, ModelRequest) and any(map(_part_has_blob_ref, message.parts))
+        for message in messages
+    )
+
+
+async def resolve_blob_refs(
+    messages: list[ModelMessage], blob_store: BlobStore
+) -> list[ModelMessage]:
+    """Replace blob references with the content they point to.
+
+    Args:
+        messages: The messages to resolve. Not modified.
+        blob_store: The store the references were written to.
+
+    Returns:
+        The messages, with their original content restored.
+
+    Raises:
+        KeyError: If a referenced blob does not exist in the store.
+    """
+
+    async def resolve_message(message: ModelMessage) -> ModelMessage:
+        if not isinstance(message, ModelRequest) or not any(map(_part_has_blob_ref, message.parts)):
+            return message
+        parts = [await _resolve_part(part, blob_store) for part in message.parts]
+        return dataclasses.replace(message, parts=parts)
+
+    return list(await asyncio.gather(*(resolve_message(message) for message in messages)))
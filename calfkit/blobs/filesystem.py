@@ -0,0 +1,50 @@
+import asyncio
+import os
+import re
+import uuid
+from pathlib import Path
+
+from calfkit.blobs.base import BlobStore, content_key
+
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class FileSystemBlobStore(BlobStore):
+    """Blob store backed by a directory, e.g. on a volume shared by all replicas.
+
+    Blobs are written atomically to ``<root>/<key[:2]>/<key>``.
+    """
+
+    def __init__(self, root: str | os.PathLike[str]):
+        """Initialize a FileSystemBlobStore.
+
+        Args:
+            root: Directory holding the blobs. Created on first write.
+        """
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_PATTERN.fullmatch(key):
+            raise KeyError(key)
+        return self.root / key[:2] / key
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    async def put(self, data: bytes) -> str:
+        key = content_key(data)
+        await asyncio.to_thread(self._write, key, data)
+        return key
+
+    async def get(self, key: str) -> bytes:
+        path = self._path(key)
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError as e:
+            raise KeyError(key) from e
@@ -0,0 +1,21 @@
+from calfkit.blobs.base import BlobStore, content_key
+
+
+class InMemoryBlobStore(BlobStore):
+    """In-memory blob store.
+
+    Useful for testing and development. Only works when every node that
+    offloads or resolves blobs runs in the same process.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty in-memory blob store."""
+        self._blobs: dict[str, bytes] = {}
+
+    async def put(self, data: bytes) -> str:
+        key = content_key(data)
+        self._blobs.setdefault(key, data)
+        return key
+
+    async def get(self, key: str) -> bytes:
+        return self._blobs[key]
@@ -1,3 +1,23 @@
 from calfkit.broker.broker import BrokerClient
+from calfkit.broker.codec import (
+    EnvelopeCodec,
+    JSONEnvelopeCodec,
+    MsgPackEnvelopeCodec,
+    decode_envelope,
+    defer_envelope_decoding,
+    load_codec,
+    register_codec,
+)
+from calfkit.broker.headers import RoutingHeaders
 
-__all__ = ["BrokerClient"]
+__all__ = [
+    "BrokerClient",
+    "EnvelopeCodec",
+    "JSONEnvelopeCodec",
+    "MsgPackEnvelopeCodec",
+    "RoutingHeaders",
+    "decode_envelope",
+    "defer_envelope_decoding",
+    "load_codec",
+    "register_codec",
+]
@@ -1,23 +1,57 @@
 import os
 from collections.abc import Iterable
+from functools import partial
 from typing import Any
 
 from faststream import FastStream
 from faststream.kafka import KafkaBroker
 
+from calfkit.broker.codec import EnvelopeCodec, JSONEnvelopeCodec, decode_envelope_message
 from calfkit.broker.deployable import Deployable
-from calfkit.broker.middleware import ContextInjectionMiddleware
+from calfkit.broker.middleware import (
+    ContextInjectionMiddleware,
+    EnvelopeCodecMiddleware,
+    MessageKeyMiddleware,
+    RoutingHeadersMiddleware,
+)
 
 
 class BrokerClient(KafkaBroker, Deployable):
     """Lightweight wrapper over Faststream connecting to brokers"""
 
-    def __init__(self, bootstrap_servers: str | Iterable[str] | None = None, **broker_kwargs: Any):
+    def __init__(
+        self,
+        bootstrap_servers: str | Iterable[str] | None = None,
+        *,
+        codec: EnvelopeCodec | None = None,
+        **broker_kwargs: Any,
+    ):
+        """Initialize a BrokerClient.
+
+        Args:
+            bootstrap_servers: Kafka bootstrap servers. Defaults to ``CALF_HOST_URL``,
+                then ``localhost``.
+            codec: Codec used to encode published EventEnvelopes. Defaults to JSON.
+                Consumers decode any registered codec based on the ``content-type``
+                header, regardless of this setting.
+            **broker_kwargs: Additional keyword arguments passed to KafkaBroker.
+        """
         if not bootstrap_servers:
             bootstrap_servers = os.getenv("CALF_HOST_URL")
+        middlewares: list[Any] = [
+            ContextInjectionMiddleware,
+            MessageKeyMiddleware,
+            RoutingHeadersMiddleware,
+        ]
+        if codec is not None and not isinstance(codec, JSONEnvelopeCodec):
+            # Registered last so it runs right before the producer, after other
+            # middlewares have had a chance to inspect the envelope
+            middlewares.append(partial(EnvelopeCodecMiddleware, codec=codec))
+        broker_kwargs.setdefault("decoder", decode_envelope_message)
+        self.codec = codec or JSONEnvelopeCodec()
         super().__init__(
             bootstrap_servers or "localhost",
-            middlewares=[ContextInjectionMiddleware],
+            middlewares=middlewares,
             **broker_kwargs,
         )
 
@@ -0,0 +1,185 @@
+"""Pluggable wire codecs for EventEnvelope payloads.
+
+Publishers encode envelopes with the broker's configured codec and stamp the
+codec's content type on the message. Consumers pick the decoder from the
+``content-type`` header, so nodes can read every registered format regardless
+of the one they publish with (e.g. during a rolling upgrade from JSON to msgpack).
+"""
+
+import datetime
+import json
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from faststream.message import StreamMessage
+
+from calfkit.models.event_envelope import EventEnvelope
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_ZSTD_CONTENT_TYPE = "application/msgpack+zstd"
+
+
+class EnvelopeCodec(ABC):
+    """Encodes EventEnvelopes to bytes and decodes bytes back to validatable data."""
+
+    content_type: str
+    """Value stamped on the ``content-type`` header of encoded messages."""
+
+    @abstractmethod
+    def encode(self, envelope: EventEnvelope) -> bytes: ...
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        """Decode a payload into plain Python data, ready for pydantic validation."""
+        ...
+
+
+class JSONEnvelopeCodec(EnvelopeCodec):
+    """The default codec. Equivalent to FastStream's built-in pydantic serialization."""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, envelope: EventEnvelope) -> bytes:
+        return envelope.model_dump_json().encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Fallback serializer for values msgpack has no native type for."""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (uuid.UUID, Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+class MsgPackEnvelopeCodec(EnvelopeCodec):
+    """Binary codec based on msgpack, with optional zstd compression.
+
+    Requires the ``msgpack`` package, and ``zstandard`` when ``compress=True``.
+    Binary content (e.g. ``BinaryContent.data``) is carried as raw bytes
+    instead of base64 text.
+    """
+
+    def __init__(self, *, compress: bool = False, compression_level: int = 3):
+        self.compress = compress
+        self.compression_level = compression_level
+        self.content_type = MSGPACK_ZSTD_CONTENT_TYPE if compress else MSGPACK_CONTENT_TYPE
+
+    def encode(self, envelope: EventEnvelope) -> bytes:
+        msgpack = _import_msgpack()
+        data = envelope.model_dump(mode="python")
+        packed: bytes = msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+        if self.compress:
+            zstandard = _import_zstandard()
+            return bytes(zstandard.ZstdCompressor(level=self.compression_level).compress(packed))
+        return packed
+
+    def decode(self, data: bytes) -> Any:
+        msgpack = _import_msgpack()
+        if self.compress:
+            zstandard = _import_zstandard()
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return msgpack.unpackb(data, raw=False)
+
+
+def _import_msgpack() -> Any:
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError(
+            "MsgPackEnvelopeCodec requires the `msgpack` package: pip install 'calfkit[msgpack]'"
+        ) from e
+    return msgpack
+
+
+def _import_zstandard() -> Any:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "MsgPackEnvelopeCodec(compress=True) requires the `zstandard` package:"
+            " pip install 'calfkit[zstd]'"
+        ) from e
+    return zstandard
+
+
+_CODECS: dict[str, EnvelopeCodec] = {
+    codec.content_type: codec
+    for codec in (
+        JSONEnvelopeCodec(),
+        MsgPackEnvelopeCodec(),
+        MsgPackEnvelopeCodec(compress=True),
+    )
+}
+
+
+def register_codec(codec: EnvelopeCodec) -> None:
+    """Register a codec instance so consumers can decode its content type.
+
+    Raises:
+        ValueError: If a codec with the same ``content_type`` is already registered.
+    """
+    if codec.content_type in _CODECS:
+        raise ValueError(f"A codec with content type {codec.content_type!r} is already registered.")
+    _CODECS[codec.content_type] = codec
+
+
+def load_codec(content_type: str) -> EnvelopeCodec:
+    """Look up a registered codec by its content type.
+
+    Raises:
+        KeyError: If no codec with the given content type is registered.
+    """
+    return _CODECS[content_type]
+
+
+async def decode_envelope_message(
+    msg: StreamMessage[Any],
+    original_decoder: Callable[[StreamMessage[Any]], Awaitable[Any]],
+) -> Any:
+    """FastStream decoder that dispatches on the message's ``content-type`` header.
+
+    JSON and unknown content types fall through to FastStream's own decoder.
+    """
+    codec = _CODECS.get(msg.content_type or "")
+    if codec is None or isinstance(codec, JSONEnvelopeCodec):
+        return await original_decoder(msg)
+    return codec.decode(msg.body)
+
+
+async def defer_envelope_decoding(
+    msg: StreamMessage[Any],
+    original_decoder: Callable[[StreamMessage[Any]], Awaitable[Any]],
+) -> Any:
+    """FastStream decoder that leaves the body undecoded.
+
+    For subscribers that filter on headers or the correlation_id first and only
+    decode the messages they keep, with ``decode_envelope``.
+    """
+    return msg.body
+
+
+def decode_envelope(body: bytes, content_type: str | None) -> EventEnvelope:
+    """Decode and validate a raw message body into an EventEnvelope.
+
+    Raises:
+        KeyError: If the content type has no registered codec.
+    """
+    codec = load_codec(content_type or JSON_CONTENT_TYPE)
+    if isinstance(codec, JSONEnvelopeCodec):
+        return EventEnvelope.model_validate_json(body)
+    return EventEnvelope.model_validate(codec.decode(body))
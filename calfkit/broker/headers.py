@@ -0,0 +1,64 @@
+"""Routing metadata promoted from EventEnvelopes into Kafka message headers.
+
+Handlers that only filter or route on these fields (observers, reply filters)
+can read them from ``msg.headers`` without parsing the envelope body.
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from calfkit.models.event_envelope import EventEnvelope
+
+THREAD_ID_HEADER = "x-calf-thread-id"
+AGENT_NAME_HEADER = "x-calf-agent-name"
+TOOL_NAME_HEADER = "x-calf-tool-name"
+FINAL_RESPONSE_HEADER = "x-calf-final-response"
+DELEGATION_DEPTH_HEADER = "x-calf-delegation-depth"
+
+
+def envelope_routing_headers(envelope: EventEnvelope) -> dict[str, str]:
+    """Build the routing headers describing an envelope."""
+    headers = {
+        FINAL_RESPONSE_HEADER: "1" if envelope.is_end_of_turn else "0",
+        DELEGATION_DEPTH_HEADER: str(len(envelope.delegation_stack)),
+    }
+    if envelope.thread_id is not None:
+        headers[THREAD_ID_HEADER] = envelope.thread_id
+    if envelope.agent_name is not None:
+        headers[AGENT_NAME_HEADER] = envelope.agent_name
+    if envelope.tool_call_request is not None:
+        headers[TOOL_NAME_HEADER] = envelope.tool_call_request.tool_name
+    return headers
+
+
+@dataclass(frozen=True)
+class RoutingHeaders:
+    """Routing metadata of an envelope, read from its message headers.
+
+    Example::
+
+        @broker.subscriber("agent_router.output", decoder=defer_envelope_decoding)
+        async def observe(message: KafkaMessage) -> None:
+            routing = RoutingHeaders.from_headers(message.headers)
+            if not routing.final_response:
+                return  # skipped without parsing the body
+            envelope = decode_envelope(message.body, message.content_type)
+    """
+
+    thread_id: str | None = None
+    agent_name: str | None = None
+    tool_name: str | None = None
+    final_response: bool = False
+    delegation_depth: int = 0
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, Any]) -> "RoutingHeaders":
+        """Parse routing headers. Missing headers (e.g. from older publishers) take defaults."""
+        return cls(
+            thread_id=headers.get(THREAD_ID_HEADER),
+            agent_name=headers.get(AGENT_NAME_HEADER),
+            tool_name=headers.get(TOOL_NAME_HEADER),
+            final_response=headers.get(FINAL_RESPONSE_HEADER) == "1",
+            delegation_depth=int(headers.get(DELEGATION_DEPTH_HEADER) or 0),
+        )
@@ -1,12 +1,23 @@
 from collections.abc import Awaitable, Callable
 from typing import Any
 
-from faststream import BaseMiddleware, PublishCommand
+from faststream import BaseMiddleware, ContextRepo, PublishCommand
+from faststream.kafka.response import KafkaPublishCommand
 from faststream.message import StreamMessage
 from faststream.types import AsyncFuncAny
 
+from calfkit.broker.codec import EnvelopeCodec
+from calfkit.broker.headers import envelope_routing_headers
+from calfkit.models.event_envelope import EventEnvelope
+
 
 class ContextInjectionMiddleware(BaseMiddleware):
+    """Injects the correlation_id into the handler context.
+
+    Also drops publishes with a ``None`` body, so handlers decorated with
+    ``@publish_to`` can return ``None`` to emit nothing for a message.
+    """
+
     async def consume_scope(
         self,
         call_next: AsyncFuncAny,
@@ -20,4 +31,65 @@ class ContextInjectionMiddleware(BaseMiddleware):
         call_next: Callable[[PublishCommand], Awaitable[Any]],
         cmd: PublishCommand,
     ) -> Any:
+        if cmd.body is None:
+            return None
+        return await call_next(cmd)
+
+
+class MessageKeyMiddleware(BaseMiddleware):
+    """Keys outgoing Kafka messages by conversation.
+
+    Messages without an explicit key are keyed by the envelope's ``thread_id``,
+    falling back to the correlation_id, so every hop of a conversation lands on
+    the same partition of a topic and is consumed in order by a single replica.
+    """
+
+    async def publish_scope(
+        self,
+        call_next: Callable[[PublishCommand], Awaitable[Any]],
+        cmd: PublishCommand,
+    ) -> Any:
+        if isinstance(cmd, KafkaPublishCommand) and cmd.key is None:
+            thread_id = cmd.body.thread_id if isinstance(cmd.body, EventEnvelope) else None
+            key = thread_id or cmd.correlation_id
+            if key:
+                cmd.key = key.encode()
+        return await call_next(cmd)
+
+
+class RoutingHeadersMiddleware(BaseMiddleware):
+    """Promotes an outgoing EventEnvelope's routing metadata into message headers.
+
+    See ``calfkit.broker.headers``. Headers set explicitly by the publisher win.
+    """
+
+    async def publish_scope(
+        self,
+        call_next: Callable[[PublishCommand], Awaitable[Any]],
+        cmd: PublishCommand,
+    ) -> Any:
+        if isinstance(cmd.body, EventEnvelope):
+            cmd.add_headers(envelope_routing_headers(cmd.body), override=False)
+        return await call_next(cmd)
+
+
+class EnvelopeCodecMiddleware(BaseMiddleware):
+    """Encodes outgoing EventEnvelopes with a configured codec.
+
+    Registered by BrokerClient as ``partial(EnvelopeCodecMiddleware, codec=...)``.
+    Other message bodies are published untouched.
+    """
+
+    def __init__(self, msg: Any | None, /, *, context: ContextRepo, codec: EnvelopeCodec):
+        super().__init__(msg, context=context)
+        self.codec = codec
+
+    async def publish_scope(
+        self,
+        call_next: Callable[[PublishCommand], Awaitable[Any]],
+        cmd: PublishCommand,
+    ) -> Any:
+        if isinstance(cmd.body, EventEnvelope):
+            cmd.body = self.codec.encode(cmd.body)
+            cmd.add_headers({"content-type": self.codec.content_type})
         return await call_next(cmd)
@@ -0,0 +1,27 @@
+"""Calf Response Cache System.
+
+Response caches serve repeated, identical model requests without calling the
+model again. A request matches a cached response when the model, the message
+history (ignoring timestamps and usage), the request parameters and the model
+settings are all the same.
+
+Example:
+    from calfkit.caches import InMemoryResponseCache
+
+    chat_node = ChatNode(model_client, response_cache=InMemoryResponseCache(ttl=3600))
+
+    # Requests can opt out, e.g. to sample a fresh answer
+    await client.request(user_prompt="Tell me a joke", bypass_response_cache=True)
+"""
+
+from calfkit.caches.base import ResponseCache, ResponseCacheStats, response_cache_key
+from calfkit.caches.filesystem import FileSystemResponseCache
+from calfkit.caches.in_memory import InMemoryResponseCache
+
+__all__ = [
+    "FileSystemResponseCache",
+    "InMemoryResponseCache",
+    "ResponseCache",
+    "ResponseCacheStats",
+    "response_cache_key",
+]
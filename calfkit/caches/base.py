@@ -0,0 +1,142 @@
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic import TypeAdapter
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelResponse
+from calfkit._vendor.pydantic_ai.messages import ModelMessagesTypeAdapter
+from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
+
+_parameters_adapter = TypeAdapter(ModelRequestParameters)
+
+# Message fields describing how or when a message was produced, rather than what the
+# model sees. Left out of cache keys so that replayed conversations match.
+_VOLATILE_FIELDS = frozenset(
+    {
+        "timestamp",
+        "usage",
+        "provider_response_id",
+        "provider_details",
+        "provider_url",
+        "run_id",
+        "metadata",
+    }
+)
+
+
+def _without_volatile_fields(fields: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in fields.items() if k not in _VOLATILE_FIELDS}
+
+
+def _normalize(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Drop the volatile fields of messages and of their parts.
+
+    Part contents, such as tool call arguments and tool results, are kept as they
+    are: a field named ``timestamp`` there is data the model sees.
+    """
+    normalized = []
+    for message in messages:
+        message = _without_volatile_fields(message)
+        message["parts"] = [_without_volatile_fields(part) for part in message["parts"]]
+        normalized.append(message)
+    return normalized
+
+
+def response_cache_key(
+    model_name: str,
+    messages: Sequence[ModelMessage],
+    request_parameters: ModelRequestParameters | None = None,
+    model_settings: dict[str, Any] | None = None,
+) -> str:
+    """Cache key of a model request: the hex sha256 digest of its normalized JSON form.
+
+    Timestamps, usage and provider metadata of the messages and their parts are
+    ignored, so the same conversation replayed later maps to the same key. Tool call
+    arguments and tool results count in full.
+
+    Args:
+        model_name: Name of the model requested.
+        messages: The full message history sent to the model.
+        request_parameters: The request parameters (tool schemas, output mode).
+        model_settings: The model settings (temperature, max tokens, ...).
+
+    Returns:
+        The cache key.
+    """
+    request = {
+        "model": model_name,
+        "messages": _normalize(ModelMessagesTypeAdapter.dump_python(list(messages), mode="json")),
+        "parameters": (
+            _parameters_adapter.dump_python(request_parameters, mode="json")
+            if request_parameters is not None
+            else None
+        ),
+        "settings": model_settings,
+    }
+    data = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+@dataclass
+class ResponseCacheStats:
+    """Hit and miss counters of a response cache."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache(ABC):
+    """Abstract exact-match cache of model responses, keyed by ``response_cache_key``.
+
+    Entries expire ``ttl`` seconds after they were written. Lookups are counted in
+    ``stats``.
+    """
+
+    def __init__(self, ttl: float | None = None):
+        """Initialize a ResponseCache.
+
+        Args:
+            ttl: Seconds after which an entry expires. None keeps entries until evicted.
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.ttl = ttl
+        self.stats = ResponseCacheStats()
+
+    @abstractmethod
+    async def get(self, key: str) -> ModelResponse | None:
+        """Load a cached response.
+
+        Args:
+            key: The request's cache key.
+
+        Returns:
+            The cached response, or None if there is none or it expired.
+        """
+        ...
+
+    @abstractmethod
+    async def put(self, key: str, response: ModelResponse) -> None:
+        """Cache a response, replacing any previous one for the key.
+
+        Args:
+            key: The request's cache key.
+            response: The model's response to the request.
+        """
+        ...
+
+    def _record(self, response: ModelResponse | None) -> ModelResponse | None:
+        if response is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return response
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from pathlib import Path
+from time import time
+
+from calfkit._vendor.pydantic_ai import ModelResponse
+from calfkit._vendor.pydantic_ai.messages import ModelMessagesTypeAdapter
+from calfkit.caches.base import ResponseCache
+
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class FileSystemResponseCache(ResponseCache):
+    """Response cache backed by a directory, e.g. on a volume shared by all replicas.
+
+    Responses are written atomically to ``<root>/<key[:2]>/<key>.json``. Expired
+    entries are deleted when read; nothing else bounds the directory's size.
+    """
+
+    def __init__(self, root: str | os.PathLike[str], *, ttl: float | None = None):
+        """Initialize a FileSystemResponseCache.
+
+        Args:
+            root: Directory holding the cached responses. Created on first write.
+            ttl: Seconds after which an entry expires. None keeps entries forever.
+        """
+        super().__init__(ttl)
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_PATTERN.fullmatch(key):
+            raise KeyError(key)
+        return self.root / key[:2] / f"{key}.json"
+
+    def _read(self, key: str) -> ModelResponse | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        if entry["expires_at"] is not None and entry["expires_at"] <= time():
+            path.unlink(missing_ok=True)
+            return None
+        response = ModelMessagesTypeAdapter.validate_python([entry["response"]])[0]
+        return response if isinstance(response, ModelResponse) else None
+
+    def _write(self, key: str, response: ModelResponse) -> None:
+        path = self._path(key)
+        entry = {
+            "expires_at": time() + self.ttl if self.ttl is not None else None,
+            "response": ModelMessagesTypeAdapter.dump_python([response], mode="json")[0],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+
+    async def get(self, key: str) -> ModelResponse | None:
+        return self._record(await asyncio.to_thread(self._read, key))
+
+    async def put(self, key: str, response: ModelResponse) -> None:
+        await asyncio.to_thread(self._write, key, response)
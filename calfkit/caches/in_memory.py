@@ -0,0 +1,37 @@
+from time import monotonic
+
+from calfkit._vendor.pydantic_ai import ModelResponse
+from calfkit.caches.base import ResponseCache
+from calfkit.utils import LRUCache
+
+
+class InMemoryResponseCache(ResponseCache):
+    """In-memory response cache that evicts the least recently used entry when full.
+
+    Only shared by chat nodes running in the same process.
+    """
+
+    def __init__(self, maxsize: int = 1024, *, ttl: float | None = None):
+        """Initialize an empty InMemoryResponseCache.
+
+        Args:
+            maxsize: Maximum number of cached responses.
+            ttl: Seconds after which an entry expires. None keeps entries until evicted.
+        """
+        super().__init__(ttl)
+        # Key -> (expiry on the monotonic clock or None, response)
+        self._entries: LRUCache[str, tuple[float | None, ModelResponse]] = LRUCache(maxsize)
+
+    async def get(self, key: str) -> ModelResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= monotonic():
+            self._entries.pop(key)
+            entry = None
+        return self._record(entry[1] if entry is not None else None)
+
+    async def put(self, key: str, response: ModelResponse) -> None:
+        expires_at = monotonic() + self.ttl if self.ttl is not None else None
+        self._entries.put(key, (expires_at, response))
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -4,6 +4,27 @@ This module provides utilities for working with pydantic_ai ModelMessage types,
 including message history manipulation and transformation.
 """
 
+from .compaction import DEFAULT_COMPACTION_INSTRUCTIONS, HistoryCompactor
+from .context import (
+    ContextPolicy,
+    LastTurnsPolicy,
+    SlidingWindowPolicy,
+    TokenEstimator,
+    estimate_message_tokens,
+    estimate_tokens,
+)
 from .utils import append_system_prompt, patch_system_prompts, validate_tool_call_pairs
 
-__all__ = ["append_system_prompt", "patch_system_prompts", "validate_tool_call_pairs"]
+__all__ = [
+    "DEFAULT_COMPACTION_INSTRUCTIONS",
+    "HistoryCompactor",
+    "ContextPolicy",
+    "LastTurnsPolicy",
+    "SlidingWindowPolicy",
+    "TokenEstimator",
+    "append_system_prompt",
+    "estimate_message_tokens",
+    "estimate_tokens",
+    "patch_system_prompts",
+    "validate_tool_call_pairs",
+]
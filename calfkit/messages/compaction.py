@@ -0,0 +1,169 @@
+"""History compaction: summarizing the older part of a long message history.
+
+Unlike a context policy, which only shapes each request, compaction replaces the
+start of the stored history with a summary checkpoint (see ``HistoryCheckpoint``).
+Readers then load the checkpoint plus the messages after it, so long threads stay
+cheap to read and to send, while their early turns are still represented.
+"""
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+from calfkit._vendor.pydantic_ai.direct import model_request
+from calfkit._vendor.pydantic_ai.messages import (
+    BaseToolCallPart,
+    BaseToolReturnPart,
+    ModelMessage,
+    ModelRequest,
+    SystemPromptPart,
+    TextPart,
+    UserPromptPart,
+)
+from calfkit._vendor.pydantic_ai.models import Model
+from calfkit.messages.context import (
+    TokenEstimator,
+    _cut_points,
+    estimate_message_tokens,
+)
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+
+if TYPE_CHECKING:
+    from calfkit.nodes.chat_node import ChatNode
+
+DEFAULT_COMPACTION_INSTRUCTIONS = (
+    "Summarize the conversation below so that it can be continued without it. Keep every"
+    " fact, decision, open question and tool result that later turns may rely on, and the"
+    " user's goals and preferences. Leave out pleasantries. Answer with the summary only."
+)
+
+
+def _render(message: ModelMessage) -> list[str]:
+    """Render a message as transcript lines. System prompts are left out."""
+    speaker = "User" if isinstance(message, ModelRequest) else "Assistant"
+    lines: list[str] = []
+    for part in message.parts:
+        if isinstance(part, SystemPromptPart):
+            continue
+        if isinstance(part, UserPromptPart):
+            content = part.content if isinstance(part.content, str) else "[non-text content]"
+            lines.append(f"{speaker}: {content}")
+        elif isinstance(part, TextPart):
+            lines.append(f"{speaker}: {part.content}")
+        elif isinstance(part, BaseToolCallPart):
+            lines.append(f"Tool call {part.tool_name}: {part.args_as_json_str()}")
+        elif isinstance(part, BaseToolReturnPart):
+            lines.append(f"Tool result {part.tool_name}: {part.model_response_str()}")
+    return lines
+
+
+class HistoryCompactor:
+    """Summarizes the older part of a message history with a (cheap) chat model.
+
+    Once the messages after the latest checkpoint pass ``threshold_tokens``, the
+    oldest of them are summarized, together with the previous checkpoint's
+    summary, into a new checkpoint. About ``keep_tokens`` of the latest messages
+    are kept as they are. Like context policies, compaction only cuts at the
+    start of a request, and never separates a tool call from its result.
+    """
+
+    def __init__(
+        self,
+        chat_node: "ChatNode",
+        *,
+        threshold_tokens: int,
+        keep_tokens: int,
+        instructions: str = DEFAULT_COMPACTION_INSTRUCTIONS,
+        estimator: TokenEstimator = estimate_message_tokens,
+    ):
+        """Initialize a HistoryCompactor.
+
+        Args:
+            chat_node: Chat node whose model client writes the summaries. Called
+                directly, in-process; pick a small, cheap model.
+            threshold_tokens: Tokens of history after the latest checkpoint above
+                which the history is compacted.
+            keep_tokens: Tokens of the latest history kept out of the summary.
+            instructions: Instructions given to the model to write a summary.
+            estimator: Estimates the tokens of one message.
+
+        Raises:
+            ValueError: If chat_node has no model client, or keep_tokens is not
+                below threshold_tokens.
+        """
+        if chat_node.model_client is None:
+            raise ValueError("chat_node must have a model client")
+        if keep_tokens >= threshold_tokens:
+            raise ValueError("keep_tokens must be below threshold_tokens")
+        self.chat_node = chat_node
+        self.model_client: Model = chat_node.model_client
+        self.threshold_tokens = threshold_tokens
+        self.keep_tokens = keep_tokens
+        self.instructions = instructions
+        self.estimator = estimator
+
+    def needs_compaction(self, messages: Sequence[ModelMessage]) -> bool:
+        """Whether the history after the latest checkpoint is over the threshold.
+
+        Args:
+            messages: The stored messages after the latest checkpoint.
+        """
+        return sum(self.estimator(message) for message in messages) > self.threshold_tokens
+
+    def cut_point(self, messages: Sequence[ModelMessage]) -> int:
+        """The number of leading messages to summarize, or 0 if there is no valid cut.
+
+        Args:
+            messages: The stored messages after the latest checkpoint.
+        """
+        cut = 0
+        kept_tokens = 0
+        scored_from = len(messages)
+        for i in _cut_points(messages):
+            if i == 0:
+                break
+            kept_tokens += sum(self.estimator(message) for message in messages[i:scored_from])
+            scored_from = i
+            cut = i
+            if kept_tokens >= self.keep_tokens:
+                break
+        return cut
+
+    async def compact(
+        self,
+        messages: Sequence[ModelMessage],
+        checkpoint: HistoryCheckpoint | None = None,
+    ) -> HistoryCheckpoint | None:
+        """Summarize the older part of a history into a new checkpoint.
+
+        Args:
+            messages: The stored messages after ``checkpoint``, or the whole stored
+                history if there is no checkpoint.
+            checkpoint: The latest checkpoint of the history, if any.
+
+        Returns:
+            The new checkpoint, or None if there is nothing to summarize.
+        """
+        cut = self.cut_point(messages)
+        if cut == 0:
+            return None
+        transcript: list[str] = []
+        if checkpoint is not None:
+            transcript.append(f"Summary of the earlier conversation: {checkpoint.summary}")
+        for message in messages[:cut]:
+            transcript.extend(_render(message))
+        if not transcript:
+            return None
+        response = await model_request(
+            self.model_client,
+            [
+                ModelRequest(
+                    parts=[
+                        SystemPromptPart(self.instructions),
+                        UserPromptPart("\n".join(transcript)),
+                    ]
+                )
+            ],
+        )
+        summary = "".join(part.content for part in response.parts if isinstance(part, TextPart))
+        covered = checkpoint.covers if checkpoint is not None else 0
+        return HistoryCheckpoint(summary=summary.strip(), covers=covered + cut)
@@ -0,0 +1,197 @@
+"""Context policies: which part of a message history is sent to the model.
+
+A policy is applied to the full history right before each model call. It only
+shapes the request; the stored history is left intact. All bundled policies
+keep the system prompt, cut the history only at the start of a request, and
+never separate a tool call from its result.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Sequence
+
+from calfkit._vendor.pydantic_ai.messages import (
+    BaseToolCallPart,
+    BaseToolReturnPart,
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    ModelResponsePart,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ThinkingPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+TokenEstimator = Callable[[ModelMessage], int]
+"""Estimates the number of input tokens a message costs."""
+
+_CHARS_PER_TOKEN = 4
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Flat estimate for images, audio, documents and other non-text content
+_NON_TEXT_CONTENT_TOKENS = 1_000
+
+
+def _part_chars(part: ModelRequestPart | ModelResponsePart) -> int:
+    if isinstance(part, (SystemPromptPart, TextPart, ThinkingPart)):
+        return len(part.content)
+    if isinstance(part, UserPromptPart):
+        if isinstance(part.content, str):
+            return len(part.content)
+        return sum(
+            len(item) if isinstance(item, str) else _NON_TEXT_CONTENT_TOKENS * _CHARS_PER_TOKEN
+            for item in part.content
+        )
+    if isinstance(part, BaseToolCallPart):
+        return len(part.tool_name) + len(part.args_as_json_str())
+    if isinstance(part, BaseToolReturnPart):
+        return len(part.tool_name) + len(part.model_response_str())
+    if isinstance(part, RetryPromptPart):
+        return len(part.model_response())
+    return _NON_TEXT_CONTENT_TOKENS * _CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message: ModelMessage) -> int:
+    """Estimate the input tokens of a message at about four characters per token.
+
+    Fast and local, but only approximate: use a provider tokenizer where exact
+    counts matter.
+    """
+    chars = sum(_part_chars(part) for part in message.parts)
+    return _MESSAGE_OVERHEAD_TOKENS + -(-chars // _CHARS_PER_TOKEN)
+
+
+def estimate_tokens(messages: Sequence[ModelMessage]) -> int:
+    """Estimate the input tokens of a message history. See ``estimate_message_tokens``."""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def _cut_points(messages: Sequence[ModelMessage]) -> Iterator[int]:
+    """Yield, latest first, the indexes ``i`` at which ``messages[i:]`` is a valid history.
+
+    That is, ``messages[i]`` is a request, and every tool result in ``messages[i:]``
+    answers a tool call also in ``messages[i:]``.
+    """
+    unanswered_results: set[str] = set()
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, ModelRequest):
+            for request_part in message.parts:
+                if isinstance(request_part, ToolReturnPart) or (
+                    isinstance(request_part, RetryPromptPart) and request_part.tool_name
+                ):
+                    unanswered_results.add(request_part.tool_call_id)
+            if not unanswered_results:
+                yield i
+        else:
+            for response_part in message.parts:
+                if isinstance(response_part, ToolCallPart):
+                    unanswered_results.discard(response_part.tool_call_id)
+
+
+def _system_prompt_parts(messages: Sequence[ModelMessage]) -> list[SystemPromptPart]:
+    return [
+        part
+        for message in messages
+        if isinstance(message, ModelRequest)
+        for part in message.parts
+        if isinstance(part, SystemPromptPart)
+    ]
+
+
+def _window(messages: list[ModelMessage], start: int) -> list[ModelMessage]:
+    """Keep ``messages[start:]``, plus the system prompt parts of the messages dropped."""
+    dropped = messages[:start]
+    system_parts = _system_prompt_parts(dropped)
+    if len(system_parts) == sum(len(message.parts) for message in dropped):
+        # Only system prompts would be dropped, and they are kept anyway
+        return messages
+    if system_parts:
+        return [ModelRequest(parts=system_parts), *messages[start:]]
+    return messages[start:]
+
+
+class ContextPolicy(ABC):
+    """Selects the part of a message history that is sent to the model."""
+
+    @abstractmethod
+    def apply(self, messages: list[ModelMessage]) -> list[ModelMessage]:
+        """Select the messages to send to the model.
+
+        Args:
+            messages: The full message history. Not modified.
+
+        Returns:
+            The messages to send, or ``messages`` itself if all of it is sent.
+        """
+        ...
+
+
+class SlidingWindowPolicy(ContextPolicy):
+    """Send the system prompt plus the latest messages that fit in a token budget.
+
+    If not even the latest request and what follows it fit, they are still sent.
+    """
+
+    def __init__(self, max_tokens: int, *, estimator: TokenEstimator = estimate_message_tokens):
+        """Initialize a SlidingWindowPolicy.
+
+        Args:
+            max_tokens: Token budget for the messages sent, system prompt included.
+            estimator: Estimates the tokens of one message.
+        """
+        self.max_tokens = max_tokens
+        self.estimator = estimator
+
+    def apply(self, messages: list[ModelMessage]) -> list[ModelMessage]:
+        system_parts = _system_prompt_parts(messages)
+        system_tokens = self.estimator(ModelRequest(parts=system_parts)) if system_parts else 0
+        start: int | None = None
+        suffix_tokens = 0
+        scored_from = len(messages)
+        for i in _cut_points(messages):
+            suffix_tokens += sum(self.estimator(message) for message in messages[i:scored_from])
+            scored_from = i
+            # Once the whole history is kept, its system prompt is part of the suffix
+            tokens = suffix_tokens if i == 0 else suffix_tokens + system_tokens
+            if tokens > self.max_tokens:
+                if start is None:
+                    start = i
+                break
+            start = i
+        if start is None:
+            return messages
+        return _window(messages, start)
+
+
+class LastTurnsPolicy(ContextPolicy):
+    """Send the system prompt plus the last ``turns`` turns.
+
+    A turn starts with a request holding a user prompt, and includes the model
+    responses and tool calls that follow it.
+    """
+
+    def __init__(self, turns: int):
+        """Initialize a LastTurnsPolicy.
+
+        Args:
+            turns: Number of turns to send.
+
+        Raises:
+            ValueError: If turns is less than 1.
+        """
+        if turns < 1:
+            raise ValueError("turns must be at least 1")
+        self.turns = turns
+
+    def apply(self, messages: list[ModelMessage]) -> list[ModelMessage]:
+        turns = 0
+        for i in _cut_points(messages):
+            message = messages[i]
+            if any(isinstance(part, UserPromptPart) for part in message.parts):
+                turns += 1
+                if turns == self.turns:
+                    return _window(messages, i)
+        return messages
@@ -0,0 +1,48 @@
+from functools import cached_property
+from typing import Any
+
+from pydantic import Field
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelMessagesTypeAdapter
+from calfkit.models.delegation import DelegationFrame
+from calfkit.models.history_ref import HistoryRef
+from calfkit.models.types import CompactBaseModel, ToolCallRequest
+
+
+class EventEnvelopeView(CompactBaseModel):
+    """Lazily validated, read-only view of an EventEnvelope.
+
+    Use it in place of EventEnvelope as the body type of handlers that only need
+    routing metadata. The small routing fields are validated eagerly; the message
+    history is kept as raw data and only the messages actually accessed are
+    validated into ModelMessages. Other envelope fields are dropped.
+    """
+
+    trace_id: str | None = None
+    agent_name: str | None = None
+    name: str | None = None
+    thread_id: str | None = None
+    history_ref: HistoryRef | None = None
+    tool_call_request: ToolCallRequest | None = None
+    final_response_topic: str | None = None
+    final_response: bool = False
+    delegation_stack: list[DelegationFrame] = Field(default_factory=list)
+
+    raw_message_history: list[Any] = Field(default_factory=list, alias="message_history")
+    """The envelope's message_history, unvalidated."""
+
+    @property
+    def is_end_of_turn(self) -> bool:
+        return self.final_response
+
+    @cached_property
+    def latest_message_in_history(self) -> ModelMessage | None:
+        """The last message of the history, validated on first access."""
+        if not self.raw_message_history:
+            return None
+        return ModelMessagesTypeAdapter.validate_python(self.raw_message_history[-1:])[0]
+
+    @cached_property
+    def message_history(self) -> list[ModelMessage]:
+        """The full message history, validated on first access."""
+        return ModelMessagesTypeAdapter.validate_python(self.raw_message_history)
@@ -6,6 +6,7 @@ from calfkit._vendor.pydantic_ai import ModelMessage, ModelRequest
 from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
 from calfkit.models.delegation import DelegationFrame
 from calfkit.models.groupchat import GroupchatDataModel
+from calfkit.models.history_ref import HistoryRef
 from calfkit.models.types import CompactBaseModel, SerializableModelSettings, ToolCallRequest
 
 
@@ -32,6 +33,17 @@ class EventEnvelope(CompactBaseModel):
     patch_model_request_params: ModelRequestParameters | None = None
     patch_model_settings: SerializableModelSettings | None = None
 
+    # Content hash of the tool bundle for the chat node (see ToolBundle). When set and
+    # patch_model_request_params is None, the chat node uses its cached copy of the bundle
+    tool_bundle_digest: str | None = None
+
+    # Set by a chat node that has no cached bundle for tool_bundle_digest,
+    # asking the router to resend the bundle in full
+    tool_bundle_miss: bool = False
+
+    # Skip the chat node's response cache lookup for this request (see ChatNode(response_cache=...))
+    bypass_response_cache: bool = False
+
     # Running message history
     message_history: list[ModelMessage] = Field(default_factory=list)
 
@@ -48,6 +60,10 @@ class EventEnvelope(CompactBaseModel):
     # thread id / conversation identifier
     thread_id: str | None = None
 
+    # Set when message_history is delta-encoded: the history prefix lives in the
+    # message history store and message_history only carries the messages after it
+    history_ref: HistoryRef | None = None
+
     # Allow client to dynamically patch system message at runtime
     # Intentionally kept separate from message_history in order to simplify patch logic
     system_message: ModelRequest | None = None
@@ -0,0 +1,23 @@
+from calfkit._vendor.pydantic_ai import ModelRequest, UserPromptPart
+from calfkit.models.types import CompactBaseModel
+
+
+class HistoryCheckpoint(CompactBaseModel):
+    """A summary standing in for the start of a thread's stored message history.
+
+    Saved to a MessageHistoryStore by history compaction (see ``HistoryCompactor``).
+    Readers use the summary followed by the stored messages at positions ``covers``
+    and beyond, in place of the full history.
+    """
+
+    summary: str
+    """Summary of the messages it replaces, including any earlier checkpoint."""
+
+    covers: int
+    """Number of stored messages, from the start of the history, that the summary replaces."""
+
+    def as_message(self) -> ModelRequest:
+        """The summary as a message to put in front of the remaining history."""
+        return ModelRequest(
+            parts=[UserPromptPart(f"Summary of the conversation so far:\n\n{self.summary}")]
+        )
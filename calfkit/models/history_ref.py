@@ -0,0 +1,19 @@
+from calfkit.models.types import CompactBaseModel
+
+
+class HistoryRef(CompactBaseModel):
+    """Reference to a message history prefix persisted in a MessageHistoryStore.
+
+    Set on EventEnvelope.history_ref when a router ships a delta-encoded
+    envelope. The envelope's message_history then only holds the messages at
+    positions ``seq`` and beyond; the receiver loads the prefix from the store.
+    """
+
+    thread_id: str
+    """Thread the referenced history belongs to."""
+
+    scope: str | None = None
+    """Scope the referenced history was stored under."""
+
+    seq: int
+    """Number of stored messages that precede the envelope's message_history."""
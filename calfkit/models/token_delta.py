@@ -0,0 +1,35 @@
+from calfkit.models.types import CompactBaseModel
+
+
+class TokenDelta(CompactBaseModel):
+    """A chunk of a model response, published while the response is being generated.
+
+    Published by a streaming ``ChatNode`` to its stream topic under the request's
+    correlation_id. Consecutive deltas of the same part are coalesced, so a delta
+    usually carries several tokens.
+    """
+
+    part_index: int = 0
+    """Index of the response part the delta belongs to."""
+
+    text: str = ""
+    """Text appended to a text part."""
+
+    tool_name: str | None = None
+    """Name (or name fragment) of the tool being called, for tool call parts."""
+
+    tool_call_id: str | None = None
+    """Id of the tool call, for tool call parts."""
+
+    args: str = ""
+    """JSON fragment appended to the arguments of a tool call part."""
+
+    done: bool = False
+    """Whether this is the last delta of the model response."""
+
+    end_of_turn: bool = False
+    """Whether the model response is the final response of the turn, i.e. calls no tools."""
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.text or self.args or self.tool_name)
@@ -0,0 +1,35 @@
+import hashlib
+from dataclasses import dataclass
+
+from pydantic import TypeAdapter
+
+from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
+from calfkit._vendor.pydantic_ai.tools import ToolDefinition
+
+_parameters_adapter = TypeAdapter(ModelRequestParameters)
+
+
+def tool_bundle_digest(parameters: ModelRequestParameters) -> str:
+    """Content hash of request parameters: the hex sha256 digest of their JSON form."""
+    return hashlib.sha256(_parameters_adapter.dump_json(parameters)).hexdigest()
+
+
+@dataclass(frozen=True)
+class ToolBundle:
+    """Request parameters (tool schemas) identified by their content hash.
+
+    Routers ship a bundle's parameters to a chat node once and afterwards only its
+    digest (``EventEnvelope.tool_bundle_digest``); the chat node serves the
+    parameters from its cache. Treat ``parameters`` as immutable.
+    """
+
+    parameters: ModelRequestParameters
+    digest: str
+
+    @classmethod
+    def from_parameters(cls, parameters: ModelRequestParameters) -> "ToolBundle":
+        return cls(parameters=parameters, digest=tool_bundle_digest(parameters))
+
+    @classmethod
+    def from_tools(cls, tools: list[ToolDefinition]) -> "ToolBundle":
+        return cls.from_parameters(ModelRequestParameters(function_tools=tools))
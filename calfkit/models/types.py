@@ -1,4 +1,4 @@
-from typing import Any, TypeAlias
+from typing import Any, Literal, TypeAlias
 
 from pydantic import BaseModel
 from typing_extensions import TypedDict
@@ -7,6 +7,14 @@ from calfkit._vendor.pydantic_ai import ToolCallPart
 
 ToolCallRequest: TypeAlias = ToolCallPart
 
+EmissionPolicy: TypeAlias = Literal["full", "final_only", "deltas_only"]
+"""What an AgentRouterNode publishes to its output topic on each hop.
+
+- ``full``: the whole envelope on every hop.
+- ``final_only``: only the final response of a turn.
+- ``deltas_only``: on every hop, an envelope carrying only the messages new on that hop.
+"""
+
 
 class SerializableModelSettings(TypedDict, total=False):
     """Serializable version of pydantic_ai.ModelSettings.
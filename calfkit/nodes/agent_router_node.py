@@ -1,19 +1,64 @@
+import asyncio
+import logging
+from collections.abc import Collection
+from contextlib import AbstractAsyncContextManager, nullcontext
+from dataclasses import dataclass
 from typing import Annotated, Any, cast, overload
 
+from aiokafka import TopicPartition
 from faststream import Context
 from faststream.kafka.annotations import (
     KafkaBroker as BrokerAnnotation,
 )
 
-from calfkit._vendor.pydantic_ai import ModelRequest, ModelResponse, SystemPromptPart
-from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    SystemPromptPart,
+    ToolReturnPart,
+)
+from calfkit.blobs import BlobStore, offload_large_content
 from calfkit.broker.broker import BrokerClient
-from calfkit.messages import patch_system_prompts, validate_tool_call_pairs
+from calfkit.messages import (
+    ContextPolicy,
+    HistoryCompactor,
+    patch_system_prompts,
+    validate_tool_call_pairs,
+)
 from calfkit.models.event_envelope import EventEnvelope
-from calfkit.models.types import ToolCallRequest
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.models.history_ref import HistoryRef
+from calfkit.models.tool_bundle import ToolBundle
+from calfkit.models.types import EmissionPolicy, ToolCallRequest
 from calfkit.nodes.base_node import BaseNode, entrypoint, publish_to, subscribe_to
 from calfkit.nodes.base_tool_node import BaseToolNode
-from calfkit.stores.base import MessageHistoryStore
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+from calfkit.utils import KeyedLock, LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Conditional appends to a thread's history attempted per hop before giving up
+_MAX_APPEND_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class _HistoryCursor:
+    """A thread's stored history as last read by the router, and the store version it had.
+
+    With a checkpoint, ``messages`` are the stored messages after the ones it covers.
+    """
+
+    version: int
+    messages: list[ModelMessage]
+    checkpoint: HistoryCheckpoint | None = None
+
+    @property
+    def offset(self) -> int:
+        """Position in the stored history of the first message not yet read."""
+        covers = self.checkpoint.covers if self.checkpoint is not None else 0
+        return covers + len(self.messages)
 
 
 class AgentRouterNode(BaseNode):
@@ -33,6 +78,12 @@ class AgentRouterNode(BaseNode):
         system_prompt: str,
         tool_nodes: list[BaseToolNode],
         message_history_store: MessageHistoryStore,
+        delta_history: bool = False,
+        emission_policy: EmissionPolicy = "full",
+        context_policy: ContextPolicy | None = None,
+        compactor: HistoryCompactor | None = None,
+        blob_store: BlobStore | None = None,
+        offload_threshold_bytes: int = 64 * 1024,
         **kwargs: Any,
     ): ...
 
@@ -47,6 +98,12 @@ class AgentRouterNode(BaseNode):
         system_prompt: str | None = None,
         tool_nodes: list[BaseToolNode] | None = None,
         message_history_store: MessageHistoryStore | None = None,
+        delta_history: bool = False,
+        emission_policy: EmissionPolicy = "full",
+        context_policy: ContextPolicy | None = None,
+        compactor: HistoryCompactor | None = None,
+        blob_store: BlobStore | None = None,
+        offload_threshold_bytes: int = 64 * 1024,
         **kwargs: Any,
     ): ...
 
@@ -81,6 +138,12 @@ class AgentRouterNode(BaseNode):
         tool_nodes: list[BaseToolNode] | None = None,
         message_history_store: MessageHistoryStore | None = None,
         deps_type: type | None = None,
+        delta_history: bool = False,
+        emission_policy: EmissionPolicy = "full",
+        context_policy: ContextPolicy | None = None,
+        compactor: HistoryCompactor | None = None,
+        blob_store: BlobStore | None = None,
+        offload_threshold_bytes: int = 64 * 1024,
         **kwargs: Any,
     ):
         """Initialize an AgentRouterNode.
@@ -116,8 +179,46 @@ class AgentRouterNode(BaseNode):
                 instances — the router treats them like any other tool. Optional for all forms.
             message_history_store: Store for persisting conversation history across requests.
                 Required for deployable service, optional otherwise.
+            delta_history: When True and a message_history_store and thread_id are available,
+                outgoing envelopes carry a HistoryRef plus only the messages added on the
+                current hop instead of the full history. The receiving ChatNode must be
+                configured with the same message_history_store to load the prefix. Tool
+                nodes only see the delta in ``ToolContext.messages``.
+            emission_policy: What is published to the output topic on each hop.
+                ``"full"`` (default) publishes the whole envelope on every hop.
+                ``"final_only"`` publishes only the final response of a turn.
+                ``"deltas_only"`` publishes, on every hop, an envelope whose
+                message_history holds only the messages added on that hop.
+            context_policy: Selects the part of the message history sent to the model on
+                each call, e.g. ``SlidingWindowPolicy`` to cap input tokens. The stored
+                history is left intact, and hops that trim the history are sent without
+                delta encoding. Without a message_history_store the envelope is the only
+                copy of the history, so the trimmed history is what the next hop sees.
+            compactor: When set with a message_history_store, threads whose stored history
+                grows past the compactor's threshold are summarized in the background, and
+                the summary is saved to the store as a checkpoint. Hops then read the
+                checkpoint plus the messages after it instead of the whole history, and are
+                sent without delta encoding. The store must support checkpoints.
+            blob_store: When set, binary content and tool return content larger than
+                ``offload_threshold_bytes`` are written to this store before being
+                persisted and forwarded, and replaced with references. The receiving
+                ChatNode must be configured with a blob store sharing the same data.
+            offload_threshold_bytes: Size above which content is offloaded to the blob store.
             **kwargs: Additional keyword arguments passed to BaseNode.
+
+        Raises:
+            ValueError: If a compactor is given with a store that does not support
+                checkpoints.
         """
+        if (
+            compactor is not None
+            and message_history_store is not None
+            and not message_history_store.supports_checkpoints
+        ):
+            raise ValueError(
+                f"compactor needs a store that supports checkpoints,"
+                f" which {type(message_history_store).__name__} does not"
+            )
         self.chat = chat_node
         self.tools = tool_nodes
         self.system_prompt = system_prompt
@@ -128,6 +229,30 @@ class AgentRouterNode(BaseNode):
         )
         self.message_history_store = message_history_store
         self.deps_type = deps_type
+        self.delta_history = delta_history
+        self.emission_policy = emission_policy
+        self.context_policy = context_policy
+        self.compactor = compactor
+        self.blob_store = blob_store
+        self.offload_threshold_bytes = offload_threshold_bytes
+        # Serializes hops of the same thread so concurrent tool results are aggregated
+        # exactly once, even when the subscriber runs with max_workers > 1
+        self._thread_locks = KeyedLock()
+        # tool_call_ids of each thread's latest model response that have no result yet.
+        # Bounded, so threads whose results never arrive are evicted eventually; an
+        # evicted thread falls back to scanning its history
+        self._outstanding_tool_calls: LRUCache[str, set[str]] = LRUCache(maxsize=256)
+        # Each thread's history as of its last hop, so only new messages are read back
+        self._history_cursors: LRUCache[str, _HistoryCursor] = LRUCache(maxsize=256)
+        # Background compactions in flight, by thread
+        self._compactions: dict[str, asyncio.Task[None]] = {}
+        # Tool schemas are hashed once; chat nodes get the full bundle only the first time
+        self._tool_bundle = ToolBundle.from_tools(
+            [tool.tool_schema for tool in tool_nodes] if tool_nodes is not None else []
+        )
+        self._tool_bundles: LRUCache[str, ToolBundle] = LRUCache(maxsize=256)
+        self._tool_bundles.put(self._tool_bundle.digest, self._tool_bundle)
+        self._shipped_tool_bundles: LRUCache[str, bool] = LRUCache(maxsize=256)
 
         self.tools_topic_registry: dict[str, str] | None = (
             {
@@ -149,23 +274,151 @@ class AgentRouterNode(BaseNode):
         ctx: EventEnvelope,
         correlation_id: Annotated[str, Context()],
         broker: BrokerAnnotation,
-    ) -> EventEnvelope:
+    ) -> EventEnvelope | None:
+        if ctx.tool_bundle_miss:
+            # The chat node could not serve the bundle from its cache: resend it in full
+            ctx.tool_bundle_miss = False
+            await self._call_model(ctx, correlation_id, broker, resend_tool_bundle=True)
+            return None
+
         if not ctx.has_uncommitted_messages:
-            return ctx
+            return ctx if self.emission_policy == "full" else None
 
         ctx.agent_name = self.name
 
-        # One central place where message history is updated
+        # Commit and decide under the thread's lock, so that of several tool results for the
+        # same thread arriving concurrently exactly one sees the complete set. Dispatch happens
+        # outside of it: publishing may re-enter this handler (e.g. with an in-memory broker).
+        async with self._thread_lock(ctx):
+            uncommitted_messages, stored_history = await self._commit_messages(ctx)
+
+            # Routing decisions are made on the full history, before any delta encoding
+            latest_message = ctx.latest_message_in_history
+            if isinstance(latest_message, ModelResponse):
+                self._track_tool_calls(ctx, latest_message)
+            model_ready = (
+                not isinstance(latest_message, ModelResponse)
+                and not ctx.pending_tool_calls
+                and self._tool_calls_settled(ctx, uncommitted_messages)
+            )
+
+        model_window = self._context_window(ctx) if model_ready else None
+        if (
+            self.delta_history
+            and stored_history is not None
+            and ctx.thread_id is not None
+            and model_window is None
+        ):
+            self._delta_encode_history(
+                ctx, ctx.thread_id, stored_history, new_count=len(uncommitted_messages)
+            )
+
+        if isinstance(latest_message, ModelResponse):
+            if latest_message.finish_reason == "tool_call" or latest_message.tool_calls:
+                await self._route_tool_calls(ctx, latest_message.tool_calls, correlation_id, broker)
+            else:
+                await self._reply_to_sender(ctx, correlation_id, broker)
+        elif ctx.pending_tool_calls:
+            await self._route_tool_calls(ctx, ctx.pending_tool_calls, correlation_id, broker)
+        elif model_ready:
+            await self._call_model(ctx, correlation_id, broker, message_history=model_window)
+
+        return self._select_emission(ctx, uncommitted_messages)
+
+    async def on_partitions_revoked(self, partitions: Collection[TopicPartition]) -> None:
+        """Forget locally tracked tool calls, since their threads may move to another replica.
+
+        Threads that come back fall back to scanning their stored history.
+        """
+        self._outstanding_tool_calls.clear()
+
+    def _thread_lock(self, ctx: EventEnvelope) -> AbstractAsyncContextManager[None]:
+        """The lock serializing history updates and routing decisions for the envelope's thread.
+
+        Without a store there is no shared per-thread state, so no lock is needed.
+        """
+        if self.message_history_store is None or ctx.thread_id is None:
+            return nullcontext()
+        return self._thread_locks(ctx.thread_id)
+
+    def _track_tool_calls(self, ctx: EventEnvelope, response: ModelResponse) -> None:
+        """Start tracking the tool calls of a new model response for the envelope's thread."""
+        if self.message_history_store is None or ctx.thread_id is None:
+            return
+        if response.tool_calls:
+            self._outstanding_tool_calls.put(
+                ctx.thread_id, {tool_call.tool_call_id for tool_call in response.tool_calls}
+            )
+        else:
+            self._outstanding_tool_calls.pop(ctx.thread_id)
+
+    def _tool_calls_settled(self, ctx: EventEnvelope, committed: list[ModelMessage]) -> bool:
+        """Check whether every tool call in the history has a result.
+
+        Tracked threads only look at the results committed on this hop. Threads that are
+        not tracked locally (no store, a restart, or a model response handled by another
+        replica) fall back to scanning the whole history with validate_tool_call_pairs.
+
+        Args:
+            ctx: The event envelope, with its message history already committed.
+            committed: The messages committed on this hop.
+
+        Returns:
+            True if no tool call is waiting on a result, False otherwise.
+        """
+        outstanding = (
+            self._outstanding_tool_calls.get(ctx.thread_id) if ctx.thread_id is not None else None
+        )
+        if outstanding is None:
+            return validate_tool_call_pairs(ctx.message_history)
+        for message in committed:
+            if isinstance(message, ModelRequest):
+                outstanding.difference_update(
+                    part.tool_call_id
+                    for part in message.parts
+                    if isinstance(part, (ToolReturnPart, RetryPromptPart))
+                )
+        if outstanding:
+            return False
+        self._outstanding_tool_calls.pop(cast(str, ctx.thread_id))
+        return True
+
+    async def _commit_messages(
+        self, ctx: EventEnvelope
+    ) -> tuple[list[ModelMessage], list[ModelMessage] | None]:
+        """Move the envelope's uncommitted messages into its message history.
+
+        This is the one central place where message history is updated.
+
+        Args:
+            ctx: The event envelope. Modified in place.
+
+        Returns:
+            The messages committed on this hop, and the thread's stored history when a
+            message_history_store and thread_id are available and the history has no
+            checkpoint (else None).
+        """
         uncommitted_messages = ctx.pop_all_uncommited_agent_messages()
+        if self.blob_store is not None:
+            uncommitted_messages = await offload_large_content(
+                uncommitted_messages, self.blob_store, threshold_bytes=self.offload_threshold_bytes
+            )
+        stored_history: list[ModelMessage] | None = None
         if self.message_history_store is not None and ctx.thread_id is not None:
-            await self.message_history_store.append_many(
-                thread_id=ctx.thread_id,
-                messages=uncommitted_messages,
-                scope=self.name,
+            checkpoint, stored_history = await self._append_to_store(
+                self.message_history_store, ctx.thread_id, uncommitted_messages
             )
-            ctx.message_history = await self.message_history_store.get(
-                thread_id=ctx.thread_id, scope=self.name
+            self._maybe_compact(
+                self.message_history_store, ctx.thread_id, checkpoint, stored_history
             )
+            # The history is rebuilt in full, so a reference left by an earlier hop is stale
+            ctx.history_ref = None
+            if checkpoint is not None:
+                ctx.message_history = [checkpoint.as_message(), *stored_history]
+                # The envelope no longer mirrors the stored history, so it cannot be delta encoded
+                stored_history = None
+            else:
+                ctx.message_history = list(stored_history)
         else:
             ctx.message_history.extend(uncommitted_messages)
 
@@ -177,23 +430,180 @@ class AgentRouterNode(BaseNode):
                 ctx.message_history,
                 [self.system_message],
             )
+        return uncommitted_messages, stored_history
+
+    async def _append_to_store(
+        self, store: MessageHistoryStore, thread_id: str, messages: list[ModelMessage]
+    ) -> tuple[HistoryCheckpoint | None, list[ModelMessage]]:
+        """Append messages to the thread's stored history and return the updated history.
+
+        The history read on the thread's previous hop is kept with the store version it
+        had. Appends are conditional on the store still being at that version. If it is,
+        only the messages from that point on are read back. If another writer (e.g. a
+        replica that handled the thread before a rebalance) got in first, the append is
+        retried at the new version and the whole history is reloaded, along with what
+        this router tracks about the thread, so routing decisions see the other writes.
+        Stores that do not track versions get unconditional appends and full reloads, as
+        do threads whose oldest messages the store trimmed to stay within its limits.
+        Histories with a checkpoint are read from the end of the checkpoint onwards.
+
+        Args:
+            store: The message history store.
+            thread_id: The thread to append to.
+            messages: The messages to append.
+
+        Returns:
+            The thread's latest checkpoint, if any, and its stored history after the
+            checkpoint, including the appended messages.
 
-        if isinstance(ctx.latest_message_in_history, ModelResponse):
-            if (
-                ctx.latest_message_in_history.finish_reason == "tool_call"
-                or ctx.latest_message_in_history.tool_calls
-            ):
-                await self._route_tool_calls(
-                    ctx, ctx.latest_message_in_history.tool_calls, correlation_id, broker
+        Raises:
+            VersionConflictError: If every attempt to append conflicted with another writer.
+        """
+        cursor = self._history_cursors.get(thread_id)
+        for attempt in range(1, _MAX_APPEND_ATTEMPTS + 1):
+            expected_version = (
+                cursor.version
+                if cursor is not None
+                else await store.version(thread_id, scope=self.name)
+            )
+            if expected_version is None:
+                await store.append_many(thread_id=thread_id, messages=messages, scope=self.name)
+                break
+            try:
+                await store.append_many(
+                    thread_id=thread_id,
+                    messages=messages,
+                    scope=self.name,
+                    expected_version=expected_version,
                 )
+                break
+            except VersionConflictError:
+                cursor = None
+                self._history_cursors.pop(thread_id)
+                self._outstanding_tool_calls.pop(thread_id)
+                if attempt == _MAX_APPEND_ATTEMPTS:
+                    raise
+        # Read the version before the messages: a write landing in between leaves the cursor
+        # stale, and the next hop reloads, rather than the cursor silently missing it
+        version = await store.version(thread_id, scope=self.name)
+        if cursor is not None and (
+            await store.count(thread_id, scope=self.name) != cursor.offset + len(messages)
+        ):
+            # A bounded store trimmed the thread's oldest messages while appending, so the
+            # positions the cursor points at moved
+            cursor = None
+        if cursor is None:
+            checkpoint = await store.load_checkpoint(thread_id, scope=self.name)
+            if checkpoint is None:
+                history = await store.get(thread_id=thread_id, scope=self.name)
             else:
-                await self._reply_to_sender(ctx, correlation_id, broker)
-        elif ctx.pending_tool_calls:
-            await self._route_tool_calls(ctx, ctx.pending_tool_calls, correlation_id, broker)
-        elif validate_tool_call_pairs(ctx.message_history):
-            await self._call_model(ctx, correlation_id, broker)
+                history = await store.get_since(thread_id, checkpoint.covers, scope=self.name)
+        else:
+            checkpoint = cursor.checkpoint
+            history = cursor.messages + await store.get_since(
+                thread_id, cursor.offset, scope=self.name
+            )
+        if version is not None:
+            self._history_cursors.put(thread_id, _HistoryCursor(version, history, checkpoint))
+        return checkpoint, history
+
+    def _maybe_compact(
+        self,
+        store: MessageHistoryStore,
+        thread_id: str,
+        checkpoint: HistoryCheckpoint | None,
+        history: list[ModelMessage],
+    ) -> None:
+        """Start compacting the thread's history in the background if it is over threshold.
+
+        Called with the thread's lock held, right after its history was read.
+        """
+        if self.compactor is None or thread_id in self._compactions:
+            return
+        if not self.compactor.needs_compaction(history):
+            return
+        self._compactions[thread_id] = asyncio.create_task(
+            self._compact(self.compactor, store, thread_id, checkpoint, history)
+        )
+
+    async def _compact(
+        self,
+        compactor: HistoryCompactor,
+        store: MessageHistoryStore,
+        thread_id: str,
+        previous: HistoryCheckpoint | None,
+        history: list[ModelMessage],
+    ) -> None:
+        """Summarize the thread's history after ``previous`` and save the new checkpoint.
+
+        Messages appended meanwhile are unaffected: a checkpoint only covers a prefix of
+        the history. Failures are logged, and the next hop over threshold tries again.
+        If the store turns out not to support checkpoints, compaction is turned off.
+        """
+        try:
+            checkpoint = await compactor.compact(history, previous)
+            if checkpoint is not None:
+                async with self._thread_locks(thread_id):
+                    await store.save_checkpoint(thread_id, checkpoint, scope=self.name)
+                    # Read the history from the new checkpoint on the next hop
+                    self._history_cursors.pop(thread_id)
+        except NotImplementedError:
+            logger.exception("Turning off compaction for %s", self.name)
+            self.compactor = None
+        except Exception:
+            # Nothing awaits the task, so this is the only place the error can surface
+            logger.exception("Compacting thread %r failed", thread_id)
+        finally:
+            del self._compactions[thread_id]
+
+    def _select_emission(
+        self, ctx: EventEnvelope, new_messages: list[ModelMessage]
+    ) -> EventEnvelope | None:
+        """Pick what to publish to the output topic for this hop, per the emission policy.
+
+        Args:
+            ctx: The event envelope after routing.
+            new_messages: The messages committed to the history on this hop.
+
+        Returns:
+            EventEnvelope | None: The envelope to publish, or None to publish nothing.
+        """
+        if self.emission_policy == "full":
+            return ctx
+        # _reply_to_sender has already published the final envelope to the output topic
+        final_sent_to_output = ctx.is_end_of_turn and (
+            ctx.final_response_topic is None or ctx.final_response_topic == self.publish_to_topic
+        )
+        if self.emission_policy == "final_only":
+            return ctx if ctx.is_end_of_turn and not final_sent_to_output else None
+        if final_sent_to_output:
+            return None
+        return ctx.model_copy(update={"message_history": new_messages, "history_ref": None})
 
-        return ctx
+    def _delta_encode_history(
+        self,
+        ctx: EventEnvelope,
+        thread_id: str,
+        stored_history: list[ModelMessage],
+        *,
+        new_count: int,
+    ) -> None:
+        """Replace the envelope's history with a store reference plus the newest messages.
+
+        The system prompt is not part of the stored history, so the effective
+        system message is carried on the envelope for the receiver to re-apply.
+
+        Args:
+            ctx: The event envelope. Modified in place.
+            thread_id: The thread the stored history belongs to.
+            stored_history: The history as currently persisted in the store.
+            new_count: How many messages were appended on this hop.
+        """
+        seq = max(len(stored_history) - new_count, 0)
+        ctx.history_ref = HistoryRef(thread_id=thread_id, scope=self.name, seq=seq)
+        ctx.message_history = stored_history[seq:]
+        if ctx.system_message is None:
+            ctx.system_message = self.system_message
 
     async def _route_tool(
         self,
@@ -281,29 +691,57 @@ class AgentRouterNode(BaseNode):
             correlation_id=correlation_id,
         )
 
+    def _context_window(self, ctx: EventEnvelope) -> list[ModelMessage] | None:
+        """Apply the context policy to the envelope's full message history.
+
+        Returns:
+            The messages to send to the model, or None if the whole history is sent.
+        """
+        if self.context_policy is None:
+            return None
+        window = self.context_policy.apply(ctx.message_history)
+        return None if window is ctx.message_history else window
+
     async def _call_model(
         self,
         event_envelope: EventEnvelope,
         correlation_id: str,
         broker: Any,
+        *,
+        resend_tool_bundle: bool = False,
+        message_history: list[ModelMessage] | None = None,
     ) -> None:
         """Send the message history to the chat node for LLM inference.
 
+        The tool bundle is sent in full the first time and as its digest only afterwards.
+
         Args:
             event_envelope: The event envelope to send. Modified in place.
             correlation_id: The correlation ID for request tracking.
             broker: The message broker for publishing.
+            resend_tool_bundle: Send the full tool bundle even if it was sent before,
+                e.g. because the chat node reported a cache miss.
+            message_history: Send these messages instead of the envelope's history,
+                e.g. as selected by the context policy. The envelope keeps its own.
         """
-        patch_model_request_params = event_envelope.patch_model_request_params
-        if patch_model_request_params is None:
-            patch_model_request_params = ModelRequestParameters(
-                function_tools=[tool.tool_schema for tool in self.tools]
-                if self.tools is not None
-                else []
-            )
-        event_envelope.patch_model_request_params = patch_model_request_params
+        bundle = self._resolve_tool_bundle(event_envelope, required=resend_tool_bundle)
+        if bundle is None:
+            # Bundle unknown to this replica (e.g. after a restart); the chat node
+            # most likely still has it cached, and reports a miss otherwise
+            event_envelope.patch_model_request_params = None
+        else:
+            event_envelope.tool_bundle_digest = bundle.digest
+            if resend_tool_bundle or bundle.digest not in self._shipped_tool_bundles:
+                event_envelope.patch_model_request_params = bundle.parameters
+                self._shipped_tool_bundles.put(bundle.digest, True)
+            else:
+                event_envelope.patch_model_request_params = None
         if event_envelope.name is None:
             event_envelope.name = self.name
+        if message_history is not None:
+            event_envelope = event_envelope.model_copy(
+                update={"message_history": message_history, "history_ref": None}
+            )
 
         await broker.publish(
             event_envelope,
@@ -312,6 +750,34 @@ class AgentRouterNode(BaseNode):
             reply_to=self.entrypoint_topic or self.subscribed_topic,
         )
 
+    def _resolve_tool_bundle(self, ctx: EventEnvelope, *, required: bool) -> ToolBundle | None:
+        """Find the tool bundle an envelope should be served with.
+
+        Priority: parameters patched in by the client > a previously seen bundle
+        referenced by digest > this router's own tools.
+
+        Args:
+            ctx: The event envelope.
+            required: If the envelope references a bundle unknown to this router,
+                fall back to this router's own tools instead of returning None.
+
+        Returns:
+            The bundle, or None if the envelope references a bundle unknown to this router.
+        """
+        params = ctx.patch_model_request_params
+        digest = ctx.tool_bundle_digest
+        if params is not None:
+            # Recompute the digest rather than trusting the envelope's: a wrong one
+            # would poison the cache for every later request referencing it
+            bundle = ToolBundle.from_parameters(params)
+            self._tool_bundles.put(bundle.digest, bundle)
+            return bundle
+        if digest is not None:
+            known = self._tool_bundles.get(digest)
+            if known is not None or not required:
+                return known
+        return self._tool_bundle
+
     async def invoke(
         self,
         *,
@@ -321,6 +787,7 @@ class AgentRouterNode(BaseNode):
         correlation_id: str,
         thread_id: str | None = None,
         deps: Any = None,
+        bypass_response_cache: bool = False,
     ) -> str:
         """Invoke the agent
 
@@ -329,26 +796,28 @@ class AgentRouterNode(BaseNode):
             broker (BrokerClient): The broker to connect to
             correlation_id (str | None, optional): Optionally provide a correlation ID
             for this request. Defaults to None.
+            bypass_response_cache (bool): Have the chat node call the model even if
+            its response cache holds a response. Defaults to False.
 
         Returns:
             str: The correlation ID for this request
         """
 
-        patch_model_request_params = (
-            ModelRequestParameters(function_tools=[tool.tool_schema for tool in self.tools])
-            if self.tools is not None
-            else None
-        )
         if not broker._connection:
             await broker.start()
 
         event_envelope = EventEnvelope(
             trace_id=correlation_id,
-            patch_model_request_params=patch_model_request_params,
+            # Runtime tool patch; only sent when this client was given its own tools
+            patch_model_request_params=(
+                self._tool_bundle.parameters if self.tools is not None else None
+            ),
+            tool_bundle_digest=self._tool_bundle.digest if self.tools is not None else None,
             thread_id=thread_id,
             system_message=self.system_message,
             final_response_topic=final_response_topic,
             deps=deps,
+            bypass_response_cache=bypass_response_cache,
         )
         event_envelope.mark_as_start_of_turn()
         event_envelope.prepare_uncommitted_agent_messages(
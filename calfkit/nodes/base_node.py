@@ -1,8 +1,9 @@
 from abc import ABC
-from collections.abc import Callable
+from collections.abc import Callable, Collection
 from functools import cached_property
 from typing import Any, TypedDict, cast
 
+from aiokafka import TopicPartition
 from pydantic import BaseModel
 
 
@@ -200,6 +201,21 @@ class BaseNode(ABC):
     async def invoke(self, *args: Any, **kwargs: Any) -> str:
         raise NotImplementedError()
 
+    async def on_partitions_assigned(self, partitions: Collection[TopicPartition]) -> None:
+        """Called when this replica is assigned partitions of the node's input topics.
+
+        Messages are keyed by thread_id, so a replica owns every hop of the threads
+        that hash to its partitions. Override to warm per-thread local state.
+        No-op by default.
+        """
+
+    async def on_partitions_revoked(self, partitions: Collection[TopicPartition]) -> None:
+        """Called before partitions of the node's input topics move to another replica.
+
+        Override to drop per-thread local state that this replica can no longer
+        keep consistent. No-op by default.
+        """
+
     async def _invoke_from_node(self, *args: Any, **kwargs: Any) -> None:
         """Internal use method for other nodes to use and communicate with this node
 
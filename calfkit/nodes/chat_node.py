@@ -1,11 +1,45 @@
+import json
 from abc import ABC
-from typing import Any, cast
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Annotated, Any, cast
 
-from calfkit._vendor.pydantic_ai import ModelResponse, ModelSettings
-from calfkit._vendor.pydantic_ai.direct import model_request
+from faststream import Context
+from faststream.kafka.annotations import (
+    KafkaBroker as BrokerAnnotation,
+)
+from faststream.kafka.annotations import (
+    KafkaMessage,
+)
+
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelResponse,
+    ModelResponseStreamEvent,
+    ModelSettings,
+    PartDeltaEvent,
+    PartStartEvent,
+    RequestUsage,
+    TextPart,
+    TextPartDelta,
+    ToolCallPart,
+    ToolCallPartDelta,
+)
+from calfkit._vendor.pydantic_ai.direct import model_request, model_request_stream
 from calfkit._vendor.pydantic_ai.models import Model, ModelRequestParameters
+from calfkit.blobs import BlobStore, has_blob_refs, resolve_blob_refs
+from calfkit.caches import ResponseCache, response_cache_key
+from calfkit.messages import patch_system_prompts
 from calfkit.models.event_envelope import EventEnvelope
+from calfkit.models.token_delta import TokenDelta
+from calfkit.models.tool_bundle import tool_bundle_digest
 from calfkit.nodes.base_node import BaseNode, publish_to, subscribe_to
+from calfkit.providers.rate_limit import ProviderRateLimiter
+from calfkit.stores.base import MessageHistoryStore
+from calfkit.utils import LRUCache, SingleFlight
 
 
 class ChatNode(BaseNode, ABC):
@@ -23,33 +57,367 @@ class ChatNode(BaseNode, ABC):
         input_topic: str | list[str] | None = None,
         output_topic: str | None = None,
         request_parameters: ModelRequestParameters | None = None,
+        message_history_store: MessageHistoryStore | None = None,
+        blob_store: BlobStore | None = None,
+        tool_bundle_cache_size: int = 128,
+        stream: bool = False,
+        stream_topic: str | None = None,
+        stream_flush_chars: int = 32,
+        stream_flush_interval: float = 0.05,
+        response_cache: ResponseCache | None = None,
+        single_flight: bool = False,
+        rate_limiter: ProviderRateLimiter | None = None,
         **kwargs: Any,
     ):
+        """Initialize a ChatNode.
+
+        Args:
+            model_client: The model client used for LLM inference.
+            name: Optional name, used to derive private input/output topics.
+            input_topic: Override the default input topic(s).
+            output_topic: Override the default output topic.
+            request_parameters: Default request parameters when the envelope carries none.
+            message_history_store: Store used to resolve delta-encoded envelopes
+                (see ``AgentRouterNode(delta_history=True)``). Must share its backing
+                data with the router's store.
+            blob_store: Store used to resolve content offloaded by the router
+                (see ``AgentRouterNode(blob_store=...)``). Must share its backing
+                data with the router's blob store.
+            tool_bundle_cache_size: How many tool bundles to keep cached by digest.
+            stream: Stream model responses, publishing ``TokenDelta`` chunks to
+                ``stream_topic`` under the request's correlation_id while they are
+                generated. The complete response is still published as usual.
+            stream_topic: Override the default stream topic.
+            stream_flush_chars: Coalesce deltas of a response part until they hold
+                this many characters...
+            stream_flush_interval: ...or until this many seconds passed since the
+                last delta was published.
+            response_cache: Cache serving repeated, identical model requests (see
+                ``calfkit.caches``). Requests with ``bypass_response_cache`` set skip
+                the lookup, but still refresh the cached response.
+            single_flight: Have identical requests that arrive while one of them is
+                being answered wait for that model call and share its response,
+                instead of calling the model again.
+            rate_limiter: Limiter admitting this node's model calls, shared with the
+                other nodes calling the same provider account. While a call waits for
+                budget, the node's Kafka consumer is paused, so that further requests
+                stay in Kafka instead of piling up in memory.
+            **kwargs: Additional keyword arguments passed to BaseNode.
+        """
         self.model_client = model_client
         self.request_parameters = request_parameters
+        self.message_history_store = message_history_store
+        self.blob_store = blob_store
+        # Tool bundles received from routers, by digest (see ToolBundle)
+        self._tool_bundles: LRUCache[str, ModelRequestParameters] = LRUCache(
+            maxsize=tool_bundle_cache_size
+        )
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        # Consumers paused by waiting calls, by id, and the number of calls waiting
+        self._paused_consumers: dict[int, int] = {}
+        self._flights: SingleFlight[ModelResponse] | None = (
+            SingleFlight() if single_flight else None
+        )
+        self.stream_flush_chars = stream_flush_chars
+        self.stream_flush_interval = stream_flush_interval
         if name is not None:
             if input_topic is None:
                 input_topic = f"ai_prompted.{name}"
             if output_topic is None:
                 output_topic = f"ai_generated.{name}"
+        if stream and stream_topic is None:
+            stream_topic = "ai_streamed" if name is None else f"ai_streamed.{name}"
+        self.stream_topic = stream_topic if stream else None
         super().__init__(name=name, input_topic=input_topic, output_topic=output_topic, **kwargs)
 
     @subscribe_to(_on_enter_topic_name)
     @publish_to(_post_to_topic_name)
-    async def _call_llm(self, event_envelope: EventEnvelope) -> EventEnvelope:
+    async def _call_llm(
+        self,
+        event_envelope: EventEnvelope,
+        correlation_id: Annotated[str, Context()],
+        broker: BrokerAnnotation,
+        message: KafkaMessage,
+    ) -> EventEnvelope:
         if self.model_client is None:
             raise RuntimeError("Unable to handle incoming request because Model client is None.")
         if event_envelope.latest_message_in_history is None:
             raise RuntimeError("latest message must not be None")
-        request_parameters = event_envelope.patch_model_request_params or self.request_parameters
+        patch_model_request_params = event_envelope.patch_model_request_params
+        digest = event_envelope.tool_bundle_digest
+        if digest is not None:
+            if patch_model_request_params is not None:
+                # Never trust the sender's digest: a wrong one would poison the cache
+                digest = tool_bundle_digest(patch_model_request_params)
+                event_envelope.tool_bundle_digest = digest
+                self._tool_bundles.put(digest, patch_model_request_params)
+            else:
+                patch_model_request_params = self._tool_bundles.get(digest)
+                if patch_model_request_params is None:
+                    # Ask the router to resend the bundle in full
+                    event_envelope.tool_bundle_miss = True
+                    return event_envelope
+            # Only the digest travels on from here
+            event_envelope.patch_model_request_params = None
+        message_history = await self._resolve_message_history(event_envelope)
+        message_history = await self._resolve_blob_refs(message_history)
+        request_parameters = patch_model_request_params or self.request_parameters
         patch_model_settings = event_envelope.patch_model_settings
-        model_response: ModelResponse = await model_request(
-            model=self.model_client,
-            messages=event_envelope.message_history,
-            model_settings=cast(ModelSettings | None, patch_model_settings),
-            model_request_parameters=request_parameters,
-        )
+        model_settings = cast(ModelSettings | None, patch_model_settings)
+        end_of_turn = not event_envelope.delegation_stack
+        model_client = self.model_client
+        request_key: str | None = None
+        if self.response_cache is not None or self._flights is not None:
+            request_key = response_cache_key(
+                f"{model_client.system}:{model_client.model_name}",
+                message_history,
+                request_parameters,
+                cast(dict[str, Any] | None, patch_model_settings),
+            )
+        cached_response: ModelResponse | None = None
+        if (
+            self.response_cache is not None
+            and request_key is not None
+            and not event_envelope.bypass_response_cache
+        ):
+            cached_response = await self.response_cache.get(request_key)
+
+        async def call_model() -> ModelResponse:
+            if self.rate_limiter is None:
+                return await request_model()
+            async with self.rate_limiter.limit(
+                message_history, while_waiting=self._pause_consumer(message)
+            ) as permit:
+                response = await request_model()
+                permit.record(response.usage)
+                return response
+
+        async def request_model() -> ModelResponse:
+            if self.stream_topic is None:
+                return await model_request(
+                    model=model_client,
+                    messages=message_history,
+                    model_settings=model_settings,
+                    model_request_parameters=request_parameters,
+                )
+            return await self._stream_model_response(
+                model_client,
+                message_history,
+                model_settings,
+                request_parameters,
+                end_of_turn=end_of_turn,
+                correlation_id=correlation_id,
+                broker=broker,
+            )
+
+        model_response: ModelResponse
+        shared = False
+        if cached_response is not None:
+            # Fresh copy: no tokens were spent on it, and the node may rename it
+            model_response = replace(
+                cached_response, timestamp=datetime.now(timezone.utc), usage=RequestUsage()
+            )
+            await self._publish_whole_response(model_response, end_of_turn, correlation_id, broker)
+        elif self._flights is not None and request_key is not None:
+            # Identical requests in flight share one model call; each gets its own copy
+            model_response, shared = await self._flights.do(request_key, call_model)
+            if shared:
+                model_response = replace(model_response, usage=RequestUsage())
+                await self._publish_whole_response(
+                    model_response, end_of_turn, correlation_id, broker
+                )
+            else:
+                model_response = replace(model_response)
+        else:
+            model_response = await call_model()
+        if (
+            self.response_cache is not None
+            and request_key is not None
+            and cached_response is None
+            and not shared
+        ):
+            await self.response_cache.put(request_key, replace(model_response))
         if event_envelope.name is not None:
             model_response.name = event_envelope.name
         event_envelope.add_to_uncommitted_messages(model_response)
         return event_envelope
+
+    @contextmanager
+    def _pause_consumer(self, message: Any) -> Iterator[None]:
+        """Pause fetching from the partitions of the consumer that delivered ``message``."""
+        consumer: Any = getattr(message, "consumer", None)
+        if not hasattr(consumer, "pause"):
+            # e.g. the fake consumer of a test broker
+            yield
+            return
+        key = id(consumer)
+        if key not in self._paused_consumers:
+            consumer.pause(*consumer.assignment())
+        self._paused_consumers[key] = self._paused_consumers.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            self._paused_consumers[key] -= 1
+            if self._paused_consumers[key] == 0:
+                del self._paused_consumers[key]
+                consumer.resume(*consumer.paused())
+
+    async def _publish_whole_response(
+        self, model_response: ModelResponse, end_of_turn: bool, correlation_id: str, broker: Any
+    ) -> None:
+        """Publish a response that was not generated for this request as a single delta."""
+        if self.stream_topic is None:
+            return
+        await broker.publish(
+            TokenDelta(
+                text=model_response.text or "",
+                done=True,
+                end_of_turn=end_of_turn and not model_response.tool_calls,
+            ),
+            topic=self.stream_topic,
+            correlation_id=correlation_id,
+        )
+
+    async def _stream_model_response(
+        self,
+        model_client: Model,
+        message_history: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        request_parameters: ModelRequestParameters | None,
+        *,
+        end_of_turn: bool,
+        correlation_id: str,
+        broker: Any,
+    ) -> ModelResponse:
+        """Request a streamed model response, publishing its deltas as they arrive.
+
+        Args:
+            model_client: The model client to request.
+            message_history: The full message history to send to the model.
+            model_settings: Optional model settings.
+            request_parameters: Optional model request parameters.
+            end_of_turn: Whether a response without tool calls ends the turn. False
+                for delegated agents, whose final response goes back to their caller.
+            correlation_id: The correlation ID to publish the deltas under.
+            broker: The message broker for publishing.
+
+        Returns:
+            The complete model response.
+        """
+
+        async def publish(delta: TokenDelta) -> None:
+            await broker.publish(delta, topic=self.stream_topic, correlation_id=correlation_id)
+
+        pending: TokenDelta | None = None
+        last_flush = monotonic()
+        async with model_request_stream(
+            model=model_client,
+            messages=message_history,
+            model_settings=model_settings,
+            model_request_parameters=request_parameters,
+        ) as stream:
+            async for event in stream:
+                delta = _token_delta(event)
+                if delta is None or delta.is_empty:
+                    continue
+                if pending is not None and pending.part_index == delta.part_index:
+                    pending = _merge_deltas(pending, delta)
+                else:
+                    if pending is not None:
+                        await publish(pending)
+                    pending = delta
+                if (
+                    len(pending.text) + len(pending.args) >= self.stream_flush_chars
+                    or monotonic() - last_flush >= self.stream_flush_interval
+                ):
+                    await publish(pending)
+                    pending = None
+                    last_flush = monotonic()
+            model_response = stream.get()
+        last = pending or TokenDelta(part_index=max(len(model_response.parts) - 1, 0))
+        last.done = True
+        last.end_of_turn = end_of_turn and not model_response.tool_calls
+        await publish(last)
+        return model_response
+
+    async def _resolve_message_history(self, event_envelope: EventEnvelope) -> list[ModelMessage]:
+        """Rebuild the full message history of a possibly delta-encoded envelope.
+
+        Args:
+            event_envelope: The incoming event envelope.
+
+        Returns:
+            The full message history to send to the model.
+        """
+        ref = event_envelope.history_ref
+        if ref is None:
+            return event_envelope.message_history
+        if self.message_history_store is None:
+            raise RuntimeError(
+                "Received a delta-encoded envelope but no message_history_store is configured."
+            )
+        stored = await self.message_history_store.get(ref.thread_id, ref.scope)
+        message_history = stored[: ref.seq] + event_envelope.message_history
+        if event_envelope.system_message is not None:
+            message_history = patch_system_prompts(message_history, [event_envelope.system_message])
+        return message_history
+
+    async def _resolve_blob_refs(self, message_history: list[ModelMessage]) -> list[ModelMessage]:
+        """Load content offloaded to the blob store back into the message history.
+
+        Args:
+            message_history: The full message history, possibly holding blob references.
+
+        Returns:
+            The message history with all offloaded content restored.
+        """
+        if self.blob_store is None:
+            if has_blob_refs(message_history):
+                raise RuntimeError(
+                    "Received offloaded message content but no blob_store is configured."
+                )
+            return message_history
+        return await resolve_blob_refs(message_history, self.blob_store)
+
+
+def _token_delta(event: ModelResponseStreamEvent) -> TokenDelta | None:
+    """Translate a text or tool call stream event into a TokenDelta. None for other events."""
+    if isinstance(event, PartStartEvent):
+        part = event.part
+        if isinstance(part, TextPart):
+            return TokenDelta(part_index=event.index, text=part.content)
+        if isinstance(part, ToolCallPart):
+            return TokenDelta(
+                part_index=event.index,
+                tool_name=part.tool_name,
+                tool_call_id=part.tool_call_id,
+                args=part.args_as_json_str() if part.args else "",
+            )
+    elif isinstance(event, PartDeltaEvent):
+        part_delta = event.delta
+        if isinstance(part_delta, TextPartDelta):
+            return TokenDelta(part_index=event.index, text=part_delta.content_delta)
+        if isinstance(part_delta, ToolCallPartDelta):
+            args = part_delta.args_delta
+            return TokenDelta(
+                part_index=event.index,
+                tool_name=part_delta.tool_name_delta,
+                tool_call_id=part_delta.tool_call_id,
+                args=json.dumps(args) if isinstance(args, dict) else args or "",
+            )
+    return None
+
+
+def _merge_deltas(pending: TokenDelta, delta: TokenDelta) -> TokenDelta:
+    """Coalesce a delta into the pending one of the same part."""
+    tool_name = pending.tool_name
+    if delta.tool_name is not None:
+        tool_name = (tool_name or "") + delta.tool_name
+    return TokenDelta(
+        part_index=pending.part_index,
+        text=pending.text + delta.text,
+        tool_name=tool_name,
+        tool_call_id=pending.tool_call_id or delta.tool_call_id,
+        args=pending.args + delta.args,
+    )
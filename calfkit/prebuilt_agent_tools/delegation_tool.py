@@ -8,6 +8,7 @@ from faststream.kafka.annotations import (
 from calfkit._vendor.pydantic_ai import ModelRequest, ModelResponse, ToolReturnPart
 from calfkit._vendor.pydantic_ai.tools import Tool, ToolDefinition
 from calfkit.models.delegation import DelegationFrame
+from calfkit.models.envelope_view import EventEnvelopeView
 from calfkit.models.event_envelope import EventEnvelope
 from calfkit.nodes.base_node import BaseNode, entrypoint, returnpoint
 from calfkit.nodes.base_tool_node import BaseToolNode
@@ -123,10 +124,12 @@ Args:
         delegation = event_envelope.model_copy(deep=True)
         delegation.push_delegation_frame(frame)
         delegation.message_history = []
+        delegation.history_ref = None
         delegation.final_response_topic = self.returnpoint_topic
         delegation.pending_tool_calls = []
         delegation.tool_call_request = None
         delegation.patch_model_request_params = None
+        delegation.tool_bundle_digest = None
         delegation.system_message = None
         delegation.name = None
 
@@ -152,11 +155,15 @@ Args:
     @returnpoint("tool_node.delegation.response.{name}")
     async def on_delegation_response(
         self,
-        event_envelope: EventEnvelope,
+        event_envelope: EventEnvelopeView,
         correlation_id: Annotated[str, Context()],
         broker: BrokerAnnotation,
     ) -> None:
-        frame = event_envelope.pop_delegation_frame()
+        # Only the routing fields and the final message are needed, so the sub-agent's
+        # history is not validated
+        if not event_envelope.delegation_stack:
+            raise IndexError("Cannot pop from an empty delegation stack")
+        *delegation_stack, frame = event_envelope.delegation_stack
 
         # Extract the sub-agent's final response text
         last_msg = event_envelope.latest_message_in_history
@@ -176,7 +183,7 @@ Args:
             trace_id=event_envelope.trace_id,
             thread_id=event_envelope.thread_id,
             final_response_topic=frame.caller_final_response_topic,
-            delegation_stack=event_envelope.delegation_stack,
+            delegation_stack=delegation_stack,
         )
         response.prepare_uncommitted_agent_messages([ModelRequest(parts=[tool_result])])
 
@@ -1,5 +1,12 @@
 """Calf LLM Provider System."""
 
-from calfkit.providers.pydantic_ai import OpenAIModelClient
+from calfkit.providers.pydantic_ai import HedgedModel, LatencyStats, OpenAIModelClient
+from calfkit.providers.rate_limit import ProviderRateLimiter, RateLimitPermit
 
-__all__ = ["OpenAIModelClient"]
+__all__ = [
+    "HedgedModel",
+    "LatencyStats",
+    "OpenAIModelClient",
+    "ProviderRateLimiter",
+    "RateLimitPermit",
+]
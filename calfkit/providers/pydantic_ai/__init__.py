@@ -1,3 +1,4 @@
+from calfkit.providers.pydantic_ai.hedged import HedgedModel, LatencyStats
 from calfkit.providers.pydantic_ai.openai import OpenAIModelClient
 
-__all__ = ["OpenAIModelClient"]
+__all__ = ["HedgedModel", "LatencyStats", "OpenAIModelClient"]
@@ -0,0 +1,200 @@
+import asyncio
+import math
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import cached_property
+from time import perf_counter
+from typing import Any
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelResponse, ModelSettings
+from calfkit._vendor.pydantic_ai._run_context import RunContext
+from calfkit._vendor.pydantic_ai.models import (
+    KnownModelName,
+    Model,
+    ModelRequestParameters,
+    StreamedResponse,
+    infer_model,
+)
+from calfkit._vendor.pydantic_ai.profiles import ModelProfile
+
+
+class LatencyStats:
+    """Latencies of a model's most recent requests.
+
+    Requests cancelled before they answered count with the time until they were
+    cancelled, a lower bound of their latency.
+    """
+
+    def __init__(self, window: int):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """The ``q`` quantile (0 to 1) of the recorded latencies, or None if there are none."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgedModel(Model):
+    """A model that hedges slow requests with a second model.
+
+    Requests go to the primary model. If it has not answered after the hedge delay,
+    the same request is also sent to the hedge model; the first successful response
+    wins and the other request is cancelled. A request only fails if every model it
+    was sent to failed.
+
+    Unless a fixed ``delay`` is given, the hedge delay is the ``percentile`` of the
+    primary model's recent latencies, so only about ``1 - percentile`` of requests
+    are sent twice. Streamed requests are not hedged and go to the primary model.
+
+    Example::
+
+        model_client = HedgedModel(
+            OpenAIModelClient("gpt-4.1-mini"),
+            OpenAIModelClient("gpt-4.1-mini", base_url="https://backup.example.com/v1"),
+        )
+        chat_node = ChatNode(model_client)
+    """
+
+    def __init__(
+        self,
+        primary_model: Model | KnownModelName | str,
+        hedge_model: Model | KnownModelName | str,
+        *,
+        delay: float | None = None,
+        percentile: float = 0.95,
+        initial_delay: float = 2.0,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        """Initialize a HedgedModel.
+
+        Args:
+            primary_model: The name or instance of the model every request is sent to.
+            hedge_model: The name or instance of the model slow requests are also sent to.
+            delay: Fixed number of seconds after which to hedge. None to derive it from
+                the primary model's latencies.
+            percentile: Quantile (0 to 1) of the primary model's latencies to hedge at.
+            initial_delay: Delay used until ``min_samples`` latencies were recorded.
+            window: Number of recent latencies kept per model.
+            min_samples: Number of latencies needed before the delay is derived from them.
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        super().__init__()
+        self.primary_model = infer_model(primary_model)
+        self.hedge_model = infer_model(hedge_model)
+        self.delay = delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        # By role rather than model name: both may be the same model on different endpoints
+        self.latency_stats = {"primary": LatencyStats(window), "hedge": LatencyStats(window)}
+        self._primary_stats = self.latency_stats["primary"]
+        self._hedge_stats = self.latency_stats["hedge"]
+        self.hedged_requests = 0
+        """Number of requests that were also sent to the hedge model."""
+        self.hedge_wins = 0
+        """Number of hedged requests answered by the hedge model."""
+
+    @property
+    def model_name(self) -> str:
+        """The model name."""
+        return f"hedged:{self.primary_model.model_name},{self.hedge_model.model_name}"
+
+    @property
+    def system(self) -> str:
+        return f"hedged:{self.primary_model.system},{self.hedge_model.system}"
+
+    @property
+    def base_url(self) -> str | None:
+        return self.primary_model.base_url
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary model before hedging a request."""
+        if self.delay is not None:
+            return self.delay
+        if len(self._primary_stats) < self.min_samples:
+            return self.initial_delay
+        return self._primary_stats.percentile(self.percentile) or self.initial_delay
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        """Send the request to the primary model, and to the hedge model if it is slow."""
+
+        async def timed(model: Model, stats: LatencyStats) -> ModelResponse:
+            started = perf_counter()
+            try:
+                response = await model.request(messages, model_settings, model_request_parameters)
+            except asyncio.CancelledError:
+                # Lost the race. Leaving it out would only keep the latencies fast enough
+                # to win, and the hedge delay would keep falling
+                stats.record(perf_counter() - started)
+                raise
+            stats.record(perf_counter() - started)
+            return response
+
+        primary = asyncio.ensure_future(timed(self.primary_model, self._primary_stats))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                return primary.result()
+
+            self.hedged_requests += 1
+            hedge = asyncio.ensure_future(timed(self.hedge_model, self._hedge_stats))
+            tasks.append(hedge)
+            pending: set[asyncio.Future[ModelResponse]] = {primary, hedge}
+            errors: dict[asyncio.Future[ModelResponse], BaseException] = {}
+            while pending:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                errors.update((task, exc) for task in finished if (exc := task.exception()))
+                winner = next((task for task in finished if task not in errors), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self.hedge_wins += 1
+                    return winner.result()
+            raise errors[primary]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: RunContext[Any] | None = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        """Stream the response of the primary model. Streamed requests are not hedged."""
+        async with self.primary_model.request_stream(
+            messages, model_settings, model_request_parameters, run_context
+        ) as response:
+            yield response
+
+    @cached_property
+    def profile(self) -> ModelProfile:
+        return self.primary_model.profile
+
+    def customize_request_parameters(
+        self, model_request_parameters: ModelRequestParameters
+    ) -> ModelRequestParameters:
+        return model_request_parameters
+
+    def prepare_request(
+        self, model_settings: ModelSettings | None, model_request_parameters: ModelRequestParameters
+    ) -> tuple[ModelSettings | None, ModelRequestParameters]:
+        return model_settings, model_request_parameters
@@ -1,9 +1,14 @@
 from typing import Any
 
 from httpx import Timeout
+from openai.types import chat
 
+from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
 from calfkit._vendor.pydantic_ai.models.openai import OpenAIChatModel, OpenAIChatModelSettings
 from calfkit._vendor.pydantic_ai.providers.openai import OpenAIProvider
+from calfkit.utils import LRUCache
+
+_PARAMETERS_CACHE_SIZE = 64
 
 
 class OpenAIModelClient(OpenAIChatModel):
@@ -60,3 +65,34 @@ class OpenAIModelClient(OpenAIChatModel):
         openai_client = OpenAIProvider(base_url=base_url, api_key=api_key)
         self.model_settings = model_settings
         super().__init__(model_name, provider=openai_client, settings=model_settings)
+        # Chat nodes serve each tool bundle as one long-lived ModelRequestParameters object,
+        # so schema customization and tool mapping are memoized per bundle (by identity)
+        self._customized_parameters: LRUCache[
+            int, tuple[ModelRequestParameters, ModelRequestParameters]
+        ] = LRUCache(maxsize=_PARAMETERS_CACHE_SIZE)
+        self._mapped_tools: LRUCache[
+            int, tuple[ModelRequestParameters, list[chat.ChatCompletionToolParam]]
+        ] = LRUCache(maxsize=_PARAMETERS_CACHE_SIZE)
+
+    def customize_request_parameters(
+        self, model_request_parameters: ModelRequestParameters
+    ) -> ModelRequestParameters:
+        cached = self._customized_parameters.get(id(model_request_parameters))
+        # The cache holds a reference to the key object, so its id cannot be reused
+        if cached is not None and cached[0] is model_request_parameters:
+            return cached[1]
+        customized = super().customize_request_parameters(model_request_parameters)
+        self._customized_parameters.put(
+            id(model_request_parameters), (model_request_parameters, customized)
+        )
+        return customized
+
+    def _get_tools(
+        self, model_request_parameters: ModelRequestParameters
+    ) -> list[chat.ChatCompletionToolParam]:
+        cached = self._mapped_tools.get(id(model_request_parameters))
+        if cached is not None and cached[0] is model_request_parameters:
+            return list(cached[1])
+        tools = super()._get_tools(model_request_parameters)
+        self._mapped_tools.put(id(model_request_parameters), (model_request_parameters, tools))
+        return list(tools)
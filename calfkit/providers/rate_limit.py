@@ -0,0 +1,208 @@
+import asyncio
+from collections.abc import AsyncIterator, Sequence
+from contextlib import AbstractContextManager, asynccontextmanager, nullcontext
+from dataclasses import dataclass, field
+from time import monotonic
+
+from calfkit._vendor.pydantic_ai import ModelMessage
+from calfkit._vendor.pydantic_ai.exceptions import ModelHTTPError
+from calfkit._vendor.pydantic_ai.usage import RequestUsage
+from calfkit.messages import TokenEstimator, estimate_message_tokens
+
+
+class _TokenBucket:
+    """A budget of ``per_minute`` units that refills continuously."""
+
+    def __init__(self, per_minute: int):
+        if per_minute < 1:
+            raise ValueError("Rate limits must be at least 1 per minute")
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.available = self.capacity
+        self._updated = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` is available. Larger amounts than fit wait for a full bucket."""
+        self._refill()
+        deficit = min(amount, self.capacity) - self.available
+        return max(deficit / self.rate, 0.0)
+
+    def take(self, amount: float) -> None:
+        """Spend ``amount``, which may leave the bucket in debt."""
+        self._refill()
+        self.available -= amount
+
+    def drain(self) -> None:
+        self._refill()
+        self.available = min(self.available, 0.0)
+
+
+@dataclass
+class RateLimitPermit:
+    """A model call admitted by a ProviderRateLimiter."""
+
+    estimated_tokens: int
+    started: float = field(default_factory=monotonic)
+    usage: RequestUsage | None = None
+    """Usage reported by the provider, set with ``record``."""
+
+    def record(self, usage: RequestUsage) -> None:
+        """Report the call's actual usage, to correct the tokens-per-minute budget."""
+        self.usage = usage
+
+
+class ProviderRateLimiter:
+    """Client-side rate limiter for a model provider, shared by the nodes calling it.
+
+    Admits model calls within a requests-per-minute and a tokens-per-minute budget.
+    Calls reserve the estimated tokens of their input up front; the difference to the
+    usage reported by the provider is settled when they complete.
+
+    The number of concurrent calls adapts with AIMD: it grows by about one per
+    round of successful calls, and halves when the provider answers 429 or the
+    average latency climbs above ``latency_tolerance`` times the lowest observed.
+
+    Example::
+
+        limiter = ProviderRateLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+        chat_node = ChatNode(model_client, rate_limiter=limiter)
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_concurrency: int = 64,
+        min_concurrency: int = 1,
+        latency_tolerance: float = 2.0,
+        estimator: TokenEstimator = estimate_message_tokens,
+    ):
+        """Initialize a ProviderRateLimiter.
+
+        Args:
+            requests_per_minute: The provider's request limit. None for no limit.
+            tokens_per_minute: The provider's token limit (input plus output). None for
+                no limit.
+            max_concurrency: Upper bound, and starting point, of the concurrency limit.
+            min_concurrency: Lower bound of the concurrency limit.
+            latency_tolerance: Back off when the average call latency exceeds the
+                lowest observed latency by this factor.
+            estimator: Estimates the tokens of one message.
+        """
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency bounds must satisfy 1 <= min_concurrency <= max")
+        if latency_tolerance <= 1:
+            raise ValueError("latency_tolerance must be greater than 1")
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.estimator = estimator
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._min_latency: float | None = None
+        self._avg_latency: float | None = None
+        self._last_backoff = 0.0
+        self._condition = asyncio.Condition()
+
+    def _delay(self, estimated_tokens: int) -> float | None:
+        """Seconds until a call can be admitted by the budgets, or None if it waits on a slot."""
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+        delay = 0.0
+        if self._requests is not None:
+            delay = max(delay, self._requests.delay(1))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.delay(estimated_tokens))
+        return delay
+
+    @asynccontextmanager
+    async def limit(
+        self,
+        messages: Sequence[ModelMessage],
+        *,
+        while_waiting: AbstractContextManager[object] | None = None,
+    ) -> AsyncIterator[RateLimitPermit]:
+        """Wait until a model call may start, and track it until it completes.
+
+        Args:
+            messages: The message history the call sends, to estimate its input tokens.
+            while_waiting: Entered while the call has to wait, e.g. to pause consuming
+                further requests. Not entered if the call is admitted right away.
+
+        Returns:
+            The permit of the call. Report the provider's usage with ``record``.
+        """
+        estimated_tokens = sum(self.estimator(message) for message in messages)
+        waiting = nullcontext() if while_waiting is None else while_waiting
+        entered = False
+        try:
+            async with self._condition:
+                while (delay := self._delay(estimated_tokens)) != 0.0:
+                    if not entered:
+                        waiting.__enter__()
+                        entered = True
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        # Not a builtin TimeoutError before Python 3.11
+                        pass
+                if self._requests is not None:
+                    self._requests.take(1)
+                if self._tokens is not None:
+                    self._tokens.take(estimated_tokens)
+                self.in_flight += 1
+        finally:
+            if entered:
+                waiting.__exit__(None, None, None)
+
+        permit = RateLimitPermit(estimated_tokens)
+        try:
+            yield permit
+        except ModelHTTPError as e:
+            if e.status_code == 429:
+                self._back_off(permit)
+                if self._requests is not None:
+                    self._requests.drain()
+            raise
+        else:
+            self._observe(permit)
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _observe(self, permit: RateLimitPermit) -> None:
+        """Settle the token budget and adapt the concurrency limit after a successful call."""
+        if self._tokens is not None and permit.usage is not None:
+            actual = permit.usage.input_tokens + permit.usage.output_tokens
+            self._tokens.take(actual - permit.estimated_tokens)
+        latency = monotonic() - permit.started
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        if self._avg_latency is None:
+            self._avg_latency = latency
+        else:
+            self._avg_latency += 0.2 * (latency - self._avg_latency)
+        if self._avg_latency > self.latency_tolerance * self._min_latency:
+            self._back_off(permit)
+        else:
+            self.concurrency_limit = min(
+                self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit
+            )
+
+    def _back_off(self, permit: RateLimitPermit) -> None:
+        # Once per round: calls started before the last back-off saw the old limit
+        if permit.started < self._last_backoff:
+            return
+        self._last_backoff = monotonic()
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+        # Judge the new limit on fresh samples
+        self._avg_latency = None
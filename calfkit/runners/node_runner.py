@@ -3,6 +3,7 @@ from typing import Any, TypeAlias
 from calfkit.broker.broker import BrokerClient
 from calfkit.nodes.base_node import BaseNode
 from calfkit.nodes.registrator import Registrator
+from calfkit.runners.rebalance import NodeRebalanceListener
 
 
 class NodeRunner(Registrator):
@@ -22,6 +23,10 @@ class NodeRunner(Registrator):
         extra_publish_kwargs: dict[str, Any] = {},
         extra_subscribe_kwargs: dict[str, Any] = {},
     ) -> None:
+        extra_subscribe_kwargs = {
+            "listener": NodeRebalanceListener(self.node),
+            **extra_subscribe_kwargs,
+        }
         for handler_fn, topics_dict in self.node.bound_registry.items():
             pub: str | None = topics_dict.get("publish_topic")
             subs: list[str] = topics_dict.get("subscribe_topics", [])
@@ -0,0 +1,19 @@
+from collections.abc import Collection
+
+from aiokafka import TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+
+from calfkit.nodes.base_node import BaseNode
+
+
+class NodeRebalanceListener(ConsumerRebalanceListener):  # type: ignore[misc]
+    """Forwards consumer group rebalances of a node's subscribers to the node's hooks."""
+
+    def __init__(self, node: BaseNode):
+        self.node = node
+
+    async def on_partitions_revoked(self, revoked: Collection[TopicPartition]) -> None:
+        await self.node.on_partitions_revoked(revoked)
+
+    async def on_partitions_assigned(self, assigned: Collection[TopicPartition]) -> None:
+        await self.node.on_partitions_assigned(assigned)
@@ -2,6 +2,7 @@ from typing import Any
 
 from calfkit.broker.broker import BrokerClient
 from calfkit.nodes.base_node import BaseNode
+from calfkit.runners.rebalance import NodeRebalanceListener
 
 
 class NodesService:
@@ -21,6 +22,11 @@ class NodesService:
     ) -> None:
         if group_id is None and node.name is not None:
             group_id = node.name
+        if group_id is not None:
+            extra_subscribe_kwargs = {
+                "listener": NodeRebalanceListener(node),
+                **extra_subscribe_kwargs,
+            }
         for handler_fn, topics_dict in node.bound_registry.items():
             pub: str | None = topics_dict.get("publish_topic")
             if pub is not None:
@@ -1,33 +1,52 @@
 import asyncio
 import math
 from collections.abc import AsyncGenerator, Callable
-from typing import Annotated, Any, Generic, overload
+from typing import Any, Generic, overload
 
 import uuid_utils
 from anyio import create_memory_object_stream
-from faststream import Context
+from faststream.kafka.annotations import KafkaMessage
 from typing_extensions import TypeVar
 
 from calfkit._vendor.pydantic_ai import ModelMessage
 from calfkit.broker.broker import BrokerClient
+from calfkit.broker.codec import decode_envelope, defer_envelope_decoding
 from calfkit.models.event_envelope import EventEnvelope
+from calfkit.models.token_delta import TokenDelta
 from calfkit.nodes.agent_router_node import AgentRouterNode
 
 AgentDepsT = TypeVar("AgentDepsT", default=None)
 
+# Seconds to keep waiting for the last token deltas after the final response arrived
+# first (they travel on another topic). Normally they arrive well before it.
+_TOKEN_STREAM_GRACE = 5.0
+
 
 class InvokeResponse:
     def __init__(
         self,
         correlation_id: str,
+        *,
+        stream_tokens: bool = False,
     ):
         self.send, self.receive = create_memory_object_stream[EventEnvelope](
             max_buffer_size=math.inf
         )
+        self._send_delta, self._receive_delta = create_memory_object_stream[TokenDelta](
+            max_buffer_size=math.inf
+        )
         self._done = asyncio.Event()
         self._final_response: ModelMessage | None = None
+        self._error: BaseException | None = None
         self.correlation_id = correlation_id
-        self._cleanup_task: asyncio.Task[None] | None = None
+        self._timeout_handle: asyncio.TimerHandle | None = None
+        self._stream_tokens = stream_tokens
+        self._tokens_done = not stream_tokens
+        self._grace_handle: asyncio.TimerHandle | None = None
+        # Called once both the replies and the token deltas are complete
+        self._on_complete: Callable[[], object] | None = None
+        if not stream_tokens:
+            self._send_delta.close()
 
     async def _put(self, item: EventEnvelope) -> None:
         if self.finished:
@@ -35,8 +54,47 @@ class InvokeResponse:
         await self.send.send(item)
         if item.is_end_of_turn:
             self._final_response = item.latest_message_in_history
-            await self.send.aclose()
-            self._done.set()
+            self._close()
+            if not self._tokens_done:
+                self._grace_handle = asyncio.get_running_loop().call_later(
+                    _TOKEN_STREAM_GRACE, self._close_tokens
+                )
+            self._maybe_complete()
+
+    async def _put_delta(self, delta: TokenDelta) -> None:
+        if self._tokens_done:
+            return
+        await self._send_delta.send(delta)
+        if delta.end_of_turn:
+            self._close_tokens()
+
+    def _fail(self, error: BaseException) -> None:
+        """Terminate the response with an error, e.g. when the request times out."""
+        if self.finished:
+            return
+        self._error = error
+        self._close()
+        self._close_tokens()
+
+    def _close(self) -> None:
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+        self.send.close()
+        self._done.set()
+
+    def _close_tokens(self) -> None:
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        self._tokens_done = True
+        self._send_delta.close()
+        self._maybe_complete()
+
+    def _maybe_complete(self) -> None:
+        if self.finished and self._tokens_done and self._on_complete is not None:
+            on_complete, self._on_complete = self._on_complete, None
+            on_complete()
 
     async def messages_stream(self) -> AsyncGenerator[ModelMessage, None]:
         """Can be used to stream all agent's actions and thinking prior to the final response
@@ -48,26 +106,69 @@ class InvokeResponse:
             if item.latest_message_in_history:
                 yield item.latest_message_in_history
 
+    async def token_stream(self) -> AsyncGenerator[TokenDelta, None]:
+        """Stream the model's text and tool call deltas of the turn as they are generated.
+
+        Requires a streaming chat node (``ChatNode(stream=True)``). Ends after the
+        final response of the turn. Consumes the same deltas as :meth:`text_stream`,
+        so use one or the other.
+
+        Returns:
+            TokenDelta: Coalesced chunks of the model responses, in order.
+
+        Raises:
+            RuntimeError: If the client was not set up to stream tokens.
+        """
+        if not self._stream_tokens:
+            raise RuntimeError(
+                "Token streaming is not enabled: the router's chat node does not stream"
+                " and no stream_topic was given to the RouterServiceClient"
+            )
+        async for delta in self._receive_delta:
+            yield delta
+
+    async def text_stream(self) -> AsyncGenerator[str, None]:
+        """Stream the text the model generates during the turn, as it is generated.
+
+        See :meth:`token_stream`.
+
+        Returns:
+            str: Chunks of text, in order.
+        """
+        async for delta in self.token_stream():
+            if delta.text:
+                yield delta.text
+
     async def get_final_response(self) -> ModelMessage:
         """Blocks until final response is received and returns it.
 
         Returns:
             ModelMessage: The final response message from the model
+
+        Raises:
+            TimeoutError: If the request timed out before the final response arrived.
         """
         if not self.finished:
             await self._done.wait()
+        if self._error is not None:
+            raise self._error
         if self._final_response is None:
             raise RuntimeError("Final response not available")
         return self._final_response
 
     @property
     def finished(self) -> bool:
-        return self._final_response is not None
+        return self._final_response is not None or self._error is not None
 
 
 class RouterServiceClient(Generic[AgentDepsT]):
     """Client for invoking a deployed AgentRouterNode.
 
+    Replies for all in-flight requests are consumed by a single long-lived
+    subscriber on the router's output topic, created on the first
+    :meth:`request`, and demultiplexed to their :class:`InvokeResponse` by
+    correlation_id. Call :meth:`close` to stop it.
+
     Generic in `AgentDepsT` — the type of runtime dependencies passed to tool
     functions via ``ToolContext``.  When ``deps_type`` is provided, type checkers
     can verify that the ``deps`` value passed to :meth:`request` / :meth:`invoke`
@@ -91,6 +192,8 @@ class RouterServiceClient(Generic[AgentDepsT]):
         node: AgentRouterNode,
         *,
         deps_type: type[AgentDepsT],
+        request_timeout: float | None = None,
+        stream_topic: str | None = None,
     ) -> None: ...
 
     @overload
@@ -98,6 +201,9 @@ class RouterServiceClient(Generic[AgentDepsT]):
         self,
         broker: BrokerClient,
         node: AgentRouterNode,
+        *,
+        request_timeout: float | None = None,
+        stream_topic: str | None = None,
     ) -> None: ...
 
     def __init__(
@@ -106,25 +212,97 @@ class RouterServiceClient(Generic[AgentDepsT]):
         node: AgentRouterNode,
         *,
         deps_type: type[AgentDepsT] | None = None,
+        request_timeout: float | None = None,
+        stream_topic: str | None = None,
     ) -> None:
+        """Initialize a RouterServiceClient.
+
+        Args:
+            broker: The broker to connect to.
+            node: The router node definition to invoke.
+            deps_type: Type of the runtime dependencies passed to tool functions.
+            request_timeout: Default number of seconds after which an unanswered
+                :meth:`request` is failed with ``TimeoutError`` and evicted.
+                ``None`` waits indefinitely.
+            stream_topic: Topic the chat node publishes token deltas to, for
+                :meth:`InvokeResponse.text_stream`. Defaults to the stream topic of
+                the router's chat node, if it streams.
+        """
         self._broker = broker
         self._node = node
         self._deps_type = deps_type
+        self._request_timeout = request_timeout
+        if stream_topic is None:
+            stream_topic = getattr(node.chat, "stream_topic", None)
+        self._stream_topic = stream_topic
+        self._pending: dict[str, InvokeResponse] = {}
+        self._reply_subscriber: Any = None
+        self._stream_subscriber: Any = None
+        self._reply_subscriber_lock = asyncio.Lock()
+
+    async def _handle_reply(self, message: KafkaMessage) -> None:
+        correlation_id = message.correlation_id
+        response_pipe = self._pending.get(correlation_id)
+        if response_pipe is None:
+            # Not ours: skipped without parsing the body
+            return
+        await response_pipe._put(decode_envelope(message.body, message.content_type))
 
-    def _get_ephemeral_handler(
-        self,
-        match_correlation_id: str,
-    ) -> tuple[Callable[..., Any], InvokeResponse]:
-        response_pipe = InvokeResponse(match_correlation_id)
-
-        async def _handle_responses(
-            event_envelope: EventEnvelope,
-            correlation_id: Annotated[str, Context()],
-        ) -> None:
-            if match_correlation_id == correlation_id:
-                await response_pipe._put(event_envelope)
-
-        return _handle_responses, response_pipe
+    async def _handle_delta(self, message: KafkaMessage) -> None:
+        response_pipe = self._pending.get(message.correlation_id)
+        if response_pipe is None:
+            return
+        await response_pipe._put_delta(TokenDelta.model_validate_json(message.body))
+
+    def _expire(self, correlation_id: str, timeout: float) -> None:
+        response_pipe = self._pending.pop(correlation_id, None)
+        if response_pipe is not None:
+            response_pipe._fail(
+                TimeoutError(f"Request {correlation_id} timed out after {timeout}s")
+            )
+
+    async def _ensure_reply_subscriber(self) -> None:
+        """Create and start the shared reply subscriber, once per client."""
+        async with self._reply_subscriber_lock:
+            if self._reply_subscriber is None:
+                subscriber = self._broker.subscriber(
+                    self._node.publish_to_topic or "",
+                    persistent=False,
+                    group_id=uuid_utils.uuid4().hex,
+                    decoder=defer_envelope_decoding,
+                )
+                subscriber(self._handle_reply)
+                self._reply_subscriber = subscriber
+
+                # Only start broker if not already connected, otherwise just start the subscriber
+                if self._broker._connection:
+                    await subscriber.start()
+            if self._stream_topic is not None and self._stream_subscriber is None:
+                subscriber = self._broker.subscriber(
+                    self._stream_topic,
+                    persistent=False,
+                    group_id=uuid_utils.uuid4().hex,
+                    decoder=defer_envelope_decoding,
+                )
+                subscriber(self._handle_delta)
+                self._stream_subscriber = subscriber
+                if self._broker._connection:
+                    await subscriber.start()
+            if not self._broker._connection:
+                await self._broker.start()
+
+    async def close(self) -> None:
+        """Stop the shared reply subscribers and fail all in-flight requests."""
+        async with self._reply_subscriber_lock:
+            if self._reply_subscriber is not None:
+                await self._reply_subscriber.stop()
+                self._reply_subscriber = None
+            if self._stream_subscriber is not None:
+                await self._stream_subscriber.stop()
+                self._stream_subscriber = None
+        pending, self._pending = self._pending, {}
+        for response_pipe in pending.values():
+            response_pipe._fail(RuntimeError("RouterServiceClient was closed"))
 
     async def request(
         self,
@@ -134,6 +312,8 @@ class RouterServiceClient(Generic[AgentDepsT]):
         final_response_topic: str | None = None,
         thread_id: str | None = None,
         correlation_id: str | None = None,
+        timeout: float | None = None,
+        bypass_response_cache: bool = False,
     ) -> InvokeResponse:
         """Invoke the service via a request and wait for a response.
         Synchronous request->response communication model.
@@ -145,39 +325,42 @@ class RouterServiceClient(Generic[AgentDepsT]):
             final_response_topic: The topic to publish the final response to.
             thread_id: The conversation ID for multi-turn memory.
             correlation_id: Optionally provide a correlation ID for this request.
+            timeout: Seconds to wait for the final response before the request is
+                failed with ``TimeoutError``. Defaults to the client's ``request_timeout``.
+            bypass_response_cache: Have the chat node call the model even if its
+                response cache holds a response.
 
         Returns:
             InvokeResponse: The response stream for the request.
         """
         if correlation_id is None:
             correlation_id = uuid_utils.uuid7().hex
-        subscriber = self._broker.subscriber(
-            self._node.publish_to_topic or "", persistent=False, group_id=uuid_utils.uuid4().hex
-        )
-
-        handler, response_pipe = self._get_ephemeral_handler(correlation_id)
-        subscriber(handler)
-
-        # Only start broker if not already connected, otherwise just start the new subscriber
-        if not self._broker._connection:
-            await self._broker.start()
-        else:
-            await subscriber.start()
-        await self._node.invoke(
-            user_prompt=user_prompt,
-            broker=self._broker,
-            final_response_topic=final_response_topic,
-            thread_id=thread_id,
-            correlation_id=correlation_id,
-            deps=deps,
-        )
-
-        async def cleanup_when_done() -> None:
-            await response_pipe._done.wait()
-            await subscriber.stop()
-
-        # Store reference to prevent GC before cleanup completes
-        response_pipe._cleanup_task = asyncio.create_task(cleanup_when_done())
+        if timeout is None:
+            timeout = self._request_timeout
+
+        response_pipe = InvokeResponse(correlation_id, stream_tokens=self._stream_topic is not None)
+        response_pipe._on_complete = lambda: self._pending.pop(correlation_id, None)
+        self._pending[correlation_id] = response_pipe
+        if timeout is not None:
+            response_pipe._timeout_handle = asyncio.get_running_loop().call_later(
+                timeout, self._expire, correlation_id, timeout
+            )
+
+        try:
+            await self._ensure_reply_subscriber()
+            await self._node.invoke(
+                user_prompt=user_prompt,
+                broker=self._broker,
+                final_response_topic=final_response_topic,
+                thread_id=thread_id,
+                correlation_id=correlation_id,
+                deps=deps,
+                bypass_response_cache=bypass_response_cache,
+            )
+        except BaseException as e:
+            self._pending.pop(correlation_id, None)
+            response_pipe._fail(e)
+            raise
 
         return response_pipe
 
@@ -189,6 +372,7 @@ class RouterServiceClient(Generic[AgentDepsT]):
         final_response_topic: str | None = None,
         thread_id: str | None = None,
         correlation_id: str | None = None,
+        bypass_response_cache: bool = False,
     ) -> str:
         """Invoke the agent asynchronously, following fire-and-forget pattern.
 
@@ -200,6 +384,8 @@ class RouterServiceClient(Generic[AgentDepsT]):
                 the agent node is done.
             thread_id: The conversation ID for multi-turn memory.
             correlation_id: Optionally provide a correlation ID for this request.
+            bypass_response_cache: Have the chat node call the model even if its
+                response cache holds a response.
 
         Returns:
             The correlation ID for this request.
@@ -216,4 +402,5 @@ class RouterServiceClient(Generic[AgentDepsT]):
             thread_id=thread_id,
             correlation_id=correlation_id,
             deps=deps,
+            bypass_response_cache=bypass_response_cache,
         )
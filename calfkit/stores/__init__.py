@@ -5,7 +5,7 @@ in event-driven agent systems. It follows these principles:
 
 * Thread-based: Conversations are identified by a thread_id
 * Strong consistency: Messages are persisted atomically as they flow through the system
-* Pluggable backends: Swap between in-memory, PostgreSQL, Redis, etc.
+* Pluggable backends: Swap between in-memory, SQLite, PostgreSQL, Redis, etc.
 * Auto-create: New threads are created automatically on first append
 
 Example:
@@ -29,10 +29,20 @@ Example:
     )
 """
 
-from calfkit.stores.base import MessageHistoryStore
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+from calfkit.stores.cached import CachedMessageHistoryStore
 from calfkit.stores.in_memory import InMemoryMessageHistoryStore
+from calfkit.stores.log_structured import LogStructuredMessageHistoryStore
+from calfkit.stores.sharded import ShardedMessageHistoryStore, ShardStats
+from calfkit.stores.sqlite import SQLiteMessageHistoryStore
 
 __all__ = [
     "MessageHistoryStore",
+    "CachedMessageHistoryStore",
     "InMemoryMessageHistoryStore",
+    "LogStructuredMessageHistoryStore",
+    "ShardedMessageHistoryStore",
+    "ShardStats",
+    "SQLiteMessageHistoryStore",
+    "VersionConflictError",
 ]
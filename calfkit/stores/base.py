@@ -2,6 +2,27 @@ from abc import ABC, abstractmethod
 from collections.abc import Sequence
 
 from calfkit._vendor.pydantic_ai.messages import ModelMessage
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+
+
+class VersionConflictError(RuntimeError):
+    """Raised by ``append_many`` when the history is not at the expected version."""
+
+    def __init__(
+        self,
+        thread_id: str,
+        scope: str | None,
+        expected_version: int,
+        current_version: int | None,
+    ):
+        super().__init__(
+            f"History of thread {thread_id!r} (scope {scope!r}) is at version"
+            f" {current_version}, expected {expected_version}"
+        )
+        self.thread_id = thread_id
+        self.scope = scope
+        self.expected_version = expected_version
+        self.current_version = current_version
 
 
 class MessageHistoryStore(ABC):
@@ -38,20 +59,156 @@ class MessageHistoryStore(ABC):
         ...
 
     async def append_many(
-        self, thread_id: str, messages: Sequence[ModelMessage], scope: str | None = None
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
     ) -> None:
         """Append multiple messages to history.
 
         Default implementation calls append() for each message.
-        Override for batch optimization if needed.
+        Override for batch optimization if needed. Stores shared between
+        processes should override it to check ``expected_version`` atomically
+        with the write.
 
         Args:
             thread_id: Unique identifier for the conversation thread.
             messages: List of messages to append.
+            expected_version: When set, only append if ``version(thread_id, scope)``
+                is still this value, i.e. nobody else wrote in the meantime.
+
+        Raises:
+            VersionConflictError: If the history is not at ``expected_version``.
         """
+        if expected_version is not None:
+            current_version = await self.version(thread_id, scope)
+            if current_version != expected_version:
+                raise VersionConflictError(thread_id, scope, expected_version, current_version)
         for message in messages:
             await self.append(thread_id, message, scope)
 
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread.
+
+        Default implementation loads the whole history. Override with an
+        efficient query if the backend supports one.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+
+        Returns:
+            Number of messages in the thread.
+        """
+        return len(await self.get(thread_id, scope))
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards.
+
+        Default implementation loads the whole history and slices it. Override
+        to only read the requested messages.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+            offset: Number of leading messages to skip.
+
+        Returns:
+            The messages at positions ``offset`` and beyond, in order.
+        """
+        return (await self.get(thread_id, scope))[offset:]
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread.
+
+        Default implementation loads the whole history and slices it. Override
+        to only read the requested messages.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+            n: Maximum number of messages to return.
+
+        Returns:
+            Up to ``n`` of the most recent messages, in order.
+        """
+        if n <= 0:
+            return []
+        return (await self.get(thread_id, scope))[-n:]
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int | None:
+        """Get the version of a thread's history.
+
+        The version increases on every append or delete affecting the thread (or
+        only the given scope), and never decreases. Callers caching a history can
+        compare versions to tell whether their copy is still current.
+
+        Default implementation returns None: the store does not track versions,
+        and callers must not assume their cached history is current.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+
+        Returns:
+            The current version, or None if the store does not track versions.
+        """
+        return None
+
+    @property
+    def supports_checkpoints(self) -> bool:
+        """Whether the store saves checkpoints, rather than raising NotImplementedError."""
+        return type(self).save_checkpoint is not MessageHistoryStore.save_checkpoint
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
+    ) -> None:
+        """Save a summary checkpoint for a thread, replacing any previous one.
+
+        Messages stay stored; readers that use the checkpoint skip the messages it
+        covers. Deleting the thread (or scope) deletes its checkpoint. The default
+        implementation does not support checkpoints.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+            checkpoint: The checkpoint to save.
+
+        Raises:
+            NotImplementedError: If the store does not support checkpoints.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support checkpoints")
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread.
+
+        Args:
+            thread_id: Unique identifier for the conversation thread.
+
+        Returns:
+            The checkpoint, or None if there is none or the store does not support them.
+        """
+        return None
+
+    async def fork(self, thread_id: str, new_thread_id: str, at: int | None = None) -> None:
+        """Start a new thread from the history of another, e.g. to branch an agent run.
+
+        The new thread gets the first ``at`` messages of the thread, across scopes and
+        each in its scope, and evolves independently from then on. Checkpoints are
+        not carried over. The default implementation does not support forking.
+
+        Args:
+            thread_id: The thread to fork.
+            new_thread_id: The new thread. Must not have any history.
+            at: Number of leading messages of the thread to fork from. All if None.
+
+        Raises:
+            ValueError: If new_thread_id already has history.
+            NotImplementedError: If the store does not support forking.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support forking")
+
     @abstractmethod
     async def delete(self, thread_id: str, scope: str | None = None) -> None:
         """Delete all messages for a thread.
@@ -0,0 +1,278 @@
+import asyncio
+import itertools
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from calfkit._vendor.pydantic_ai.messages import ModelMessage
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+from calfkit.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# (scope, messages) of one append or append_many call
+_PendingWrite = tuple[str | None, list[ModelMessage]]
+
+# Upper bound, in seconds, of the wait between retries of a failed background flush
+_MAX_FLUSH_BACKOFF = 30.0
+
+
+@dataclass
+class _CachedThread:
+    """A thread's history as read from the backend plus local writes, per requested scope."""
+
+    version: int
+    scopes: dict[str | None, list[ModelMessage]] = field(default_factory=dict)
+
+
+class CachedMessageHistoryStore(MessageHistoryStore):
+    """Write-behind caching wrapper around another MessageHistoryStore.
+
+    Reads are served from a local LRU cache of recently used threads. Writes
+    update the cache immediately and are queued; every ``flush_interval``
+    seconds the queued writes are sent to the backend, with consecutive writes to
+    the same thread and scope coalesced into a single ``append_many``. A burst of
+    tool results for one thread thus costs one backend round trip.
+
+    Reads within the process always see its own writes, flushed or not. Writes
+    made to the backend by other processes are not seen while a thread is
+    cached, so each thread should be written by a single process, which keying
+    messages by thread_id provides. Versions are tracked per thread by this
+    wrapper, not per scope.
+
+    Queued writes are lost if the process dies before they are flushed. Call
+    :meth:`close` on shutdown to flush them. A failed background flush is logged
+    and retried with exponential backoff; the writes stay queued meanwhile.
+    """
+
+    def __init__(
+        self,
+        backend: MessageHistoryStore,
+        *,
+        flush_interval: float = 0.05,
+        max_cached_threads: int = 1024,
+    ):
+        """Initialize a CachedMessageHistoryStore.
+
+        Args:
+            backend: The store that messages are persisted to.
+            flush_interval: Seconds queued writes wait for more writes to coalesce
+                with before being flushed to the backend.
+            max_cached_threads: Maximum number of threads held in the read cache.
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._cache: LRUCache[str, _CachedThread] = LRUCache(maxsize=max_cached_threads)
+        self._pending: dict[str, list[_PendingWrite]] = {}
+        # Held while writes are in flight to the backend, so flushes apply in order and
+        # backend reads never miss writes that have left the queue but not yet landed
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[None] | None = None
+        self.flush_error: Exception | None = None
+        """Error of the last failed background flush, reset by the next successful flush."""
+        # Source of versions, bumped on every write. Uncached threads report the latest
+        # version, and threads loaded into the cache keep it: a version equal to the latest
+        # means nothing was written since, so it never stands for different contents
+        self._clock = itertools.count(1)
+        self._last_version = 0
+
+    def _tick(self) -> int:
+        self._last_version = next(self._clock)
+        return self._last_version
+
+    async def _load(self, thread_id: str, scope: str | None) -> list[ModelMessage]:
+        """Return the thread's cached history for ``scope``, loading it if needed."""
+        cached = self._cache.get(thread_id)
+        if cached is not None and scope in cached.scopes:
+            return cached.scopes[scope]
+        async with self._flush_lock:
+            messages = await self.backend.get(thread_id, scope)
+            # Nothing is in flight, so the backend plus the queue is the whole history
+            for pending_scope, pending_messages in self._pending.get(thread_id, []):
+                if scope is None or pending_scope == scope:
+                    messages.extend(pending_messages)
+        cached = self._cache.get(thread_id)
+        if cached is None:
+            cached = _CachedThread(version=self._last_version)
+            self._cache.put(thread_id, cached)
+        cached.scopes.setdefault(scope, messages)
+        return cached.scopes[scope]
+
+    async def get(self, thread_id: str, scope: str | None = None) -> list[ModelMessage]:
+        """Load message history for a thread, optionally filtered by scope."""
+        return list(await self._load(thread_id, scope))
+
+    async def append(self, thread_id: str, message: ModelMessage, scope: str | None = None) -> None:
+        """Append a single message to history."""
+        await self.append_many(thread_id, [message], scope)
+
+    async def append_many(
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
+    ) -> None:
+        """Append messages to the cache and queue them for the backend.
+
+        ``expected_version`` is checked against this wrapper's per-thread version,
+        so it detects conflicting writes made through this process only.
+        """
+        if expected_version is not None:
+            current_version = self._current_version(thread_id)
+            if current_version != expected_version:
+                raise VersionConflictError(thread_id, scope, expected_version, current_version)
+        if not messages:
+            return
+        version = self._tick()
+        cached = self._cache.get(thread_id)
+        if cached is not None:
+            for cached_scope, cached_messages in cached.scopes.items():
+                if cached_scope is None or cached_scope == scope:
+                    cached_messages.extend(messages)
+            cached.version = version
+        self._pending.setdefault(thread_id, []).append((scope, list(messages)))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread, optionally filtered by scope."""
+        return len(await self._load(thread_id, scope))
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards."""
+        return (await self._load(thread_id, scope))[offset:]
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread."""
+        if n <= 0:
+            return []
+        return (await self._load(thread_id, scope))[-n:]
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int:
+        """Get the version of a thread's history, across all its scopes.
+
+        Threads that are not cached report the latest version handed out, which
+        is never equal to a version they had while cached.
+        """
+        return self._current_version(thread_id)
+
+    def _current_version(self, thread_id: str) -> int:
+        cached = self._cache.get(thread_id)
+        return cached.version if cached is not None else self._last_version
+
+    @property
+    def supports_checkpoints(self) -> bool:
+        return self.backend.supports_checkpoints
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
+    ) -> None:
+        """Save a summary checkpoint for a thread in the backend.
+
+        The thread's queued writes are flushed first, so the messages the checkpoint
+        covers are in the backend.
+        """
+        await self.flush()
+        await self.backend.save_checkpoint(thread_id, checkpoint, scope)
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread from the backend."""
+        return await self.backend.load_checkpoint(thread_id, scope)
+
+    async def fork(self, thread_id: str, new_thread_id: str, at: int | None = None) -> None:
+        """Fork a thread in the backend, after flushing the writes queued for it.
+
+        Raises:
+            ValueError: If new_thread_id already has history.
+            NotImplementedError: If the backend does not support forking.
+        """
+        await self.flush()
+        await self.backend.fork(thread_id, new_thread_id, at)
+        self._cache.pop(new_thread_id)
+        self._tick()
+
+    async def delete(self, thread_id: str, scope: str | None = None) -> None:
+        """Delete messages for a thread, optionally filtered by scope.
+
+        The thread's queued writes are flushed first, so they are deleted too.
+        """
+        await self.flush()
+        await self.backend.delete(thread_id, scope)
+        self._cache.pop(thread_id)
+        self._tick()
+
+    async def _flush_later(self) -> None:
+        delay = self.flush_interval
+        while True:
+            await asyncio.sleep(delay)
+            # Shielded so that close() cancelling the wait never interrupts a write in flight
+            if await asyncio.shield(self._flush_in_background()):
+                return
+            delay = min(2 * delay or 0.1, _MAX_FLUSH_BACKOFF)
+            logger.warning(
+                "Flushing queued writes to %s failed, retrying in %.1fs",
+                type(self.backend).__name__,
+                delay,
+                exc_info=self.flush_error,
+            )
+
+    async def _flush_in_background(self) -> bool:
+        """Flush queued writes, returning whether it succeeded."""
+        try:
+            await self.flush()
+        except Exception as e:
+            # The writes stay queued, and are retried by the next flush
+            self.flush_error = e
+            return False
+        return True
+
+    async def flush(self) -> None:
+        """Write all queued writes to the backend.
+
+        Raises:
+            Exception: Whatever the backend raised. Writes that were not persisted
+                stay queued, in order, for the next flush.
+        """
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            for thread_id in list(pending):
+                writes = pending[thread_id]
+                while writes:
+                    # Coalesce the run of consecutive writes to the same scope
+                    scope = writes[0][0]
+                    run_length = next(
+                        (i for i, (s, _) in enumerate(writes) if s != scope), len(writes)
+                    )
+                    messages = [m for _, batch in writes[:run_length] for m in batch]
+                    try:
+                        await self.backend.append_many(thread_id, messages, scope)
+                    except BaseException:
+                        self._requeue(pending)
+                        raise
+                    del writes[:run_length]
+                del pending[thread_id]
+            self.flush_error = None
+
+    def _requeue(self, pending: dict[str, list[_PendingWrite]]) -> None:
+        """Put writes that failed to flush back in front of those queued since."""
+        for thread_id, writes in pending.items():
+            if writes:
+                self._pending[thread_id] = writes + self._pending.get(thread_id, [])
+
+    async def close(self) -> None:
+        """Flush queued writes and stop the background flush. Call on shutdown.
+
+        Raises:
+            Exception: Whatever the backend raised while flushing.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
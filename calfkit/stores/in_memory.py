@@ -1,42 +1,471 @@
-from collections import defaultdict
-from collections.abc import Sequence
+import heapq
+import itertools
+import weakref
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from time import monotonic
 
-from calfkit._vendor.pydantic_ai.messages import ModelMessage
-from calfkit.stores.base import MessageHistoryStore
+import pydantic_core
+
+from calfkit._vendor.pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    RetryPromptPart,
+    ToolCallPart,
+    ToolReturnPart,
+)
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+
+# (seq, approximate size in bytes, message). seq orders messages across a thread's scopes.
+_Entry = tuple[int, int, ModelMessage]
+
+
+def _approximate_size(message: ModelMessage) -> int:
+    """Approximate the memory held by a message by the size of its JSON serialization."""
+    return len(pydantic_core.to_json(message, bytes_mode="base64"))
+
+
+def _last(entries: Iterable[_Entry], n: int) -> list[_Entry]:
+    """The last ``n`` entries, without walking the whole of a deque."""
+    if isinstance(entries, deque):
+        return list(itertools.islice(reversed(entries), n))[::-1]
+    return list(deque(entries, maxlen=n))
+
+
+def _unanswered_tool_calls(message: ModelMessage, unanswered: set[str]) -> None:
+    """Add the tool calls of a response to ``unanswered``, or remove those a request answers."""
+    if isinstance(message, ModelRequest):
+        for request_part in message.parts:
+            if isinstance(request_part, ToolReturnPart) or (
+                isinstance(request_part, RetryPromptPart) and request_part.tool_name
+            ):
+                unanswered.discard(request_part.tool_call_id)
+    else:
+        for response_part in message.parts:
+            if isinstance(response_part, ToolCallPart):
+                unanswered.add(response_part.tool_call_id)
+
+
+def _tagged(entries: Iterable[_Entry], scope: str | None) -> Iterator[tuple[int, str | None]]:
+    return ((seq, scope) for seq, _, _ in entries)
+
+
+@dataclass(eq=False)
+class _ThreadHistory:
+    """The messages of one thread, indexed by scope.
+
+    A forked thread starts with the entries of its parent whose seq is below
+    ``fork_seq``, shared rather than copied, followed by its own. Before a parent
+    loses entries (trimmed, deleted or evicted), its forks copy their prefix.
+    """
+
+    scopes: dict[str | None, deque[_Entry]] = field(default_factory=dict)
+    versions: dict[str | None, int] = field(default_factory=dict)
+    checkpoints: dict[str | None, HistoryCheckpoint] = field(default_factory=dict)
+    # Messages of the thread, shared prefix included
+    count: int = 0
+    # Approximate size of the messages the thread holds itself, shared prefix excluded
+    nbytes: int = 0
+    last_access: float = 0.0
+    parent: "_ThreadHistory | None" = None
+    fork_seq: int = 0
+    # Number of messages of the shared prefix, by scope
+    prefix_counts: dict[str | None, int] = field(default_factory=dict)
+    forks: "weakref.WeakSet[_ThreadHistory]" = field(default_factory=weakref.WeakSet)
+
+    def entries(self, scope: str | None) -> Iterable[_Entry]:
+        """The entries of one scope, in append order."""
+        own = self.scopes.get(scope, deque())
+        if self.parent is None or scope not in self.prefix_counts:
+            return own
+        fork_seq = self.fork_seq
+        prefix = itertools.takewhile(lambda entry: entry[0] < fork_seq, self.parent.entries(scope))
+        return itertools.chain(prefix, own)
+
+    def scope_names(self) -> set[str | None]:
+        return self.scopes.keys() | self.prefix_counts.keys()
+
+    def scope_count(self, scope: str | None) -> int:
+        return len(self.scopes.get(scope, ())) + self.prefix_counts.get(scope, 0)
+
+    def merged(self) -> Iterator[_Entry]:
+        """All entries of the thread in append order."""
+        return heapq.merge(*(self.entries(scope) for scope in self.scope_names()))
 
 
 class InMemoryMessageHistoryStore(MessageHistoryStore):
     """In-memory message history store.
 
-    Useful for testing and development. Not suitable for production
-    as data is lost when the process exits.
+    Useful for testing and development, and as a bounded local store for
+    long-running services. Data is lost when the process exits.
+
+    Messages are indexed by thread and scope, so scoped reads and deletes only
+    touch that scope. The store can be bounded by number of threads, messages per
+    thread, approximate total size and idle time. Threads are evicted least
+    recently used first, and a thread over its message limit loses its oldest
+    messages, along with the results of any tool calls among them. Evicting or
+    trimming a thread changes its version, so cached copies of its history are
+    reloaded.
+
+    Sizes are approximated by the length of each message's JSON serialization.
     """
 
-    def __init__(self) -> None:
-        """Initialize an empty in-memory store."""
-        self._messages: dict[str, list[tuple[str | None, ModelMessage]]] = defaultdict(list)
+    def __init__(
+        self,
+        *,
+        max_threads: int | None = None,
+        max_messages_per_thread: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        """Initialize an empty in-memory store.
+
+        Args:
+            max_threads: Maximum number of threads held. The least recently used
+                thread is evicted beyond it.
+            max_messages_per_thread: Maximum number of messages held per thread,
+                across scopes. The oldest messages are dropped beyond it.
+            max_bytes: Maximum approximate size of all messages held. Least recently
+                used threads are evicted beyond it, then the oldest messages of the
+                thread being written, always keeping its latest message.
+            ttl: Seconds after its last read or write that a thread is evicted.
+
+        Raises:
+            ValueError: If a limit is not positive.
+        """
+        for limit_name, limit in (
+            ("max_threads", max_threads),
+            ("max_messages_per_thread", max_messages_per_thread),
+            ("max_bytes", max_bytes),
+            ("ttl", ttl),
+        ):
+            if limit is not None and limit <= 0:
+                raise ValueError(f"{limit_name} must be positive, got {limit}")
+        self.max_threads = max_threads
+        self.max_messages_per_thread = max_messages_per_thread
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Least recently used first
+        self._threads: OrderedDict[str, _ThreadHistory] = OrderedDict()
+        self._seqs = itertools.count()
+        # Source of versions, increased on every write, delete and eviction. Threads and
+        # scopes the store does not hold report its current value, so a version handed
+        # out once is never reported again for different contents.
+        self._clock = 0
+        self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size in bytes of all messages held."""
+        return self._nbytes
+
+    @property
+    def num_threads(self) -> int:
+        """Number of threads held."""
+        return len(self._threads)
+
+    def thread_nbytes(self, thread_id: str) -> int:
+        """Approximate size in bytes of the messages held for a thread."""
+        history = self._threads.get(thread_id)
+        return history.nbytes if history is not None else 0
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        deadline = monotonic() - self.ttl
+        while self._threads and next(iter(self._threads.values())).last_access < deadline:
+            self._evict_least_recently_used()
+
+    def _evict_least_recently_used(self) -> None:
+        _, history = self._threads.popitem(last=False)
+        self._forget(history)
+
+    def _forget(self, history: _ThreadHistory) -> None:
+        """Release a thread removed from ``_threads``."""
+        self._detach_forks(history)
+        if history.parent is not None:
+            history.parent.forks.discard(history)
+        self._nbytes -= history.nbytes
+        self._tick()
+
+    def _detach(self, history: _ThreadHistory) -> None:
+        """Give a forked thread its own copy of the prefix it shares with its parent."""
+        parent = history.parent
+        if parent is None:
+            return
+        for scope in history.prefix_counts:
+            entries = deque(history.entries(scope))
+            size = sum(entry_size for _, entry_size, _ in entries) - sum(
+                entry_size for _, entry_size, _ in history.scopes.get(scope, ())
+            )
+            history.scopes[scope] = entries
+            history.nbytes += size
+            self._nbytes += size
+        history.parent = None
+        history.prefix_counts = {}
+        parent.forks.discard(history)
+
+    def _detach_forks(self, history: _ThreadHistory) -> None:
+        """Detach the forks of a thread, before it loses entries they share."""
+        for fork in list(history.forks):
+            self._detach(fork)
+
+    def _access(self, thread_id: str) -> _ThreadHistory | None:
+        """Look up a thread, marking it as most recently used."""
+        self._expire()
+        history = self._threads.get(thread_id)
+        if history is not None:
+            self._threads.move_to_end(thread_id)
+            history.last_access = monotonic()
+        return history
+
+    def _trim_oldest(self, history: _ThreadHistory, n: int) -> None:
+        """Drop the ``n`` oldest messages of a thread, across its scopes.
+
+        Tool calls and their results are dropped together: results whose call was
+        dropped go too, up to the last message of their scope.
+        """
+        self._detach(history)
+        self._detach_forks(history)
+        trimmed: dict[str | None, int] = {}
+        unanswered: dict[str | None, set[str]] = {}
+
+        def drop(scope: str | None) -> None:
+            entries = history.scopes[scope]
+            _, size, message = entries.popleft()
+            if not entries:
+                del history.scopes[scope]
+            history.count -= 1
+            history.nbytes -= size
+            self._nbytes -= size
+            trimmed[scope] = trimmed.get(scope, 0) + 1
+            _unanswered_tool_calls(message, unanswered.setdefault(scope, set()))
+
+        for _ in range(n):
+            drop(min(history.scopes, key=lambda s: history.scopes[s][0][0]))
+        for scope, calls in unanswered.items():
+            while calls and len(history.scopes.get(scope, ())) > 1:
+                drop(scope)
+        for scope in trimmed:
+            history.versions[scope] = self._tick()
+        # Checkpoints count messages from the start of the history, which just moved
+        for scope, checkpoint in list(history.checkpoints.items()):
+            dropped = sum(trimmed.values()) if scope is None else trimmed.get(scope, 0)
+            if dropped:
+                history.checkpoints[scope] = checkpoint.model_copy(
+                    update={"covers": max(checkpoint.covers - dropped, 0)}
+                )
+
+    def _enforce_limits(self, history: _ThreadHistory) -> None:
+        """Bring the store back within its limits after ``history`` was written to."""
+        if self.max_messages_per_thread is not None:
+            excess = history.count - self.max_messages_per_thread
+            if excess > 0:
+                self._trim_oldest(history, excess)
+        # The thread just written is the most recently used, so it is evicted last
+        if self.max_threads is not None:
+            while len(self._threads) > self.max_threads:
+                self._evict_least_recently_used()
+        if self.max_bytes is not None:
+            while self._nbytes > self.max_bytes and len(self._threads) > 1:
+                self._evict_least_recently_used()
+            if self._nbytes > self.max_bytes:
+                # Trimming needs the sizes of the messages the thread holds itself
+                self._detach(history)
+            excess_messages = 0
+            excess_bytes = self._nbytes - self.max_bytes
+            for _, size, _ in history.merged():
+                if excess_bytes <= 0 or excess_messages == history.count - 1:
+                    break
+                excess_bytes -= size
+                excess_messages += 1
+            if excess_messages:
+                self._trim_oldest(history, excess_messages)
+
+    def _messages(self, entries: Iterable[_Entry]) -> list[ModelMessage]:
+        return [message for _, _, message in entries]
 
     async def get(self, thread_id: str, scope: str | None = None) -> list[ModelMessage]:
         """Load message history for a thread, optionally filtered by scope."""
-        entries = self._messages.get(thread_id, [])
+        history = self._access(thread_id)
+        if history is None:
+            return []
         if scope is None:
-            return [msg for _, msg in entries]
-        return [msg for s, msg in entries if s == scope]
+            return self._messages(history.merged())
+        return self._messages(history.entries(scope))
 
     async def append(self, thread_id: str, message: ModelMessage, scope: str | None = None) -> None:
         """Append a single message to history."""
-        self._messages[thread_id].append((scope, message))
+        await self.append_many(thread_id, [message], scope)
 
     async def append_many(
-        self, thread_id: str, messages: Sequence[ModelMessage], scope: str | None = None
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
+    ) -> None:
+        if expected_version is not None:
+            current_version = self._version(thread_id, scope)
+            if current_version != expected_version:
+                raise VersionConflictError(thread_id, scope, expected_version, current_version)
+        history = self._access(thread_id)
+        if history is None:
+            history = self._threads[thread_id] = _ThreadHistory(last_access=monotonic())
+        entries = history.scopes.setdefault(scope, deque())
+        for message in messages:
+            size = _approximate_size(message)
+            entries.append((next(self._seqs), size, message))
+            history.nbytes += size
+            self._nbytes += size
+        history.count += len(messages)
+        history.versions[scope] = self._tick()
+        self._enforce_limits(history)
+
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread, optionally filtered by scope."""
+        history = self._access(thread_id)
+        if history is None:
+            return 0
+        if scope is None:
+            return history.count
+        return history.scope_count(scope)
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards."""
+        history = self._access(thread_id)
+        if history is None:
+            return []
+        entries = history.merged() if scope is None else history.entries(scope)
+        return self._messages(itertools.islice(entries, max(offset, 0), None))
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread."""
+        history = self._access(thread_id)
+        if history is None or n <= 0:
+            return []
+        if scope is not None:
+            return self._messages(_last(history.entries(scope), n))
+        # The last n messages of the thread are among the last n of each of its scopes
+        candidates = heapq.merge(*(_last(history.entries(s), n) for s in history.scope_names()))
+        return self._messages(deque(candidates, maxlen=n))
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int:
+        """Get the version of a thread's history, optionally of a single scope.
+
+        Threads and scopes the store does not hold (never written, deleted or
+        evicted) report the store's latest version, which is never equal to a
+        version they had while held.
+        """
+        return self._version(thread_id, scope)
+
+    def _version(self, thread_id: str, scope: str | None) -> int:
+        self._expire()
+        history = self._threads.get(thread_id)
+        if history is None:
+            return self._clock
+        if scope is None:
+            return max(history.versions.values(), default=self._clock)
+        return history.versions.get(scope, self._clock)
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
     ) -> None:
-        self._messages[thread_id].extend((scope, msg) for msg in messages)
+        """Save a summary checkpoint for a thread, replacing any previous one.
+
+        Trimming a thread's oldest messages lowers the ``covers`` of its checkpoints
+        to match. The checkpoint of a thread that is not held is discarded.
+        """
+        history = self._access(thread_id)
+        if history is not None:
+            history.checkpoints[scope] = checkpoint
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread."""
+        history = self._access(thread_id)
+        return history.checkpoints.get(scope) if history is not None else None
+
+    async def fork(self, thread_id: str, new_thread_id: str, at: int | None = None) -> None:
+        """Start a new thread from the history of another, sharing it copy-on-write.
+
+        The new thread refers to the messages of the thread instead of copying them,
+        so forking takes constant memory, and constant time unless ``at`` is given.
+        Reads stitch the shared prefix and the new thread's own messages together. A
+        fork only copies the prefix when the thread is about to lose messages it
+        shares (trimmed, deleted or evicted), or when the fork itself is trimmed.
+        Shared messages count towards the size of the thread that appended them.
+
+        Raises:
+            ValueError: If new_thread_id already has history.
+        """
+        self._expire()
+        if new_thread_id in self._threads:
+            raise ValueError(f"Thread {new_thread_id!r} already has history")
+        parent = self._access(thread_id)
+        if parent is None:
+            return
+        if at is None or at >= parent.count:
+            fork_seq = next(self._seqs)
+            prefix_counts = {
+                scope: parent.scope_count(scope)
+                for scope in parent.scope_names()
+                if parent.scope_count(scope)
+            }
+        else:
+            fork_seq = 0
+            prefix_counts = {}
+            tagged = heapq.merge(
+                *(_tagged(parent.entries(scope), scope) for scope in parent.scope_names())
+            )
+            for seq, scope in itertools.islice(tagged, max(at, 0)):
+                fork_seq = seq + 1
+                prefix_counts[scope] = prefix_counts.get(scope, 0) + 1
+        if not prefix_counts:
+            return
+        version = self._tick()
+        fork = _ThreadHistory(
+            versions=dict.fromkeys(prefix_counts, version),
+            count=sum(prefix_counts.values()),
+            last_access=monotonic(),
+            parent=parent,
+            fork_seq=fork_seq,
+            prefix_counts=prefix_counts,
+        )
+        parent.forks.add(fork)
+        self._threads[new_thread_id] = fork
+        self._enforce_limits(fork)
 
     async def delete(self, thread_id: str, scope: str | None = None) -> None:
         """Delete messages for a thread, optionally filtered by scope."""
         if scope is None:
-            self._messages.pop(thread_id, None)
-        else:
-            self._messages[thread_id] = [
-                (s, msg) for s, msg in self._messages[thread_id] if s != scope
-            ]
+            history = self._threads.pop(thread_id, None)
+            if history is not None:
+                self._forget(history)
+            return
+        history = self._access(thread_id)
+        if history is None:
+            return
+        self._detach(history)
+        self._detach_forks(history)
+        entries = history.scopes.pop(scope, None)
+        if entries is not None:
+            size = sum(entry_size for _, entry_size, _ in entries)
+            history.count -= len(entries)
+            history.nbytes -= size
+            self._nbytes -= size
+        history.checkpoints.pop(scope, None)
+        history.checkpoints.pop(None, None)
+        history.versions[scope] = self._tick()
+        if not history.scopes:
+            del self._threads[thread_id]
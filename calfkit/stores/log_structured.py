@@ -0,0 +1,530 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from heapq import merge
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, TypeVar
+
+from pydantic import TypeAdapter
+
+from calfkit._vendor.pydantic_ai.messages import ModelMessage
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+
+T = TypeVar("T")
+
+_message_adapter: TypeAdapter[ModelMessage] = TypeAdapter(ModelMessage)
+
+# Index entries: kind, key id, segment, offset, length (or, for _VERSION, the version)
+_ENTRY = struct.Struct("<BIIQI")
+
+# The record is the JSON [thread_id, scope] of a new key id
+_KEY = 0
+# The record is a message appended under the key
+_MESSAGE = 1
+# The key's messages and checkpoint are deleted, and so is its thread's unscoped checkpoint
+_DELETE = 2
+# The record is the key's latest checkpoint
+_CHECKPOINT = 3
+# Sets the key's version. Written by compaction, which drops the entries that made it up.
+# For _NO_KEY, sets the version new keys start at, above that of the threads compaction dropped.
+_VERSION = 4
+
+_NO_KEY = 0xFFFFFFFF
+
+_INDEX_FILE = "index"
+_SEGMENT_SUFFIX = ".seg"
+# Records copied per write while compacting
+_COMPACTION_BATCH = 1024
+
+# (segment, offset, length) of a record. Tuples order records by when they were written.
+_Location = tuple[int, int, int]
+
+
+def _segment_name(segment: int) -> str:
+    return f"{segment:08d}{_SEGMENT_SUFFIX}"
+
+
+@dataclass
+class _ScopeLog:
+    """Where the records of one (thread, scope) key are."""
+
+    key: int
+    version: int = 0
+    messages: list[_Location] = field(default_factory=list)
+    checkpoint: _Location | None = None
+
+
+class LogStructuredMessageHistoryStore(MessageHistoryStore):
+    """Durable local message history store built on append-only segment files.
+
+    Messages are appended, as JSON, to the active segment file of a directory, and
+    each append adds fixed-size entries to an index file pointing at them. Appends
+    are thus sequential writes, and reads are slices of the memory-mapped segments:
+    no query planning, seeks or read calls. On open, the index is memory-mapped and
+    scanned without decoding any message, so restarting costs about a second per
+    million messages stored.
+
+    Deleted messages stay in their segments until the space they hold exceeds both
+    the space of live messages and ``compact_min_bytes``. Live records are then
+    copied to fresh segments with a fresh index, which atomically replaces the old
+    one, and the old segments are removed, along with the threads that were deleted.
+
+    Appends are flushed to the operating system before returning, so they survive
+    the process crashing; set ``fsync`` to also survive the host crashing, at the
+    cost of much slower appends. Files are only touched from a single dedicated
+    thread, so the event loop never blocks on disk I/O. The store is intended for a
+    single process.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        compact_min_bytes: int = 16 * 1024 * 1024,
+        fsync: bool = False,
+    ):
+        """Open a LogStructuredMessageHistoryStore, recovering its contents if any.
+
+        Args:
+            path: Directory holding the segment and index files, created if missing.
+            max_segment_bytes: Size after which appends go to a new segment file.
+            compact_min_bytes: Space held by deleted records below which segments are
+                never compacted.
+            fsync: Sync every append to disk before returning.
+        """
+        self.path = Path(path)
+        self.max_segment_bytes = max_segment_bytes
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calfkit-log")
+
+    async def _run(self, fn: Callable[[], T]) -> T:
+        """Run ``fn`` on the store's dedicated thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn)
+
+    # On-disk state
+
+    def _load(self) -> None:
+        """Rebuild the in-memory index from the index file, and open the files for writing.
+
+        Index entries left torn by a crash, and segments no entry points to (left by a
+        crash while writing or compacting), are dropped.
+        """
+        self._keys: list[tuple[str, str | None]] = []
+        self._threads: dict[str, dict[str | None, _ScopeLog]] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._version_floor = 0
+        segment_sizes = {
+            int(segment_path.stem): segment_path.stat().st_size
+            for segment_path in self.path.glob(f"*{_SEGMENT_SUFFIX}")
+        }
+        # End of the last record of each segment that the index points to
+        segment_ends: dict[int, int] = {}
+
+        index_path = self.path / _INDEX_FILE
+        index_path.touch()
+        valid_bytes = 0
+        with open(index_path, "rb") as index_file:
+            size = os.fstat(index_file.fileno()).st_size
+            if size >= _ENTRY.size:
+                with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                    for kind, key, segment, offset, length in _ENTRY.iter_unpack(
+                        index_map[: size - size % _ENTRY.size]
+                    ):
+                        if kind in (_KEY, _MESSAGE, _CHECKPOINT):
+                            end = offset + length
+                            if end > segment_sizes.get(segment, -1):
+                                # Written to the index but not to the segment: torn
+                                break
+                            segment_ends[segment] = max(segment_ends.get(segment, 0), end)
+                        self._replay(kind, key, (segment, offset, length))
+                        valid_bytes += _ENTRY.size
+        if valid_bytes != index_path.stat().st_size:
+            os.truncate(index_path, valid_bytes)
+
+        for segment in segment_sizes.keys() - segment_ends.keys():
+            (self.path / _segment_name(segment)).unlink()
+        self._active_segment = max(segment_ends, default=0)
+        active_path = self.path / _segment_name(self._active_segment)
+        active_path.touch()
+        # Drop whatever follows the last record the index points to
+        os.truncate(active_path, segment_ends.get(self._active_segment, 0))
+        self._segment_file: BinaryIO = open(active_path, "ab")
+        self._index_file: BinaryIO = open(index_path, "ab")
+
+    def _replay(self, kind: int, key: int, location: _Location) -> None:
+        """Apply one index entry to the in-memory index."""
+        segment, offset, length = location
+        if kind == _KEY:
+            thread_id, scope = json.loads(self._read(location))
+            self._keys.append((thread_id, scope))
+            self._threads.setdefault(thread_id, {})[scope] = _ScopeLog(key, self._version_floor)
+            self._live_bytes += length
+            return
+        if key == _NO_KEY:
+            self._version_floor = offset
+            return
+        thread_id, scope = self._keys[key]
+        scopes = self._threads[thread_id]
+        log = scopes[scope]
+        if kind == _MESSAGE:
+            log.messages.append(location)
+            log.version += 1
+            self._live_bytes += length
+        elif kind == _CHECKPOINT:
+            self._discard_checkpoint(log)
+            log.checkpoint = location
+            self._live_bytes += length
+        elif kind == _DELETE:
+            for _, _, message_length in log.messages:
+                self._discard(message_length)
+            log.messages = []
+            self._discard_checkpoint(log)
+            if None in scopes:
+                self._discard_checkpoint(scopes[None])
+            log.version += 1
+        elif kind == _VERSION:
+            log.version = offset
+
+    def _discard(self, length: int) -> None:
+        self._live_bytes -= length
+        self._dead_bytes += length
+
+    def _discard_checkpoint(self, log: _ScopeLog) -> None:
+        if log.checkpoint is not None:
+            self._discard(log.checkpoint[2])
+            log.checkpoint = None
+
+    def _read(self, location: _Location) -> bytes:
+        """Read a record out of its memory-mapped segment."""
+        segment, offset, length = location
+        segment_map = self._maps.get(segment)
+        if segment_map is None or offset + length > len(segment_map):
+            # Not mapped yet, or the active segment grew since it was mapped
+            if segment_map is not None:
+                segment_map.close()
+            with open(self.path / _segment_name(segment), "rb") as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = segment_map
+        return segment_map[offset : offset + length]
+
+    def _write(self, records: Sequence[bytes]) -> list[_Location]:
+        """Append records to the active segment, starting a new one if it is full."""
+        offset = self._segment_file.tell()
+        if offset > 0 and offset + sum(map(len, records)) > self.max_segment_bytes:
+            self._segment_file.close()
+            self._active_segment += 1
+            self._segment_file = open(self.path / _segment_name(self._active_segment), "ab")
+            offset = 0
+        locations = []
+        for record in records:
+            locations.append((self._active_segment, offset, len(record)))
+            offset += len(record)
+        self._segment_file.write(b"".join(records))
+        self._sync(self._segment_file)
+        return locations
+
+    def _log(self, entries: Sequence[tuple[int, int, _Location]]) -> None:
+        """Append (kind, key, location) entries to the index, and apply them."""
+        self._index_file.write(
+            b"".join(_ENTRY.pack(kind, key, *location) for kind, key, location in entries)
+        )
+        self._sync(self._index_file)
+        for kind, key, location in entries:
+            self._replay(kind, key, location)
+
+    def _sync(self, file: BinaryIO) -> None:
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+    def _scope_log(self, thread_id: str, scope: str | None) -> _ScopeLog | None:
+        return self._threads.get(thread_id, {}).get(scope)
+
+    def _locations(self, thread_id: str, scope: str | None) -> Iterator[_Location]:
+        """Locations of the messages of a thread, optionally of one scope, in append order."""
+        scopes = self._threads.get(thread_id, {})
+        if scope is not None:
+            log = scopes.get(scope)
+            return iter(log.messages if log is not None else ())
+        return merge(*(log.messages for log in scopes.values()))
+
+    def _decode(self, locations: Iterator[_Location]) -> list[ModelMessage]:
+        return [_message_adapter.validate_json(self._read(location)) for location in locations]
+
+    # MessageHistoryStore
+
+    async def get(self, thread_id: str, scope: str | None = None) -> list[ModelMessage]:
+        """Load message history for a thread, optionally filtered by scope."""
+        return await self._run(lambda: self._decode(self._locations(thread_id, scope)))
+
+    async def append(self, thread_id: str, message: ModelMessage, scope: str | None = None) -> None:
+        """Append a single message to history."""
+        await self.append_many(thread_id, [message], scope)
+
+    async def append_many(
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
+    ) -> None:
+        """Append multiple messages to history with one segment write and one index write."""
+        records = [_message_adapter.dump_json(message) for message in messages]
+
+        def append() -> None:
+            if expected_version is not None:
+                current_version = self._version(thread_id, scope)
+                if current_version != expected_version:
+                    raise VersionConflictError(thread_id, scope, expected_version, current_version)
+            if not records:
+                return
+            kinds = [_MESSAGE] * len(records)
+            log = self._scope_log(thread_id, scope)
+            if log is None:
+                key = len(self._keys)
+                records.insert(0, json.dumps([thread_id, scope]).encode())
+                kinds.insert(0, _KEY)
+            else:
+                key = log.key
+            locations = self._write(records)
+            self._log(list(zip(kinds, [key] * len(kinds), locations, strict=True)))
+
+        await self._run(append)
+
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread, optionally filtered by scope."""
+
+        def count() -> int:
+            scopes = self._threads.get(thread_id, {})
+            if scope is not None:
+                log = scopes.get(scope)
+                return len(log.messages) if log is not None else 0
+            return sum(len(log.messages) for log in scopes.values())
+
+        return await self._run(count)
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards."""
+        return await self._run(
+            lambda: self._decode(islice(self._locations(thread_id, scope), max(offset, 0), None))
+        )
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread."""
+        if n <= 0:
+            return []
+
+        def tail() -> list[ModelMessage]:
+            scopes = self._threads.get(thread_id, {})
+            if scope is not None:
+                log = scopes.get(scope)
+                return self._decode(iter(log.messages[-n:] if log is not None else ()))
+            latest = sorted(location for log in scopes.values() for location in log.messages[-n:])
+            return self._decode(iter(latest[-n:]))
+
+        return await self._run(tail)
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int:
+        """Get the version of a thread's history, optionally of a single scope."""
+        return await self._run(lambda: self._version(thread_id, scope))
+
+    def _version(self, thread_id: str, scope: str | None) -> int:
+        scopes = self._threads.get(thread_id, {})
+        if scope is not None:
+            log = scopes.get(scope)
+            return log.version if log is not None else self._version_floor
+        return sum(log.version for log in scopes.values()) if scopes else self._version_floor
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
+    ) -> None:
+        """Save a summary checkpoint for a thread, replacing any previous one.
+
+        The checkpoint of a (thread, scope) that has never been written to is discarded.
+        """
+        record = checkpoint.model_dump_json().encode()
+
+        def save() -> None:
+            log = self._scope_log(thread_id, scope)
+            if log is None:
+                return
+            (location,) = self._write([record])
+            self._log([(_CHECKPOINT, log.key, location)])
+
+        await self._run(save)
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread."""
+
+        def load() -> bytes | None:
+            log = self._scope_log(thread_id, scope)
+            if log is None or log.checkpoint is None:
+                return None
+            return self._read(log.checkpoint)
+
+        record = await self._run(load)
+        return HistoryCheckpoint.model_validate_json(record) if record is not None else None
+
+    async def fork(self, thread_id: str, new_thread_id: str, at: int | None = None) -> None:
+        """Start a new thread from the history of another, sharing its records.
+
+        The new thread's index entries point at the thread's records, so no message
+        is copied or decoded; only index entries are written. Compaction copies
+        shared records once per thread that refers to them.
+
+        Raises:
+            ValueError: If new_thread_id already has history.
+        """
+        await self._run(lambda: self._fork(thread_id, new_thread_id, at))
+
+    def _fork(self, thread_id: str, new_thread_id: str, at: int | None) -> None:
+        if any(log.messages for log in self._threads.get(new_thread_id, {}).values()):
+            raise ValueError(f"Thread {new_thread_id!r} already has history")
+        scopes = self._threads.get(thread_id, {})
+        tagged = merge(
+            *([(location, scope) for location in log.messages] for scope, log in scopes.items())
+        )
+        prefix = list(tagged if at is None else islice(tagged, max(at, 0)))
+        if not prefix:
+            return
+        keys: dict[str | None, int] = {}
+        key_records: list[bytes] = []
+        for _, scope in prefix:
+            if scope in keys:
+                continue
+            log = self._scope_log(new_thread_id, scope)
+            if log is not None:
+                keys[scope] = log.key
+            else:
+                keys[scope] = len(self._keys) + len(key_records)
+                key_records.append(json.dumps([new_thread_id, scope]).encode())
+        entries: list[tuple[int, int, _Location]] = []
+        if key_records:
+            locations = self._write(key_records)
+            entries.extend(
+                (_KEY, key, location) for key, location in enumerate(locations, len(self._keys))
+            )
+        entries.extend((_MESSAGE, keys[scope], location) for location, scope in prefix)
+        self._log(entries)
+
+    async def delete(self, thread_id: str, scope: str | None = None) -> None:
+        """Delete messages for a thread, optionally filtered by scope.
+
+        Checkpoints covering the deleted messages are deleted too. Segments are
+        compacted once deleted records hold enough space.
+        """
+
+        def delete() -> None:
+            scopes = self._threads.get(thread_id, {})
+            if scope is None:
+                logs = list(scopes.values())
+            else:
+                logs = [scopes[scope]] if scope in scopes else []
+            if not logs:
+                return
+            self._log([(_DELETE, log.key, (0, 0, 0)) for log in logs])
+            if self._dead_bytes > max(self._live_bytes, self.compact_min_bytes):
+                self._compact()
+
+        await self._run(delete)
+
+    async def compact(self) -> None:
+        """Copy the live records to new segments and remove the old ones."""
+        await self._run(self._compact)
+
+    def _compact(self) -> None:
+        """Rewrite the live records and the index, dropping the threads left without any.
+
+        Threads whose every scope was deleted are dropped from the index. New threads
+        start above their versions, so versions never go backwards.
+        """
+        old_segments = sorted(
+            int(segment_path.stem) for segment_path in self.path.glob(f"*{_SEGMENT_SUFFIX}")
+        )
+        self._close_files()
+        # The new segments must be on disk before the index pointing to them is
+        fsync, self.fsync = self.fsync, True
+        # New segments are numbered after the old ones, so a crash before the new index
+        # replaces the old one leaves them unreferenced, and they are dropped on open
+        self._active_segment = old_segments[-1] + 1 if old_segments else 0
+        self._segment_file = open(self.path / _segment_name(self._active_segment), "ab")
+
+        version_floor = self._version_floor
+        logs: list[tuple[str, str | None, _ScopeLog]] = []
+        for thread_id, scopes in self._threads.items():
+            if any(log.messages or log.checkpoint is not None for log in scopes.values()):
+                logs.extend((thread_id, scope, log) for scope, log in scopes.items())
+            else:
+                version_floor = max(version_floor, self._version(thread_id, None))
+        entries: list[tuple[int, int, _Location]] = [(_VERSION, _NO_KEY, (0, version_floor, 0))]
+        key_records = [json.dumps([thread_id, scope]).encode() for thread_id, scope, _ in logs]
+        entries.extend(
+            (_KEY, key, location) for key, location in enumerate(self._write(key_records))
+        )
+        # Messages are copied in the order they were written, which orders unscoped reads
+        messages = sorted(
+            (location, key) for key, (_, _, log) in enumerate(logs) for location in log.messages
+        )
+        for start in range(0, len(messages), _COMPACTION_BATCH):
+            batch = messages[start : start + _COMPACTION_BATCH]
+            locations = self._write([self._read(location) for location, _ in batch])
+            entries.extend(
+                (_MESSAGE, key, location)
+                for (_, key), location in zip(batch, locations, strict=True)
+            )
+        for key, (_, _, log) in enumerate(logs):
+            if log.checkpoint is not None:
+                (location,) = self._write([self._read(log.checkpoint)])
+                entries.append((_CHECKPOINT, key, location))
+            entries.append((_VERSION, key, (0, log.version, 0)))
+        self._segment_file.close()
+        self.fsync = fsync
+
+        new_index_path = self.path / f"{_INDEX_FILE}.compacting"
+        with open(new_index_path, "wb") as new_index:
+            new_index.write(
+                b"".join(_ENTRY.pack(kind, key, *location) for kind, key, location in entries)
+            )
+            new_index.flush()
+            os.fsync(new_index.fileno())
+        for segment_map in self._maps.values():
+            segment_map.close()
+        os.replace(new_index_path, self.path / _INDEX_FILE)
+        for segment in old_segments:
+            (self.path / _segment_name(segment)).unlink()
+        self._load()
+
+    def _close_files(self) -> None:
+        self._segment_file.close()
+        self._index_file.close()
+
+    async def close(self) -> None:
+        """Close the store's files and stop the store's thread."""
+
+        def close() -> None:
+            self._close_files()
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps.clear()
+
+        await self._run(close)
+        self._executor.shutdown(wait=True)
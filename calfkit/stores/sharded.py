@@ -0,0 +1,454 @@
+import bisect
+import hashlib
+import uuid
+from collections.abc import Awaitable, Callable, Collection, Mapping, Sequence
+from dataclasses import dataclass
+from time import perf_counter
+from typing import TypeVar
+
+from calfkit._vendor.pydantic_ai.messages import ModelMessage
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+
+T = TypeVar("T")
+
+# Reads of a scope's newer messages attempted per migration before giving up
+_MAX_MIGRATE_ATTEMPTS = 5
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class _HashRing:
+    """Consistent hash ring placing each shard at ``vnodes`` points."""
+
+    def __init__(self, shards: Collection[str], vnodes: int):
+        points = sorted((_hash(f"{shard}#{i}"), shard) for shard in shards for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def lookup(self, key: str) -> str:
+        """The shard owning ``key``: the first point at or after its hash, wrapping around."""
+        i = bisect.bisect_left(self._hashes, _hash(key))
+        return self._shards[i % len(self._shards)]
+
+
+@dataclass
+class ShardStats:
+    """Latency of the calls made to one shard."""
+
+    calls: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        """Mean latency of a call, or 0.0 if none were made."""
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+class ShardedMessageHistoryStore(MessageHistoryStore):
+    """Spreads threads across several MessageHistoryStores by consistent hashing.
+
+    Each thread lives entirely on the shard its thread_id hashes to, so every
+    operation, scoped or not, goes to a single backend. Shards are placed at
+    ``vnodes`` points each on a hash ring; adding or removing a shard only
+    moves the threads between it and its ring neighbours, about one in N.
+
+    Moved threads are not copied eagerly. Until :meth:`finish_rebalance`, a
+    moved thread is served from both its previous shard, which holds its older
+    messages, and its new shard, which receives its new messages. Use
+    :meth:`migrate` to copy a thread's history to its new shard.
+    """
+
+    def __init__(self, shards: Mapping[str, MessageHistoryStore], *, vnodes: int = 128):
+        """Initialize a ShardedMessageHistoryStore.
+
+        Args:
+            shards: The backends, by name. Names place shards on the ring, so keep
+                them stable across restarts.
+            vnodes: Points per shard on the ring. More points spread threads more evenly.
+
+        Raises:
+            ValueError: If no shard is given.
+        """
+        if not shards:
+            raise ValueError("at least one shard is required")
+        self.vnodes = vnodes
+        self._shards = dict(shards)
+        self._ring = _HashRing(self._shards, vnodes)
+        # Ring and backends from before the last shard change, until the rebalance is finished
+        self._previous_ring: _HashRing | None = None
+        self._previous_shards: dict[str, MessageHistoryStore] = {}
+        # Moved threads whose unscoped messages migrate could not move
+        self._unmigrated: set[str] = set()
+        self._stats = {name: ShardStats() for name in self._shards}
+
+    @property
+    def shards(self) -> Mapping[str, MessageHistoryStore]:
+        """The backends threads are placed on, by name."""
+        return self._shards
+
+    def shard_for(self, thread_id: str) -> str:
+        """Name of the shard a thread's new messages are written to."""
+        return self._ring.lookup(thread_id)
+
+    def stats(self) -> dict[str, ShardStats]:
+        """Latency of the calls made to each shard, by shard name."""
+        return dict(self._stats)
+
+    # Rebalancing
+
+    def add_shard(self, name: str, store: MessageHistoryStore) -> None:
+        """Add a shard, moving to it the threads it now owns.
+
+        Raises:
+            ValueError: If a shard with that name exists.
+            RuntimeError: If the previous rebalance is not finished.
+        """
+        if name in self._shards:
+            raise ValueError(f"Shard {name!r} already exists")
+        self._start_rebalance()
+        self._shards[name] = store
+        self._ring = _HashRing(self._shards, self.vnodes)
+        self._stats.setdefault(name, ShardStats())
+
+    def remove_shard(self, name: str) -> MessageHistoryStore:
+        """Remove a shard, moving its threads to the remaining shards.
+
+        The removed backend keeps serving the older messages of its threads until
+        the rebalance is finished, so do not close it before.
+
+        Returns:
+            The removed backend.
+
+        Raises:
+            KeyError: If there is no shard with that name.
+            ValueError: If it is the last shard.
+            RuntimeError: If the previous rebalance is not finished.
+        """
+        if name not in self._shards:
+            raise KeyError(f"Shard {name!r} not found")
+        if len(self._shards) == 1:
+            raise ValueError("cannot remove the last shard")
+        self._start_rebalance()
+        store = self._shards.pop(name)
+        self._ring = _HashRing(self._shards, self.vnodes)
+        return store
+
+    def _start_rebalance(self) -> None:
+        if self._previous_ring is not None:
+            raise RuntimeError("finish the current rebalance before changing shards again")
+        self._previous_ring = self._ring
+        self._previous_shards = dict(self._shards)
+
+    def moved(self, thread_id: str) -> bool:
+        """Whether a thread changed shards in the rebalance in progress."""
+        return self._previous_owner(thread_id) is not None
+
+    async def migrate(self, thread_id: str, scopes: Sequence[str]) -> None:
+        """Move a thread's history off its previous shard, if it changed shards.
+
+        Messages are copied scope by scope, so unscoped reads on the new shard return
+        them grouped by scope rather than interleaved as they were written. Whatever
+        is left on the previous shard once the given scopes are moved is taken to be
+        the thread's unscoped messages, and is moved too, unless the new shard got
+        unscoped messages of its own, which they could not be ordered against.
+
+        Each scope is rewritten on the new shard, and appends racing with the rewrite
+        are detected by the shard's version of the scope. With shards that do not track
+        versions, quiesce the thread while it is migrated, or such appends may be lost.
+
+        Args:
+            thread_id: The thread to move.
+            scopes: Every scope the thread has messages in, e.g. the names of the
+                routers that handled it.
+
+        Raises:
+            VersionConflictError: If the new shard's messages of a scope kept changing
+                while they were read.
+        """
+        previous = self._previous_owner(thread_id)
+        if previous is None:
+            return
+        for scope in scopes:
+            await self._migrate_scope(thread_id, scope, previous)
+        await self._migrate_unscoped(thread_id, scopes, previous)
+
+    async def _migrate_scope(self, thread_id: str, scope: str, previous: str) -> None:
+        owner = self.shard_for(thread_id)
+        older = await self._call(previous, lambda s: s.get(thread_id, scope))
+        if not older:
+            return
+        checkpoint = await self._call(previous, lambda s: s.load_checkpoint(thread_id, scope))
+        for attempt in range(1, _MAX_MIGRATE_ATTEMPTS + 1):
+            version = await self._call(owner, lambda s: s.version(thread_id, scope))
+            newer = await self._call(owner, lambda s: s.get(thread_id, scope))
+            # An append landing after the read would be lost by the rewrite
+            current_version = await self._call(owner, lambda s: s.version(thread_id, scope))
+            if version is None or current_version == version:
+                break
+            if attempt == _MAX_MIGRATE_ATTEMPTS:
+                raise VersionConflictError(thread_id, scope, version, current_version)
+        # Rewritten rather than prepended to, since stores only append
+        await self._call(owner, lambda s: s.delete(thread_id, scope))
+        await self._call(owner, lambda s: s.append_many(thread_id, older + newer, scope))
+        if checkpoint is not None:
+            await self._call(owner, lambda s: s.save_checkpoint(thread_id, checkpoint, scope))
+        await self._call(previous, lambda s: s.delete(thread_id, scope))
+
+    async def _migrate_unscoped(self, thread_id: str, scopes: Sequence[str], previous: str) -> None:
+        owner = self.shard_for(thread_id)
+        older = await self._call(previous, lambda s: s.get(thread_id))
+        if not older:
+            self._unmigrated.discard(thread_id)
+            return
+        scoped_count = 0
+        for scope in scopes:
+            scoped_count += await self._call(owner, lambda s: s.count(thread_id, scope))
+        if await self._call(owner, lambda s: s.count(thread_id)) != scoped_count:
+            self._unmigrated.add(thread_id)
+            return
+        await self._call(owner, lambda s: s.append_many(thread_id, older))
+        await self._call(previous, lambda s: s.delete(thread_id))
+        self._unmigrated.discard(thread_id)
+
+    def finish_rebalance(self) -> dict[str, MessageHistoryStore]:
+        """Stop reading moved threads from their previous shards.
+
+        Call once every moved thread was migrated, or its older history may be dropped.
+
+        Returns:
+            The backends removed in this rebalance, which can now be closed.
+
+        Raises:
+            RuntimeError: If migrate left unscoped messages of a thread on its previous
+                shard. Delete or rewrite the thread, then migrate it again.
+        """
+        if self._unmigrated:
+            raise RuntimeError(
+                f"unscoped messages of {len(self._unmigrated)} threads are still on their"
+                f" previous shards, e.g. {next(iter(self._unmigrated))!r}"
+            )
+        removed = {
+            name: store for name, store in self._previous_shards.items() if name not in self._shards
+        }
+        self._previous_ring = None
+        self._previous_shards = {}
+        return removed
+
+    # Routing
+
+    def _previous_owner(self, thread_id: str) -> str | None:
+        """The shard holding a moved thread's older messages, or None if it did not move."""
+        if self._previous_ring is None:
+            return None
+        previous = self._previous_ring.lookup(thread_id)
+        return previous if previous != self.shard_for(thread_id) else None
+
+    async def _call(self, shard: str, fn: Callable[[MessageHistoryStore], Awaitable[T]]) -> T:
+        """Call ``fn`` with a shard's backend, recording its latency."""
+        store = self._shards[shard] if shard in self._shards else self._previous_shards[shard]
+        stats = self._stats[shard]
+        start = perf_counter()
+        try:
+            return await fn(store)
+        except BaseException:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    # MessageHistoryStore
+
+    async def get(self, thread_id: str, scope: str | None = None) -> list[ModelMessage]:
+        """Load message history for a thread, optionally filtered by scope."""
+        messages = await self._call(self.shard_for(thread_id), lambda s: s.get(thread_id, scope))
+        previous = self._previous_owner(thread_id)
+        if previous is None:
+            return messages
+        return await self._call(previous, lambda s: s.get(thread_id, scope)) + messages
+
+    async def append(self, thread_id: str, message: ModelMessage, scope: str | None = None) -> None:
+        """Append a single message to history."""
+        await self.append_many(thread_id, [message], scope)
+
+    async def append_many(
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
+    ) -> None:
+        """Append messages to the thread's shard.
+
+        ``expected_version`` is checked by the shard itself, so the check is as strong
+        as the shard's. For moved threads, the version of their previous shard is
+        subtracted first.
+        """
+        owner = self.shard_for(thread_id)
+        previous = self._previous_owner(thread_id)
+        if expected_version is not None and previous is not None:
+            previous_version = await self._call(previous, lambda s: s.version(thread_id, scope))
+            if previous_version is None:
+                raise VersionConflictError(thread_id, scope, expected_version, None)
+            expected_version -= previous_version
+        await self._call(
+            owner,
+            lambda s: s.append_many(thread_id, messages, scope, expected_version=expected_version),
+        )
+
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread, optionally filtered by scope."""
+        count = await self._call(self.shard_for(thread_id), lambda s: s.count(thread_id, scope))
+        previous = self._previous_owner(thread_id)
+        if previous is None:
+            return count
+        return count + await self._call(previous, lambda s: s.count(thread_id, scope))
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards."""
+        owner = self.shard_for(thread_id)
+        previous = self._previous_owner(thread_id)
+        if previous is None:
+            return await self._call(owner, lambda s: s.get_since(thread_id, offset, scope))
+        older = await self._call(previous, lambda s: s.get_since(thread_id, offset, scope))
+        previous_count = await self._call(previous, lambda s: s.count(thread_id, scope))
+        newer_offset = max(offset - previous_count, 0)
+        return older + await self._call(
+            owner, lambda s: s.get_since(thread_id, newer_offset, scope)
+        )
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread."""
+        messages = await self._call(
+            self.shard_for(thread_id), lambda s: s.tail(thread_id, n, scope)
+        )
+        previous = self._previous_owner(thread_id)
+        if previous is None or len(messages) >= n:
+            return messages
+        rest = n - len(messages)
+        return await self._call(previous, lambda s: s.tail(thread_id, rest, scope)) + messages
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int | None:
+        """Get the version of a thread's history from its shard.
+
+        For moved threads, the sum of the versions on their previous and new shards.
+        """
+        version = await self._call(self.shard_for(thread_id), lambda s: s.version(thread_id, scope))
+        previous = self._previous_owner(thread_id)
+        if previous is None or version is None:
+            return version
+        previous_version = await self._call(previous, lambda s: s.version(thread_id, scope))
+        return None if previous_version is None else version + previous_version
+
+    @property
+    def supports_checkpoints(self) -> bool:
+        return all(shard.supports_checkpoints for shard in self._shards.values())
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
+    ) -> None:
+        """Save a summary checkpoint for a thread on its shard."""
+        await self._call(
+            self.shard_for(thread_id), lambda s: s.save_checkpoint(thread_id, checkpoint, scope)
+        )
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread from its shard.
+
+        Moved threads fall back to the checkpoint on their previous shard.
+        """
+        checkpoint = await self._call(
+            self.shard_for(thread_id), lambda s: s.load_checkpoint(thread_id, scope)
+        )
+        previous = self._previous_owner(thread_id)
+        if checkpoint is not None or previous is None:
+            return checkpoint
+        return await self._call(previous, lambda s: s.load_checkpoint(thread_id, scope))
+
+    async def fork(
+        self,
+        thread_id: str,
+        new_thread_id: str,
+        at: int | None = None,
+        *,
+        scopes: Sequence[str] | None = None,
+    ) -> None:
+        """Fork a thread, on its shard if the new thread is placed on the same one.
+
+        Across shards, the thread is forked on its shard under a temporary id, and the
+        fork's messages are copied to the new thread's shard scope by scope, with the
+        checkpoint of each scope. Whatever the fork holds outside ``scopes`` is copied
+        as unscoped messages, so ``scopes`` must be given. Unscoped reads of the copy
+        return its messages grouped by scope rather than interleaved as they were written.
+
+        Args:
+            thread_id: The thread to fork.
+            new_thread_id: The new thread. Must not have any history.
+            at: Number of leading messages of the thread to fork from. All if None.
+            scopes: Every scope the thread has messages in. Required across shards;
+                pass an empty sequence if the thread only has unscoped messages.
+
+        Raises:
+            ValueError: If new_thread_id already has history, or if the threads are on
+                different shards and scopes is not given.
+            NotImplementedError: If either thread moved in the rebalance in progress,
+                or the thread's shard does not support forking.
+        """
+        if self.moved(thread_id) or self.moved(new_thread_id):
+            raise NotImplementedError("threads cannot be forked while they are being moved")
+        owner = self.shard_for(thread_id)
+        target = self.shard_for(new_thread_id)
+        if target == owner:
+            await self._call(owner, lambda s: s.fork(thread_id, new_thread_id, at))
+            return
+        if await self._call(target, lambda s: s.count(new_thread_id)):
+            raise ValueError(f"Thread {new_thread_id!r} already has history")
+        if scopes is None:
+            if not await self._call(owner, lambda s: s.count(thread_id)):
+                return
+            # Its scoped messages would otherwise be copied as unscoped ones
+            raise ValueError(
+                f"scopes are required to fork {thread_id!r} to {new_thread_id!r} on another shard"
+            )
+        staged = f"{new_thread_id}#fork-{uuid.uuid4().hex}"
+        await self._call(owner, lambda s: s.fork(thread_id, staged, at))
+        try:
+            for scope in scopes:
+                messages = await self._call(owner, lambda s: s.get(staged, scope))
+                if not messages:
+                    continue
+                await self._call(target, lambda s: s.append_many(new_thread_id, messages, scope))
+                # Forks do not carry checkpoints over, so take the forked thread's
+                checkpoint = await self._call(owner, lambda s: s.load_checkpoint(thread_id, scope))
+                if checkpoint is not None and checkpoint.covers <= len(messages):
+                    await self._call(
+                        target, lambda s: s.save_checkpoint(new_thread_id, checkpoint, scope)
+                    )
+                await self._call(owner, lambda s: s.delete(staged, scope))
+            rest = await self._call(owner, lambda s: s.get(staged))
+            if rest:
+                await self._call(target, lambda s: s.append_many(new_thread_id, rest))
+        finally:
+            await self._call(owner, lambda s: s.delete(staged))
+
+    async def delete(self, thread_id: str, scope: str | None = None) -> None:
+        """Delete messages for a thread, optionally filtered by scope.
+
+        Moved threads are deleted from their previous shard too.
+        """
+        await self._call(self.shard_for(thread_id), lambda s: s.delete(thread_id, scope))
+        previous = self._previous_owner(thread_id)
+        if previous is not None:
+            await self._call(previous, lambda s: s.delete(thread_id, scope))
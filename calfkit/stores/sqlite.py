@@ -0,0 +1,378 @@
+import asyncio
+import os
+import sqlite3
+import zlib
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from pydantic import TypeAdapter
+
+from calfkit._vendor.pydantic_ai.messages import ModelMessage
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores.base import MessageHistoryStore, VersionConflictError
+
+T = TypeVar("T")
+
+_message_adapter: TypeAdapter[ModelMessage] = TypeAdapter(ModelMessage)
+
+# Encoded messages start with a one-byte tag: raw JSON, or zlib-compressed JSON
+_RAW = b"j"
+_ZLIB = b"z"
+_COMPRESS_ABOVE_BYTES = 512
+
+# Unscoped messages are stored under the empty scope, so the index can cover them
+_NO_SCOPE = ""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_thread_scope_seq
+    ON messages (thread_id, scope, seq);
+CREATE INDEX IF NOT EXISTS messages_thread_id ON messages (thread_id, id);
+CREATE TABLE IF NOT EXISTS versions (
+    thread_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (thread_id, scope)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    covers INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (thread_id, scope)
+) WITHOUT ROWID;
+"""
+
+# Rows of the versions table count the writes to each (thread, scope). They are kept
+# across deletes so versions never go backwards; a thread's version is their sum.
+_BUMP_VERSION = """
+INSERT INTO versions (thread_id, scope, version) VALUES (?, ?, 1)
+ON CONFLICT (thread_id, scope) DO UPDATE SET version = version + 1
+"""
+
+
+def _query_version(connection: sqlite3.Connection, thread_id: str, scope: str | None) -> int:
+    if scope is None:
+        row = connection.execute(
+            "SELECT COALESCE(SUM(version), 0) FROM versions WHERE thread_id = ?",
+            (thread_id,),
+        ).fetchone()
+    else:
+        row = connection.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM versions WHERE thread_id = ? AND scope = ?",
+            (thread_id, scope),
+        ).fetchone()
+    return int(row[0])
+
+
+def _encode(message: ModelMessage) -> bytes:
+    data = _message_adapter.dump_json(message)
+    if len(data) > _COMPRESS_ABOVE_BYTES:
+        return _ZLIB + zlib.compress(data)
+    return _RAW + data
+
+
+def _decode(data: bytes) -> ModelMessage:
+    tag, payload = data[:1], data[1:]
+    if tag == _ZLIB:
+        payload = zlib.decompress(payload)
+    return _message_adapter.validate_json(payload)
+
+
+class SQLiteMessageHistoryStore(MessageHistoryStore):
+    """Durable message history store backed by a SQLite database file.
+
+    The database runs in WAL mode and is only touched from a single dedicated
+    thread, so the event loop never blocks on disk I/O and writes never contend.
+    Each ``append_many`` is a single transaction, and messages are indexed by
+    ``(thread_id, scope, seq)`` so scoped reads, including ``get_since`` and
+    ``tail``, are index range scans. Messages
+    are stored as JSON, zlib-compressed when large.
+
+    The store is intended for a single process. Share history between replicas
+    with a networked store instead.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]):
+        """Initialize a SQLiteMessageHistoryStore.
+
+        Args:
+            path: Path of the database file, created if missing. ``":memory:"``
+                gives a transient database.
+        """
+        self.path = os.fspath(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calfkit-sqlite")
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` with the connection on the store's dedicated thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect()))
+
+    async def get(self, thread_id: str, scope: str | None = None) -> list[ModelMessage]:
+        """Load message history for a thread, optionally filtered by scope."""
+
+        def query(connection: sqlite3.Connection) -> list[bytes]:
+            if scope is None:
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? ORDER BY id", (thread_id,)
+                )
+            else:
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? AND scope = ? ORDER BY seq",
+                    (thread_id, scope),
+                )
+            return [row[0] for row in rows]
+
+        return [_decode(data) for data in await self._run(query)]
+
+    async def append(self, thread_id: str, message: ModelMessage, scope: str | None = None) -> None:
+        """Append a single message to history."""
+        await self.append_many(thread_id, [message], scope)
+
+    async def append_many(
+        self,
+        thread_id: str,
+        messages: Sequence[ModelMessage],
+        scope: str | None = None,
+        *,
+        expected_version: int | None = None,
+    ) -> None:
+        """Append multiple messages to history in a single transaction.
+
+        ``expected_version`` is checked within the transaction, so the check holds
+        across processes sharing the database file.
+        """
+        if not messages and expected_version is None:
+            return
+        encoded = [_encode(message) for message in messages]
+        scope_key = _NO_SCOPE if scope is None else scope
+
+        def insert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                if expected_version is not None:
+                    current_version = _query_version(connection, thread_id, scope)
+                    if current_version != expected_version:
+                        raise VersionConflictError(
+                            thread_id, scope, expected_version, current_version
+                        )
+                if not encoded:
+                    return
+                (next_seq,) = connection.execute(
+                    "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages"
+                    " WHERE thread_id = ? AND scope = ?",
+                    (thread_id, scope_key),
+                ).fetchone()
+                connection.executemany(
+                    "INSERT INTO messages (thread_id, scope, seq, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (thread_id, scope_key, next_seq + offset, data)
+                        for offset, data in enumerate(encoded)
+                    ],
+                )
+                connection.execute(_BUMP_VERSION, (thread_id, scope_key))
+
+        await self._run(insert)
+
+    async def count(self, thread_id: str, scope: str | None = None) -> int:
+        """Count the messages stored for a thread, optionally filtered by scope."""
+
+        def query(connection: sqlite3.Connection) -> int:
+            if scope is None:
+                row = connection.execute(
+                    "SELECT COUNT(*) FROM messages WHERE thread_id = ?", (thread_id,)
+                ).fetchone()
+            else:
+                row = connection.execute(
+                    "SELECT COUNT(*) FROM messages WHERE thread_id = ? AND scope = ?",
+                    (thread_id, scope),
+                ).fetchone()
+            return int(row[0])
+
+        return await self._run(query)
+
+    async def get_since(
+        self, thread_id: str, offset: int, scope: str | None = None
+    ) -> list[ModelMessage]:
+        """Load the messages of a thread from position ``offset`` onwards."""
+
+        def query(connection: sqlite3.Connection) -> list[bytes]:
+            if scope is None:
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? ORDER BY id LIMIT -1 OFFSET ?",
+                    (thread_id, max(offset, 0)),
+                )
+            else:
+                # A scope is only ever deleted as a whole, so its seqs are its positions
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? AND scope = ? AND seq >= ?"
+                    " ORDER BY seq",
+                    (thread_id, scope, offset),
+                )
+            return [row[0] for row in rows]
+
+        return [_decode(data) for data in await self._run(query)]
+
+    async def tail(self, thread_id: str, n: int, scope: str | None = None) -> list[ModelMessage]:
+        """Load the last ``n`` messages of a thread."""
+        if n <= 0:
+            return []
+
+        def query(connection: sqlite3.Connection) -> list[bytes]:
+            if scope is None:
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? ORDER BY id DESC LIMIT ?",
+                    (thread_id, n),
+                )
+            else:
+                rows = connection.execute(
+                    "SELECT data FROM messages WHERE thread_id = ? AND scope = ?"
+                    " ORDER BY seq DESC LIMIT ?",
+                    (thread_id, scope, n),
+                )
+            return [row[0] for row in rows][::-1]
+
+        return [_decode(data) for data in await self._run(query)]
+
+    async def version(self, thread_id: str, scope: str | None = None) -> int:
+        """Get the version of a thread's history, optionally of a single scope."""
+
+        return await self._run(lambda connection: _query_version(connection, thread_id, scope))
+
+    async def save_checkpoint(
+        self, thread_id: str, checkpoint: HistoryCheckpoint, scope: str | None = None
+    ) -> None:
+        """Save a summary checkpoint for a thread, replacing any previous one."""
+        scope_key = _NO_SCOPE if scope is None else scope
+
+        def upsert(connection: sqlite3.Connection) -> None:
+            connection.execute(
+                "INSERT INTO checkpoints (thread_id, scope, covers, summary) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (thread_id, scope)"
+                " DO UPDATE SET covers = excluded.covers, summary = excluded.summary",
+                (thread_id, scope_key, checkpoint.covers, checkpoint.summary),
+            )
+
+        await self._run(upsert)
+
+    async def load_checkpoint(
+        self, thread_id: str, scope: str | None = None
+    ) -> HistoryCheckpoint | None:
+        """Load the latest summary checkpoint of a thread."""
+        scope_key = _NO_SCOPE if scope is None else scope
+
+        def query(connection: sqlite3.Connection) -> tuple[int, str] | None:
+            row = connection.execute(
+                "SELECT covers, summary FROM checkpoints WHERE thread_id = ? AND scope = ?",
+                (thread_id, scope_key),
+            ).fetchone()
+            return None if row is None else (int(row[0]), str(row[1]))
+
+        row = await self._run(query)
+        if row is None:
+            return None
+        return HistoryCheckpoint(covers=row[0], summary=row[1])
+
+    async def fork(self, thread_id: str, new_thread_id: str, at: int | None = None) -> None:
+        """Start a new thread from the history of another.
+
+        The messages are copied within the database, in a single transaction,
+        without being decoded.
+
+        Raises:
+            ValueError: If new_thread_id already has history.
+        """
+        if at is not None and at <= 0:
+            return
+
+        def copy(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                if connection.execute(
+                    "SELECT 1 FROM messages WHERE thread_id = ? LIMIT 1", (new_thread_id,)
+                ).fetchone():
+                    raise ValueError(f"Thread {new_thread_id!r} already has history")
+                if at is None:
+                    row = connection.execute(
+                        "SELECT MAX(id) FROM messages WHERE thread_id = ?", (thread_id,)
+                    ).fetchone()
+                else:
+                    row = connection.execute(
+                        "SELECT id FROM messages WHERE thread_id = ? ORDER BY id LIMIT 1 OFFSET ?",
+                        (thread_id, at - 1),
+                    ).fetchone()
+                if row is None or row[0] is None:
+                    return
+                # Scopes are copied whole up to the cutoff, so seqs stay positions
+                connection.execute(
+                    "INSERT INTO messages (thread_id, scope, seq, data)"
+                    " SELECT ?, scope, seq, data FROM messages"
+                    " WHERE thread_id = ? AND id <= ? ORDER BY id",
+                    (new_thread_id, thread_id, row[0]),
+                )
+                scopes = connection.execute(
+                    "SELECT DISTINCT scope FROM messages WHERE thread_id = ?", (new_thread_id,)
+                ).fetchall()
+                connection.executemany(
+                    _BUMP_VERSION, [(new_thread_id, scope) for (scope,) in scopes]
+                )
+
+        await self._run(copy)
+
+    async def delete(self, thread_id: str, scope: str | None = None) -> None:
+        """Delete messages for a thread, optionally filtered by scope.
+
+        Checkpoints covering the deleted messages are deleted too.
+        """
+
+        def delete(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                if scope is None:
+                    connection.execute(
+                        "UPDATE versions SET version = version + 1 WHERE thread_id = ? AND scope IN"
+                        " (SELECT DISTINCT scope FROM messages WHERE thread_id = ?)",
+                        (thread_id, thread_id),
+                    )
+                    connection.execute("DELETE FROM messages WHERE thread_id = ?", (thread_id,))
+                    connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                else:
+                    connection.execute(
+                        "DELETE FROM messages WHERE thread_id = ? AND scope = ?",
+                        (thread_id, scope),
+                    )
+                    connection.execute(
+                        "DELETE FROM checkpoints WHERE thread_id = ? AND scope IN (?, ?)",
+                        (thread_id, scope, _NO_SCOPE),
+                    )
+                    connection.execute(_BUMP_VERSION, (thread_id, scope))
+
+        await self._run(delete)
+
+    async def close(self) -> None:
+        """Close the database connection and stop the store's thread."""
+
+        def close(connection: sqlite3.Connection) -> None:
+            connection.close()
+
+        if self._connection is not None:
+            await self._run(close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
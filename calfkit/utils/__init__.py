@@ -0,0 +1,7 @@
+"""Concurrency and caching utilities for calf SDK nodes."""
+
+from .keyed_lock import KeyedLock
+from .lru import LRUCache
+from .single_flight import SingleFlight
+
+__all__ = ["KeyedLock", "LRUCache", "SingleFlight"]
@@ -0,0 +1,52 @@
+import asyncio
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class _LockEntry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class KeyedLock:
+    """A family of asyncio locks, one per key.
+
+    Tasks holding different keys run concurrently; tasks holding the same key
+    run one at a time, in the order they asked for it. Locks are created on
+    first use and dropped once no task holds or waits on them, so the number
+    of live locks is bounded by the number of in-flight keys.
+
+    Example::
+
+        locks = KeyedLock()
+        async with locks(thread_id):
+            ...  # at most one task per thread_id in here
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Hashable, _LockEntry] = {}
+
+    @asynccontextmanager
+    async def __call__(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _LockEntry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._entries[key]
+
+    def locked(self, key: Hashable) -> bool:
+        """Whether a task currently holds the lock for ``key``."""
+        entry = self._entries.get(key)
+        return entry is not None and entry.lock.locked()
+
+    def __len__(self) -> int:
+        """Number of keys currently held or waited on."""
+        return len(self._entries)
@@ -0,0 +1,61 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+V = TypeVar("V")
+
+
+@dataclass(eq=False)
+class _Call(Generic[V]):
+    task: "asyncio.Future[V]"
+    waiters: int = 0
+
+
+class SingleFlight(Generic[V]):
+    """Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key starts the call; callers arriving with the same key
+    while it runs wait for it and share its result (or exception). Nothing is kept
+    once the call completes, so a later caller starts a new one. The call is
+    cancelled only when every caller waiting on it was cancelled.
+
+    Example::
+
+        flights: SingleFlight[ModelResponse] = SingleFlight()
+        response, shared = await flights.do(request_hash, lambda: call_model(request))
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call[V]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> tuple[V, bool]:
+        """Run ``fn``, or join the call already running for ``key``.
+
+        Args:
+            key: Identifies calls that may share a result.
+            fn: Starts the call. Only invoked if no call for ``key`` is running.
+
+        Returns:
+            The call's result, and whether it was shared with a call already running.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call[V]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        """Number of calls currently running."""
+        return len(self._calls)
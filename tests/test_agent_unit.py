@@ -3,11 +3,14 @@ from dataclasses import dataclass
 from typing import Annotated
 
 import pytest
+from aiokafka import TopicPartition
 from faststream import Context
 from faststream.kafka import TestKafkaBroker
+from faststream.kafka.annotations import KafkaMessage
 
 from calfkit._vendor.pydantic_ai import (
     ModelMessage,
+    ModelRequest,
     ModelResponse,
     TextPart,
     ToolCallPart,
@@ -17,10 +20,12 @@ from calfkit._vendor.pydantic_ai import (
 from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
 from calfkit.broker.broker import BrokerClient
 from calfkit.models.event_envelope import EventEnvelope
+from calfkit.models.tool_bundle import ToolBundle
 from calfkit.models.tool_context import ToolContext
 from calfkit.nodes.agent_router_node import AgentRouterNode
 from calfkit.nodes.base_tool_node import agent_tool
 from calfkit.nodes.chat_node import ChatNode
+from calfkit.runners.rebalance import NodeRebalanceListener
 from calfkit.runners.service import NodesService
 from calfkit.stores.in_memory import InMemoryMessageHistoryStore
 from tests.utils import wait_for_condition
@@ -553,3 +558,555 @@ async def test_router_targets_named_chat_node():
         result_b = await response_store["beta-1"].get()
         assert isinstance(result_b.latest_message_in_history, ModelResponse)
         assert "beta-response" in str(result_b.latest_message_in_history.parts[0])
+
+
+# Test: Delta-encoded message history
+
+
+@pytest.mark.asyncio
+async def test_delta_history_envelope():
+    """With delta_history enabled, envelopes carry a HistoryRef plus only the new messages,
+    while the ChatNode still hands the full history (and system prompt) to the model."""
+    seen_history_lengths: list[int] = []
+
+    def delta_model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        seen_history_lengths.append(len(messages))
+        assert "You are a memory test" in str(messages[0].parts[0])
+        return ModelResponse(parts=[TextPart(f"reply {len(seen_history_lengths)}")])
+
+    broker = BrokerClient()
+    service = NodesService(broker)
+
+    memory_store = InMemoryMessageHistoryStore()
+    chat_node = ChatNode(FunctionModel(delta_model), message_history_store=memory_store)
+    service.register_node(chat_node)
+
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        system_prompt="You are a memory test",
+        message_history_store=memory_store,
+        delta_history=True,
+    )
+    service.register_node(router_node)
+
+    response_store: dict[str, asyncio.Queue[EventEnvelope]] = {}
+
+    @broker.subscriber("final_response")
+    def collect_response(event_envelope: EventEnvelope, correlation_id: Annotated[str, Context()]):
+        if correlation_id not in response_store:
+            response_store[correlation_id] = asyncio.Queue()
+        response_store[correlation_id].put_nowait(event_envelope)
+
+    async with TestKafkaBroker(broker) as _:
+        for i in range(2):
+            correlation_id = f"test-delta-{i}"
+            await router_node.invoke(
+                user_prompt=f"message {i}",
+                broker=broker,
+                thread_id="delta-thread",
+                final_response_topic="final_response",
+                correlation_id=correlation_id,
+            )
+            await wait_for_condition(lambda: correlation_id in response_store, timeout=5.0)
+            result = await response_store[correlation_id].get()
+            assert result.history_ref is not None
+            assert result.history_ref.seq == 2 * i + 1
+            assert len(result.message_history) == 1
+            assert isinstance(result.latest_message_in_history, ModelResponse)
+
+    # system prompt + user1 / system prompt + user1, reply1, user2
+    assert seen_history_lengths == [2, 4]
+    assert len(await memory_store.get("delta-thread")) == 4
+
+
+# Test: Router emission policy
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("emission_policy", "expected_history_lengths"),
+    [
+        ("full", [1, 2, 3, 4]),
+        ("deltas_only", [1, 1, 1, 1]),
+        ("final_only", [4]),
+    ],
+)
+async def test_router_emission_policy(emission_policy, expected_history_lengths):
+    """The router's output topic carries every hop, only per-hop deltas, or only the final."""
+
+    def tool_then_answer(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if not any(isinstance(part, ToolReturnPart) for msg in messages for part in msg.parts):
+            return ModelResponse(
+                parts=[
+                    ToolCallPart(
+                        tool_name="get_weather",
+                        args={"location": "Tokyo"},
+                        tool_call_id="emission-call-1",
+                    )
+                ]
+            )
+        return ModelResponse(parts=[TextPart("The weather in Tokyo is rainy.")])
+
+    broker = BrokerClient()
+    service = NodesService(broker)
+
+    chat_node = ChatNode(FunctionModel(tool_then_answer))
+    service.register_node(chat_node)
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        tool_nodes=[get_weather],
+        emission_policy=emission_policy,
+    )
+    service.register_node(router_node)
+    service.register_node(get_weather)
+
+    emitted: list[EventEnvelope] = []
+    finals: list[EventEnvelope] = []
+
+    @broker.subscriber(router_node.publish_to_topic or "default_collect")
+    def collect_output(event_envelope: EventEnvelope):
+        emitted.append(event_envelope)
+
+    @broker.subscriber("final_response")
+    def collect_final(event_envelope: EventEnvelope):
+        finals.append(event_envelope)
+
+    async with TestKafkaBroker(broker) as _:
+        await router_node.invoke(
+            user_prompt="What's the weather in Tokyo?",
+            broker=broker,
+            final_response_topic="final_response",
+            correlation_id="test-emission-policy",
+        )
+        await wait_for_condition(
+            lambda: len(finals) == 1 and len(emitted) >= len(expected_history_lengths),
+            timeout=5.0,
+        )
+
+    # The in-memory test broker delivers nested publishes depth-first, so ignore ordering
+    history_lengths = sorted(len(envelope.message_history) for envelope in emitted)
+    assert history_lengths == expected_history_lengths
+    assert any("rainy" in str(envelope.latest_message_in_history) for envelope in emitted)
+    assert len(finals[0].message_history) == 4
+
+
+# Test: Concurrent tool results for the same thread
+
+
+class _SlowStore(InMemoryMessageHistoryStore):
+    """Yields to the event loop on every call to expose interleaving between hops."""
+
+    async def append_many(self, thread_id, messages, scope=None, **kwargs):
+        await asyncio.sleep(0.01)
+        await super().append_many(thread_id, messages, scope, **kwargs)
+
+    async def get(self, thread_id, scope=None):
+        await asyncio.sleep(0.01)
+        return await super().get(thread_id, scope)
+
+
+class _RecordingBroker:
+    def __init__(self) -> None:
+        self.published_topics: list[str] = []
+
+    async def publish(self, message, topic, **kwargs):
+        self.published_topics.append(topic)
+
+
+@pytest.mark.asyncio
+async def test_router_serializes_concurrent_tool_results():
+    """Tool results for one thread arriving concurrently must trigger exactly one model call."""
+    store = _SlowStore()
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        tool_nodes=[get_weather, get_temperature],
+        message_history_store=store,
+    )
+    await store.append_many(
+        "fan-in-thread",
+        [
+            ModelRequest.user_text_prompt("Weather and temperature in Tokyo?"),
+            ModelResponse(
+                parts=[
+                    ToolCallPart("get_weather", {"location": "Tokyo"}, tool_call_id="call-1"),
+                    ToolCallPart("get_temperature", {"location": "Tokyo"}, tool_call_id="call-2"),
+                ]
+            ),
+        ],
+        scope=router_node.name,
+    )
+
+    def tool_result(tool_name: str, tool_call_id: str) -> EventEnvelope:
+        envelope = EventEnvelope(thread_id="fan-in-thread")
+        envelope.prepare_uncommitted_agent_messages(
+            [ModelRequest(parts=[ToolReturnPart(tool_name, "done", tool_call_id=tool_call_id)])]
+        )
+        return envelope
+
+    broker = _RecordingBroker()
+    await asyncio.gather(
+        router_node._router(tool_result("get_weather", "call-1"), "fan-in", broker),
+        router_node._router(tool_result("get_temperature", "call-2"), "fan-in", broker),
+    )
+
+    chat_topic = chat_node.entrypoint_topic or chat_node.subscribed_topic
+    assert broker.published_topics.count(chat_topic) == 1
+    assert len(await store.get("fan-in-thread")) == 4
+    assert len(router_node._thread_locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_router_tracks_outstanding_tool_calls(monkeypatch):
+    """Tool result hops settle against the tracked tool_call_ids without rescanning history."""
+    import calfkit.nodes.agent_router_node as agent_router_module
+
+    scans: list[int] = []
+    original_validate = agent_router_module.validate_tool_call_pairs
+
+    def counting_validate(messages):
+        scans.append(len(messages))
+        return original_validate(messages)
+
+    monkeypatch.setattr(agent_router_module, "validate_tool_call_pairs", counting_validate)
+
+    store = InMemoryMessageHistoryStore()
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        tool_nodes=[get_weather, get_temperature],
+        message_history_store=store,
+    )
+    await store.append(
+        "tracked-thread",
+        ModelRequest.user_text_prompt("Weather and temperature in Tokyo?"),
+        scope=router_node.name,
+    )
+
+    def hop(*messages: ModelMessage) -> EventEnvelope:
+        envelope = EventEnvelope(thread_id="tracked-thread")
+        envelope.prepare_uncommitted_agent_messages(list(messages))
+        return envelope
+
+    broker = _RecordingBroker()
+    chat_topic = chat_node.entrypoint_topic or chat_node.subscribed_topic
+    await router_node._router(
+        hop(
+            ModelResponse(
+                parts=[
+                    ToolCallPart("get_weather", {"location": "Tokyo"}, tool_call_id="call-1"),
+                    ToolCallPart("get_temperature", {"location": "Tokyo"}, tool_call_id="call-2"),
+                ]
+            )
+        ),
+        "tracked",
+        broker,
+    )
+    assert router_node._outstanding_tool_calls.get("tracked-thread") == {"call-1", "call-2"}
+
+    await router_node._router(
+        hop(ModelRequest(parts=[ToolReturnPart("get_weather", "rain", tool_call_id="call-1")])),
+        "tracked",
+        broker,
+    )
+    assert chat_topic not in broker.published_topics
+
+    await router_node._router(
+        hop(ModelRequest(parts=[ToolReturnPart("get_temperature", "-4", tool_call_id="call-2")])),
+        "tracked",
+        broker,
+    )
+    assert broker.published_topics.count(chat_topic) == 1
+    assert len(router_node._outstanding_tool_calls) == 0
+    assert scans == []
+
+    # Untracked threads (e.g. after a restart) fall back to scanning the history
+    router_node._outstanding_tool_calls.clear()
+    await router_node._router(hop(ModelRequest.user_text_prompt("And Osaka?")), "tracked", broker)
+    assert scans == [5]
+    assert broker.published_topics.count(chat_topic) == 2
+
+
+# Test: Messages keyed by conversation
+
+
+@pytest.mark.asyncio
+async def test_hops_are_keyed_by_thread_id():
+    """Every hop of a thread carries the thread_id as its Kafka key, else the correlation_id."""
+
+    def echo_model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart("hello")])
+
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(echo_model))
+    service.register_node(chat_node)
+    router_node = AgentRouterNode(
+        chat_node=chat_node, message_history_store=InMemoryMessageHistoryStore()
+    )
+    service.register_node(router_node)
+
+    keys: dict[str, list[bytes]] = {}
+
+    @broker.subscriber(router_node.publish_to_topic or "default_collect")
+    def collect_keys(
+        event_envelope: EventEnvelope,
+        correlation_id: Annotated[str, Context()],
+        message: KafkaMessage,
+    ):
+        keys.setdefault(correlation_id, []).append(message.raw_message.key)
+
+    async with TestKafkaBroker(broker) as _:
+        await router_node.invoke(
+            user_prompt="hi", broker=broker, thread_id="keyed-thread", correlation_id="keyed-1"
+        )
+        await router_node.invoke(user_prompt="hi", broker=broker, correlation_id="keyed-2")
+        await wait_for_condition(lambda: "keyed-1" in keys and "keyed-2" in keys, timeout=5.0)
+
+    assert set(keys["keyed-1"]) == {b"keyed-thread"}
+    assert set(keys["keyed-2"]) == {b"keyed-2"}
+
+
+@pytest.mark.asyncio
+async def test_router_forgets_tracked_tool_calls_on_partition_revoke():
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[]))),
+        message_history_store=InMemoryMessageHistoryStore(),
+    )
+    router_node._outstanding_tool_calls.put("some-thread", {"call-1"})
+    listener = NodeRebalanceListener(router_node)
+
+    await listener.on_partitions_revoked({TopicPartition(router_node.subscribed_topic, 0)})
+
+    assert len(router_node._outstanding_tool_calls) == 0
+
+
+def test_router_evicts_tool_calls_of_abandoned_threads():
+    """Threads whose tool results never arrive do not accumulate in the tracking table."""
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[]))),
+        message_history_store=InMemoryMessageHistoryStore(),
+    )
+    response = ModelResponse(parts=[ToolCallPart("get_weather", {}, tool_call_id="call-1")])
+    maxsize = router_node._outstanding_tool_calls.maxsize
+
+    for i in range(maxsize + 10):
+        router_node._track_tool_calls(EventEnvelope(thread_id=f"abandoned-{i}"), response)
+
+    assert len(router_node._outstanding_tool_calls) == maxsize
+    assert "abandoned-0" not in router_node._outstanding_tool_calls
+    assert f"abandoned-{maxsize + 9}" in router_node._outstanding_tool_calls
+
+
+# Test: Incremental history reads
+
+
+class _ReadCountingStore(InMemoryMessageHistoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.full_reads = 0
+        self.offsets: list[int] = []
+
+    async def get(self, thread_id, scope=None):
+        self.full_reads += 1
+        return await super().get(thread_id, scope)
+
+    async def get_since(self, thread_id, offset, scope=None):
+        self.offsets.append(offset)
+        return await super().get_since(thread_id, offset, scope)
+
+
+@pytest.mark.asyncio
+async def test_router_reads_only_new_history():
+    """After the first hop of a thread, the router only reads back what it appended."""
+    store = _ReadCountingStore()
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[]))),
+        tool_nodes=[get_weather, get_temperature],
+        message_history_store=store,
+    )
+
+    def hop(*messages: ModelMessage) -> EventEnvelope:
+        envelope = EventEnvelope(thread_id="cursor-thread")
+        envelope.prepare_uncommitted_agent_messages(list(messages))
+        return envelope
+
+    broker = _RecordingBroker()
+    await router_node._router(hop(ModelRequest.user_text_prompt("Tokyo?")), "cursor", broker)
+    await router_node._router(
+        hop(ModelResponse(parts=[ToolCallPart("get_weather", {"location": "Tokyo"}, "call-1")])),
+        "cursor",
+        broker,
+    )
+    last = hop(ModelRequest(parts=[ToolReturnPart("get_weather", "rain", tool_call_id="call-1")]))
+    await router_node._router(last, "cursor", broker)
+    assert (store.full_reads, store.offsets) == (1, [1, 2])
+    assert [type(message) for message in last.message_history] == [
+        ModelRequest,
+        ModelResponse,
+        ModelRequest,
+    ]
+
+    # A write the router did not make invalidates its cursor, forcing a full reload
+    await store.append(
+        "cursor-thread", ModelResponse(parts=[TextPart("rain")]), scope=router_node.name
+    )
+    last = hop(ModelRequest.user_text_prompt("And Osaka?"))
+    await router_node._router(last, "cursor", broker)
+    assert (store.full_reads, store.offsets) == (2, [1, 2])
+    assert len(last.message_history) == 5
+
+
+@pytest.mark.asyncio
+async def test_router_reapplies_append_after_conflicting_write():
+    """A replica whose view of a thread went stale re-reads it instead of acting on it."""
+    store = InMemoryMessageHistoryStore()
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+
+    def replica() -> AgentRouterNode:
+        return AgentRouterNode(
+            chat_node=chat_node,
+            tool_nodes=[get_weather, get_temperature],
+            message_history_store=store,
+        )
+
+    def hop(*messages: ModelMessage) -> EventEnvelope:
+        envelope = EventEnvelope(thread_id="shared-thread")
+        envelope.prepare_uncommitted_agent_messages(list(messages))
+        return envelope
+
+    replica_a, replica_b = replica(), replica()
+    broker = _RecordingBroker()
+    chat_topic = chat_node.entrypoint_topic or chat_node.subscribed_topic
+    await replica_a._router(hop(ModelRequest.user_text_prompt("Tokyo?")), "shared", broker)
+    await replica_a._router(
+        hop(
+            ModelResponse(
+                parts=[
+                    ToolCallPart("get_weather", {"location": "Tokyo"}, tool_call_id="call-1"),
+                    ToolCallPart("get_temperature", {"location": "Tokyo"}, tool_call_id="call-2"),
+                ]
+            )
+        ),
+        "shared",
+        broker,
+    )
+    published_before = broker.published_topics.count(chat_topic)
+
+    # After a rebalance, the first result lands on the other replica
+    await replica_b._router(
+        hop(ModelRequest(parts=[ToolReturnPart("get_weather", "rain", tool_call_id="call-1")])),
+        "shared",
+        broker,
+    )
+    # replica_a still expects call-1 and call-2: its append conflicts, and it re-reads
+    last = hop(ModelRequest(parts=[ToolReturnPart("get_temperature", "-4", tool_call_id="call-2")]))
+    await replica_a._router(last, "shared", broker)
+
+    assert broker.published_topics.count(chat_topic) == published_before + 1
+    assert len(last.message_history) == 4
+    assert len(await store.get("shared-thread")) == 4
+
+
+@pytest.mark.asyncio
+async def test_router_reloads_history_trimmed_by_the_store():
+    """A store trimming a thread while the router appends to it invalidates the router's cursor."""
+    store = InMemoryMessageHistoryStore(max_messages_per_thread=3)
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+    router_node = AgentRouterNode(chat_node=chat_node, message_history_store=store)
+    broker = _RecordingBroker()
+
+    for i in range(5):
+        envelope = EventEnvelope(thread_id="trimmed-thread")
+        envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt(f"m{i}")])
+        await router_node._router(envelope, "trimmed", broker)
+
+        assert envelope.message_history == await store.get("trimmed-thread")
+        assert len(envelope.message_history) == min(i + 1, 3)
+
+
+# Test: Tool bundles shipped once, then referenced by digest
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("evict_chat_cache", [False, True])
+async def test_tool_bundle_sent_once_then_by_digest(evict_chat_cache):
+    """The chat node gets the tool schemas once; a cache miss makes the router resend them."""
+    chat_node: ChatNode
+
+    def tool_then_answer(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        assert [tool.name for tool in info.function_tools] == ["get_weather"]
+        if evict_chat_cache:
+            chat_node._tool_bundles.clear()
+        if not any(isinstance(part, ToolReturnPart) for msg in messages for part in msg.parts):
+            return ModelResponse(
+                parts=[ToolCallPart("get_weather", {"location": "Tokyo"}, tool_call_id="b-1")]
+            )
+        return ModelResponse(parts=[TextPart("The weather in Tokyo is rainy.")])
+
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(tool_then_answer))
+    service.register_node(chat_node)
+    router_node = AgentRouterNode(chat_node=chat_node, tool_nodes=[get_weather])
+    service.register_node(router_node)
+    service.register_node(get_weather)
+
+    chat_inputs: list[EventEnvelope] = []
+    tool_inputs: list[EventEnvelope] = []
+    finals: list[EventEnvelope] = []
+
+    @broker.subscriber(chat_node.subscribed_topic)
+    def observe_chat(event_envelope: EventEnvelope):
+        chat_inputs.append(event_envelope)
+
+    @broker.subscriber(get_weather.subscribed_topic)
+    def observe_tool(event_envelope: EventEnvelope):
+        tool_inputs.append(event_envelope)
+
+    @broker.subscriber("final_response")
+    def collect_final(event_envelope: EventEnvelope):
+        finals.append(event_envelope)
+
+    async with TestKafkaBroker(broker) as _:
+        await router_node.invoke(
+            user_prompt="What's the weather in Tokyo?",
+            broker=broker,
+            final_response_topic="final_response",
+            correlation_id="test-tool-bundle",
+        )
+        await wait_for_condition(lambda: len(finals) == 1, timeout=5.0)
+
+    digests = {envelope.tool_bundle_digest for envelope in chat_inputs}
+    assert digests == {router_node._tool_bundle.digest}
+    shipped_in_full = [envelope.patch_model_request_params is not None for envelope in chat_inputs]
+    # The in-memory test broker delivers nested publishes depth-first, so ignore ordering
+    assert sorted(shipped_in_full) == ([False, True, True] if evict_chat_cache else [False, True])
+    # Downstream of the chat node only the digest travels
+    assert all(envelope.patch_model_request_params is None for envelope in tool_inputs)
+
+
+@pytest.mark.asyncio
+async def test_chat_node_ignores_forged_tool_bundle_digests():
+    """A digest that does not match the shipped parameters never enters the bundle cache."""
+    chat_node = ChatNode(
+        FunctionModel(lambda messages, info: ModelResponse(parts=[TextPart("ok")]))
+    )
+    bundle = ToolBundle.from_tools([get_weather.tool_schema])
+    forged_digest = "0" * 64
+
+    def envelope(**kwargs) -> EventEnvelope:
+        return EventEnvelope(
+            message_history=[ModelRequest.user_text_prompt("hi")],
+            tool_bundle_digest=forged_digest,
+            **kwargs,
+        )
+
+    shipped = await chat_node._call_llm(
+        envelope(patch_model_request_params=bundle.parameters), "c-1", _RecordingBroker(), None
+    )
+    assert shipped.tool_bundle_digest == bundle.digest
+    assert forged_digest not in chat_node._tool_bundles
+
+    referenced = await chat_node._call_llm(envelope(), "c-2", _RecordingBroker(), None)
+    assert referenced.tool_bundle_miss
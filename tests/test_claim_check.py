@@ -0,0 +1,164 @@
+import pytest
+from faststream.kafka import TestKafkaBroker
+
+from calfkit._vendor.pydantic_ai import (
+    BinaryContent,
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+    models,
+)
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.blobs import (
+    BLOB_REF_KEY,
+    FileSystemBlobStore,
+    InMemoryBlobStore,
+    has_blob_refs,
+    offload_large_content,
+    resolve_blob_refs,
+)
+from calfkit.broker.broker import BrokerClient
+from calfkit.models.event_envelope import EventEnvelope
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.base_tool_node import agent_tool
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.runners.service import NodesService
+from calfkit.stores.in_memory import InMemoryMessageHistoryStore
+from tests.utils import wait_for_condition
+
+LARGE_TEXT = "lorem ipsum " * 1000
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+@agent_tool
+def read_document(name: str) -> str:
+    """Read a document.
+
+    Args:
+        name (str): The document name
+
+    Returns:
+        str: The document text
+    """
+    return LARGE_TEXT
+
+
+@pytest.mark.asyncio
+async def test_offload_and_resolve_round_trip(tmp_path):
+    blob_store = FileSystemBlobStore(tmp_path)
+    image = BinaryContent(data=b"\x89PNG" + bytes(4096), media_type="image/png")
+    messages: list[ModelMessage] = [
+        ModelRequest(parts=[UserPromptPart(["What is in this image?", image])]),
+        ModelResponse(parts=[ToolCallPart("read_document", {"name": "a"}, tool_call_id="c1")]),
+        ModelRequest(
+            parts=[
+                ToolReturnPart("read_document", LARGE_TEXT, tool_call_id="c1"),
+                ToolReturnPart("read_document", "short", tool_call_id="c2"),
+            ]
+        ),
+    ]
+
+    offloaded = await offload_large_content(messages, blob_store, threshold_bytes=1024)
+
+    assert has_blob_refs(offloaded) and not has_blob_refs(messages)
+    offloaded_image = offloaded[0].parts[0].content[1]
+    assert offloaded_image.data == b""
+    assert offloaded_image.media_type == "image/png"
+    assert set(offloaded[2].parts[0].content) == {BLOB_REF_KEY}
+    assert offloaded[2].parts[1].content == "short"
+    assert len(list(tmp_path.rglob("*"))) == 4  # two blobs, each in its own shard directory
+
+    # References survive the wire, and resolve back to the original content
+    wire = EventEnvelope.model_validate_json(
+        EventEnvelope(message_history=offloaded).model_dump_json()
+    )
+    resolved = await resolve_blob_refs(wire.message_history, blob_store)
+    assert resolved[0].parts[0].content[1].data == image.data
+    assert resolved[2].parts[0].content == LARGE_TEXT
+    assert not has_blob_refs(resolved)
+
+
+@pytest.mark.asyncio
+async def test_missing_blob_raises_key_error(tmp_path):
+    with pytest.raises(KeyError):
+        await FileSystemBlobStore(tmp_path).get("0" * 64)
+    with pytest.raises(KeyError):
+        await FileSystemBlobStore(tmp_path).get("../escape")
+
+
+@pytest.mark.asyncio
+async def test_router_offloads_large_tool_output():
+    """Large tool output travels as a reference, and the chat node hands the model the content."""
+    seen_tool_content: list[str] = []
+
+    def document_model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        tool_returns = [
+            part for msg in messages for part in msg.parts if isinstance(part, ToolReturnPart)
+        ]
+        if not tool_returns:
+            return ModelResponse(
+                parts=[ToolCallPart("read_document", {"name": "report"}, tool_call_id="doc-1")]
+            )
+        seen_tool_content.append(tool_returns[0].content)
+        return ModelResponse(parts=[TextPart("It's a lorem ipsum report.")])
+
+    broker = BrokerClient()
+    service = NodesService(broker)
+    blob_store = InMemoryBlobStore()
+    history_store = InMemoryMessageHistoryStore()
+
+    chat_node = ChatNode(FunctionModel(document_model), blob_store=blob_store)
+    service.register_node(chat_node)
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        tool_nodes=[read_document],
+        message_history_store=history_store,
+        blob_store=blob_store,
+        offload_threshold_bytes=1024,
+    )
+    service.register_node(router_node)
+    service.register_node(read_document)
+
+    finals: list[EventEnvelope] = []
+
+    @broker.subscriber("final_response")
+    def collect_final(event_envelope: EventEnvelope):
+        finals.append(event_envelope)
+
+    async with TestKafkaBroker(broker) as _:
+        await router_node.invoke(
+            user_prompt="Summarize the report",
+            broker=broker,
+            thread_id="claim-check-thread",
+            final_response_topic="final_response",
+            correlation_id="claim-check-1",
+        )
+        await wait_for_condition(lambda: len(finals) == 1, timeout=5.0)
+
+    assert seen_tool_content == [LARGE_TEXT]
+    assert has_blob_refs(finals[0].message_history)
+    assert has_blob_refs(await history_store.get("claim-check-thread"))
+
+
+@pytest.mark.asyncio
+async def test_chat_node_without_blob_store_rejects_references():
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+    offloaded = await offload_large_content(
+        [ModelRequest(parts=[ToolReturnPart("read_document", LARGE_TEXT, tool_call_id="c1")])],
+        InMemoryBlobStore(),
+        threshold_bytes=1024,
+    )
+    with pytest.raises(RuntimeError, match="no blob_store"):
+        await chat_node._resolve_blob_refs(offloaded)
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Annotated
+
+import pytest
+from faststream import Context
+from faststream.kafka import TestKafkaBroker
+
+from calfkit._vendor.pydantic_ai import (
+    BinaryContent,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from calfkit.broker.broker import BrokerClient
+from calfkit.broker.codec import (
+    JSONEnvelopeCodec,
+    MsgPackEnvelopeCodec,
+    load_codec,
+    register_codec,
+)
+from calfkit.models.event_envelope import EventEnvelope
+from tests.utils import wait_for_condition
+
+
+def _make_envelope() -> EventEnvelope:
+    envelope = EventEnvelope(trace_id="codec-test", thread_id="thread-1")
+    envelope.message_history = [
+        ModelRequest(
+            parts=[
+                UserPromptPart(
+                    content=[
+                        "What is in this image?",
+                        BinaryContent(data=b"fake-png-bytes", media_type="image/png"),
+                    ]
+                )
+            ]
+        ),
+        ModelResponse(
+            parts=[ToolCallPart(tool_name="lookup", args={"q": "png"}, tool_call_id="c1")]
+        ),
+        ModelRequest(parts=[ToolReturnPart(tool_name="lookup", content="ok", tool_call_id="c1")]),
+        ModelResponse(parts=[TextPart("A tiny PNG.")]),
+    ]
+    return envelope
+
+
+@pytest.mark.parametrize(
+    "codec",
+    [JSONEnvelopeCodec(), MsgPackEnvelopeCodec(), MsgPackEnvelopeCodec(compress=True)],
+    ids=["json", "msgpack", "msgpack+zstd"],
+)
+def test_codec_round_trip(codec):
+    if isinstance(codec, MsgPackEnvelopeCodec):
+        pytest.importorskip("msgpack")
+        if codec.compress:
+            pytest.importorskip("zstandard")
+    envelope = _make_envelope()
+    expected = EventEnvelope.model_validate_json(envelope.model_dump_json())
+
+    decoded = EventEnvelope.model_validate(codec.decode(codec.encode(envelope)))
+
+    assert decoded.trace_id == envelope.trace_id
+    assert decoded.thread_id == envelope.thread_id
+    assert decoded.message_history == expected.message_history
+
+
+def test_builtin_codecs_are_registered():
+    assert isinstance(load_codec("application/json"), JSONEnvelopeCodec)
+    assert isinstance(load_codec("application/msgpack"), MsgPackEnvelopeCodec)
+    with pytest.raises(ValueError):
+        register_codec(JSONEnvelopeCodec())
+
+
+@pytest.mark.asyncio
+async def test_mixed_codecs_are_readable_by_any_consumer():
+    """A consumer decodes envelopes based on content-type, whatever codec it publishes with."""
+    pytest.importorskip("msgpack")
+    broker = BrokerClient(codec=MsgPackEnvelopeCodec())
+    json_broker = BrokerClient()
+    received: dict[str, asyncio.Queue[EventEnvelope]] = {}
+
+    @broker.subscriber("codec_topic")
+    def collect(event_envelope: EventEnvelope, correlation_id: Annotated[str, Context()]):
+        received.setdefault(correlation_id, asyncio.Queue()).put_nowait(event_envelope)
+
+    envelope = _make_envelope()
+    expected = EventEnvelope.model_validate_json(envelope.model_dump_json())
+
+    async with TestKafkaBroker(broker) as _:
+        await broker.publish(envelope, topic="codec_topic", correlation_id="msgpack-1")
+        await wait_for_condition(lambda: "msgpack-1" in received, timeout=5.0)
+        result = await received["msgpack-1"].get()
+        assert result.message_history == expected.message_history
+
+    json_broker.subscriber("codec_topic")(collect)
+    async with TestKafkaBroker(json_broker) as _:
+        await json_broker.publish(envelope, topic="codec_topic", correlation_id="json-1")
+        await wait_for_condition(lambda: "json-1" in received, timeout=5.0)
+        result = await received["json-1"].get()
+        assert result.message_history == expected.message_history
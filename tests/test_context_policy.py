@@ -0,0 +1,105 @@
+import pytest
+
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolReturnPart,
+    UserPromptPart,
+    models,
+)
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.messages import (
+    LastTurnsPolicy,
+    SlidingWindowPolicy,
+    estimate_message_tokens,
+    estimate_tokens,
+    validate_tool_call_pairs,
+)
+from calfkit.models.event_envelope import EventEnvelope
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.stores.in_memory import InMemoryMessageHistoryStore
+from tests.utils import RecordingBroker, conversation
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+def test_estimate_tokens_is_about_four_chars_per_token():
+    message = ModelResponse(parts=[TextPart("x" * 400)])
+    assert estimate_message_tokens(message) == 104
+    assert estimate_tokens([message, message]) == 208
+
+
+def test_sliding_window_keeps_system_prompt_and_latest_messages():
+    messages = conversation(10, system_prompt="Be brief.")
+    window = SlidingWindowPolicy(max_tokens=1_000).apply(messages)
+
+    assert window[0] == messages[0]
+    assert window[1:] == messages[-8:]
+    assert estimate_tokens(window) <= 1_000
+
+
+def test_sliding_window_returns_history_itself_when_it_fits():
+    messages = conversation(2, system_prompt="Be brief.")
+    assert SlidingWindowPolicy(max_tokens=10_000).apply(messages) is messages
+
+
+def test_sliding_window_never_splits_tool_calls_from_results():
+    messages = conversation(5, with_tool=True, system_prompt="Be brief.")
+    for max_tokens in range(100, 2_500, 50):
+        window = SlidingWindowPolicy(max_tokens=max_tokens).apply(messages)
+        assert validate_tool_call_pairs(window)
+        assert isinstance(window[1], ModelRequest)
+        assert not any(isinstance(part, ToolReturnPart) for part in window[1].parts)
+    # Even when the latest turn alone is over budget, it is sent whole
+    assert SlidingWindowPolicy(max_tokens=10).apply(messages)[1:] == messages[-4:]
+
+
+def test_last_turns_policy():
+    messages = conversation(5, with_tool=True, system_prompt="Be brief.")
+    window = LastTurnsPolicy(turns=2).apply(messages)
+    assert window == [messages[0], *messages[-8:]]
+    assert LastTurnsPolicy(turns=5).apply(messages) is messages
+    with pytest.raises(ValueError):
+        LastTurnsPolicy(turns=0)
+
+
+@pytest.mark.asyncio
+async def test_router_sends_context_window_and_keeps_stored_history():
+    def never_called(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        raise AssertionError("the test publishes to a recording broker")
+
+    store = InMemoryMessageHistoryStore()
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(never_called)),
+        system_prompt="Be brief.",
+        message_history_store=store,
+        delta_history=True,
+        context_policy=LastTurnsPolicy(turns=1),
+    )
+    history = conversation(3)
+    await store.append_many("window-thread", history, scope=router_node.name)
+
+    envelope = EventEnvelope(thread_id="window-thread")
+    envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt("And now?")])
+    broker = RecordingBroker()
+    emitted = await router_node._router(envelope, "window", broker)
+
+    (sent,) = broker.published
+    assert sent.history_ref is None
+    assert [type(part) for message in sent.message_history for part in message.parts] == [
+        SystemPromptPart,
+        UserPromptPart,
+    ]
+    assert emitted is not None and len(emitted.message_history) == 8
+    assert len(await store.get("window-thread", scope=router_node.name)) == 7
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelRequest, ModelResponse, TextPart, models
+from calfkit._vendor.pydantic_ai.direct import model_request
+from calfkit._vendor.pydantic_ai.exceptions import ModelHTTPError
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.providers import HedgedModel
+
+MESSAGES: list[ModelMessage] = [ModelRequest.user_text_prompt("hi")]
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+class ScriptedModel:
+    """Answers after ``latency`` seconds, or fails with ``error``."""
+
+    def __init__(self, name: str, latency: float, error: Exception | None = None) -> None:
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def respond(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return ModelResponse(parts=[TextPart(f"from {self.name}")])
+
+
+def _hedged(primary: ScriptedModel, hedge: ScriptedModel, **kwargs) -> HedgedModel:
+    return HedgedModel(FunctionModel(primary.respond), FunctionModel(hedge.respond), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    primary, hedge = ScriptedModel("primary", 5.0), ScriptedModel("hedge", 0.01)
+    model = _hedged(primary, hedge, delay=0.02)
+
+    response = await model_request(model, MESSAGES)
+    await asyncio.sleep(0)
+
+    assert response.text == "from hedge"
+    assert (model.hedged_requests, model.hedge_wins) == (1, 1)
+    assert primary.cancelled == 1
+    assert len(model.latency_stats["hedge"]) == 1
+    # The cancelled primary counts with at least the hedge delay
+    primary_latency = model.latency_stats["primary"].percentile(0.5)
+    assert primary_latency is not None and primary_latency >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    primary, hedge = ScriptedModel("primary", 0.0), ScriptedModel("hedge", 0.0)
+    model = _hedged(primary, hedge, delay=0.5)
+
+    response = await model_request(model, MESSAGES)
+
+    assert response.text == "from primary"
+    assert hedge.calls == 0 and model.hedged_requests == 0
+
+
+@pytest.mark.asyncio
+async def test_request_fails_only_if_every_model_failed():
+    error = ModelHTTPError(503, "primary")
+    primary = ScriptedModel("primary", 0.05, error=error)
+    hedge = ScriptedModel("hedge", 0.1)
+    model = _hedged(primary, hedge, delay=0.01)
+    assert (await model_request(model, MESSAGES)).text == "from hedge"
+
+    hedge.error = ModelHTTPError(500, "hedge")
+    with pytest.raises(ModelHTTPError) as exc_info:
+        await model_request(model, MESSAGES)
+    assert exc_info.value is error
+
+
+def test_hedge_delay_follows_the_primary_latency_percentile():
+    primary, hedge = ScriptedModel("primary", 0.0), ScriptedModel("hedge", 0.0)
+    model = _hedged(primary, hedge, initial_delay=3.0, min_samples=20)
+    stats = model.latency_stats["primary"]
+
+    for i in range(19):
+        stats.record(i / 100)
+    assert model.hedge_delay() == 3.0
+    for i in range(19, 100):
+        stats.record(i / 100)
+    assert model.hedge_delay() == pytest.approx(0.94)
@@ -0,0 +1,236 @@
+import sqlite3
+
+import pytest
+
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    UserPromptPart,
+    models,
+)
+from calfkit._vendor.pydantic_ai.exceptions import UnexpectedModelBehavior
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.messages import HistoryCompactor, validate_tool_call_pairs
+from calfkit.models.event_envelope import EventEnvelope
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.stores import CachedMessageHistoryStore, MessageHistoryStore
+from calfkit.stores.in_memory import InMemoryMessageHistoryStore
+from tests.utils import RecordingBroker, conversation, wait_for_condition
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+class _Summarizer:
+    """Model function answering with a numbered summary, recording the transcripts it got."""
+
+    def __init__(self) -> None:
+        self.transcripts: list[str] = []
+
+    def summarize(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        (request,) = messages
+        assert isinstance(request, ModelRequest)
+        system, transcript = request.parts
+        assert isinstance(system, SystemPromptPart)
+        assert isinstance(transcript, UserPromptPart) and isinstance(transcript.content, str)
+        self.transcripts.append(transcript.content)
+        return ModelResponse(parts=[TextPart(f"summary {len(self.transcripts)}")])
+
+
+def _compactor(summarizer: _Summarizer, **kwargs) -> HistoryCompactor:
+    return HistoryCompactor(ChatNode(FunctionModel(summarizer.summarize)), **kwargs)
+
+
+def test_compactor_keeps_latest_turns_and_tool_pairs():
+    compactor = _compactor(_Summarizer(), threshold_tokens=1_000, keep_tokens=500)
+    messages = conversation(4, with_tool=True)
+
+    assert compactor.needs_compaction(messages)
+    assert not compactor.needs_compaction(messages[:8])
+    # The last two turns hold 832 tokens; the latest one alone is under keep_tokens
+    assert compactor.cut_point(messages) == 8
+    for keep_tokens in range(50, 1_000, 50):
+        compactor.keep_tokens = keep_tokens
+        assert validate_tool_call_pairs(messages[compactor.cut_point(messages) :])
+
+
+@pytest.mark.asyncio
+async def test_compactor_folds_previous_summary_into_new_checkpoint():
+    summarizer = _Summarizer()
+    compactor = _compactor(summarizer, threshold_tokens=500, keep_tokens=200)
+    previous = HistoryCheckpoint(summary="the user likes tea", covers=10)
+
+    checkpoint = await compactor.compact(conversation(4), previous)
+
+    assert checkpoint == HistoryCheckpoint(summary="summary 1", covers=16)
+    (transcript,) = summarizer.transcripts
+    assert transcript.startswith("Summary of the earlier conversation: the user likes tea\nUser:")
+    assert "turn 2" in transcript and "turn 3" not in transcript
+    # Nothing to summarize without a cut point past the first message
+    assert await compactor.compact(conversation(1)) is None
+
+
+def test_compactor_rejects_keep_tokens_over_threshold():
+    with pytest.raises(ValueError, match="keep_tokens"):
+        _compactor(_Summarizer(), threshold_tokens=100, keep_tokens=100)
+
+
+@pytest.mark.asyncio
+async def test_router_compacts_in_background_and_reads_checkpoint_plus_tail():
+    def never_called(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        raise AssertionError("the test publishes to a recording broker")
+
+    store = InMemoryMessageHistoryStore()
+    summarizer = _Summarizer()
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(never_called)),
+        system_prompt="Be brief.",
+        message_history_store=store,
+        delta_history=True,
+        compactor=_compactor(summarizer, threshold_tokens=600, keep_tokens=200),
+    )
+    await store.append_many("long-thread", conversation(3), scope=router_node.name)
+    broker = RecordingBroker()
+
+    async def hop(prompt: str) -> EventEnvelope:
+        envelope = EventEnvelope(thread_id="long-thread")
+        envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt(prompt)])
+        await router_node._router(envelope, "compaction", broker)
+        return broker.published[-1]
+
+    # Over threshold: this hop sends the full history, and compaction starts
+    first = await hop("And now?")
+    assert first.history_ref is not None
+    await wait_for_condition(
+        lambda: not router_node._compactions and bool(summarizer.transcripts), timeout=1.0
+    )
+    checkpoint = await store.load_checkpoint("long-thread", scope=router_node.name)
+    assert checkpoint == HistoryCheckpoint(summary="summary 1", covers=4)
+
+    # The next hop reads the checkpoint plus the messages after it, without delta encoding
+    second = await hop("And then?")
+    assert second.history_ref is None
+    texts = [
+        part.content
+        for message in second.message_history
+        for part in message.parts
+        if isinstance(part, (SystemPromptPart, UserPromptPart))
+    ]
+    assert texts[:2] == ["Be brief.", "Summary of the conversation so far:\n\nsummary 1"]
+    assert texts[-1] == "And then?"
+    assert len(second.message_history) == 2 + 4
+    # The stored history is left intact
+    assert await store.count("long-thread", scope=router_node.name) == 8
+
+
+@pytest.mark.asyncio
+async def test_router_drops_stale_history_ref_of_reused_envelope():
+    """An envelope carried across hops loses the reference the router set on an earlier hop."""
+
+    def never_called(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        raise AssertionError("the test publishes to a recording broker")
+
+    store = InMemoryMessageHistoryStore()
+    summarizer = _Summarizer()
+    chat_node = ChatNode(FunctionModel(never_called), message_history_store=store)
+    router_node = AgentRouterNode(
+        chat_node=chat_node,
+        message_history_store=store,
+        delta_history=True,
+        compactor=_compactor(summarizer, threshold_tokens=600, keep_tokens=200),
+    )
+    await store.append_many("long-thread", conversation(3), scope=router_node.name)
+    broker = RecordingBroker()
+    envelope = EventEnvelope(thread_id="long-thread")
+    envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt("And now?")])
+    await router_node._router(envelope, "compaction", broker)
+    envelope = broker.published[-1]
+    assert envelope.history_ref is not None
+    await wait_for_condition(
+        lambda: not router_node._compactions and bool(summarizer.transcripts), timeout=1.0
+    )
+
+    # The chat node's reply, then the next user prompt, on the same envelope
+    for message in (ModelResponse(parts=[TextPart("Done.")]), ModelRequest.user_text_prompt("Ok")):
+        envelope.prepare_uncommitted_agent_messages([message])
+        await router_node._router(envelope, "compaction", broker)
+        envelope = broker.published[-1]
+        assert envelope.history_ref is None
+        stored = await store.count("long-thread", scope=router_node.name)
+        # The summary stands in for the 4 messages it covers
+        resolved = await chat_node._resolve_message_history(envelope)
+        assert len(resolved) == 1 + stored - 4
+
+
+class _NoCheckpointStore(InMemoryMessageHistoryStore):
+    save_checkpoint = MessageHistoryStore.save_checkpoint
+
+
+def test_router_rejects_compactor_without_checkpoint_support():
+    compactor = _compactor(_Summarizer(), threshold_tokens=600, keep_tokens=200)
+    for store in (_NoCheckpointStore(), CachedMessageHistoryStore(_NoCheckpointStore())):
+        with pytest.raises(ValueError, match="checkpoints"):
+            AgentRouterNode(
+                chat_node=ChatNode(FunctionModel(_Summarizer().summarize)),
+                message_history_store=store,
+                compactor=compactor,
+            )
+
+
+@pytest.mark.asyncio
+async def test_router_logs_failed_compactions(caplog):
+    def failing_summarizer(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        raise UnexpectedModelBehavior("empty summary")
+
+    store = InMemoryMessageHistoryStore()
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(failing_summarizer)),
+        message_history_store=store,
+        compactor=HistoryCompactor(
+            ChatNode(FunctionModel(failing_summarizer)), threshold_tokens=600, keep_tokens=200
+        ),
+    )
+    await store.append_many("long-thread", conversation(3), scope=router_node.name)
+    envelope = EventEnvelope(thread_id="long-thread")
+    envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt("And now?")])
+    await router_node._router(envelope, "compaction", RecordingBroker())
+
+    await wait_for_condition(lambda: not router_node._compactions, timeout=1.0)
+    assert "Compacting thread 'long-thread' failed" in caplog.text
+    assert router_node.compactor is not None
+    assert await store.load_checkpoint("long-thread", scope=router_node.name) is None
+
+
+class _LockedCheckpointStore(InMemoryMessageHistoryStore):
+    async def save_checkpoint(self, thread_id, checkpoint, scope=None):
+        raise sqlite3.OperationalError("database is locked")
+
+
+@pytest.mark.asyncio
+async def test_router_logs_unexpected_compaction_errors(caplog):
+    store = _LockedCheckpointStore()
+    summarizer = _Summarizer()
+    router_node = AgentRouterNode(
+        chat_node=ChatNode(FunctionModel(summarizer.summarize)),
+        message_history_store=store,
+        compactor=_compactor(summarizer, threshold_tokens=600, keep_tokens=200),
+    )
+    await store.append_many("long-thread", conversation(3), scope=router_node.name)
+    envelope = EventEnvelope(thread_id="long-thread")
+    envelope.prepare_uncommitted_agent_messages([ModelRequest.user_text_prompt("And now?")])
+    await router_node._router(envelope, "compaction", RecordingBroker())
+
+    await wait_for_condition(lambda: not router_node._compactions, timeout=1.0)
+    assert "database is locked" in caplog.text
+    assert router_node.compactor is not None
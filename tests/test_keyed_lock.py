@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from calfkit.utils import KeyedLock
+
+
+@pytest.mark.asyncio
+async def test_keyed_lock_serializes_same_key_only():
+    locks = KeyedLock()
+    events: list[str] = []
+
+    async def worker(key: str, label: str) -> None:
+        async with locks(key):
+            events.append(f"{label}-enter")
+            await asyncio.sleep(0.01)
+            events.append(f"{label}-exit")
+
+    await asyncio.gather(worker("a", "a1"), worker("a", "a2"), worker("b", "b1"))
+
+    # Same key: strictly one after the other, in arrival order
+    assert events.index("a1-exit") < events.index("a2-enter")
+    # Different key: overlaps with the first holder of "a"
+    assert events.index("b1-enter") < events.index("a1-exit")
+    # Locks are released once nobody holds or waits on them
+    assert len(locks) == 0
+    assert not locks.locked("a")
@@ -0,0 +1,98 @@
+import pytest
+
+from calfkit._vendor.pydantic_ai import ModelRequest, ModelResponse, TextPart, UserPromptPart
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores import LogStructuredMessageHistoryStore
+
+
+def _request(text: str) -> ModelRequest:
+    return ModelRequest(parts=[UserPromptPart(content=text)])
+
+
+def _response(text: str) -> ModelResponse:
+    return ModelResponse(parts=[TextPart(content=text)])
+
+
+@pytest.mark.asyncio
+async def test_history_survives_reopening(tmp_path):
+    path = tmp_path / "history"
+    messages = [_request("hi"), _response("hello"), _request("again")]
+    other = _request("other")
+    store = LogStructuredMessageHistoryStore(path)
+    await store.append_many("t1", messages[:2], scope="agent")
+    await store.append("t1", other, scope="other")
+    await store.save_checkpoint("t1", HistoryCheckpoint(summary="s", covers=1), scope="agent")
+    version = await store.version("t1", scope="agent")
+    await store.fork("t1", "forked", at=2)
+    await store.close()
+
+    reopened = LogStructuredMessageHistoryStore(path)
+    try:
+        assert await reopened.version("t1", scope="agent") == version
+        assert await reopened.load_checkpoint("t1", scope="agent") == HistoryCheckpoint(
+            summary="s", covers=1
+        )
+        await reopened.append("t1", messages[2], scope="agent")
+        assert await reopened.get("t1", scope="agent") == messages
+        assert await reopened.get("t1") == [*messages[:2], other, messages[2]]
+        assert await reopened.get("forked", scope="agent") == messages[:2]
+    finally:
+        await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_torn_writes_are_dropped_on_open(tmp_path):
+    path = tmp_path / "history"
+    kept, following = _request("kept"), _request("next")
+    store = LogStructuredMessageHistoryStore(path)
+    await store.append_many("t1", [kept])
+    await store.close()
+
+    # A crash mid-append: half an index entry, and a segment record nothing points to
+    with open(path / "index", "ab") as index_file:
+        index_file.write(b"\x01\x00\x00")
+    with open(path / "00000000.seg", "ab") as segment_file:
+        segment_file.write(b'{"parts": [')
+
+    reopened = LogStructuredMessageHistoryStore(path)
+    try:
+        await reopened.append("t1", following)
+        assert await reopened.get("t1") == [kept, following]
+    finally:
+        await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_segments_roll_over_and_compact_after_deletes(tmp_path):
+    path = tmp_path / "history"
+    store = LogStructuredMessageHistoryStore(path, max_segment_bytes=1_000, compact_min_bytes=1)
+    kept = [_request(f"kept {i}") for i in range(20)]
+    again = _request("again")
+    try:
+        for i, message in enumerate(kept):
+            await store.append("deleted", _response("x" * 200), scope="a")
+            await store.append("kept", message, scope="a" if i % 2 else "b")
+        assert len(list(path.glob("*.seg"))) > 5
+        version = await store.version("deleted")
+
+        await store.delete("deleted")
+
+        # Only the kept thread's messages remain on disk, in a fresh set of segments
+        assert sum(f.stat().st_size for f in path.glob("*.seg")) < 20 * 200
+        assert await store.get("kept") == kept
+        assert await store.get("kept", scope="b") == kept[::2]
+        assert await store.version("deleted") == version + 1
+        # The deleted thread is dropped from the index, without its version going backwards
+        assert "deleted" not in store._threads
+        await store.append("deleted", again, scope="a")
+        assert await store.version("deleted", scope="a") > version + 1
+    finally:
+        await store.close()
+
+    reopened = LogStructuredMessageHistoryStore(path)
+    try:
+        assert await reopened.get("kept") == kept
+        assert await reopened.get("deleted") == [again]
+        assert await reopened.version("deleted", scope="a") > version + 1
+    finally:
+        await reopened.close()
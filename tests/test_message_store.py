@@ -0,0 +1,399 @@
+import pytest
+
+from calfkit._vendor.pydantic_ai import (
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+)
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores import (
+    CachedMessageHistoryStore,
+    InMemoryMessageHistoryStore,
+    LogStructuredMessageHistoryStore,
+    MessageHistoryStore,
+    ShardedMessageHistoryStore,
+    SQLiteMessageHistoryStore,
+    VersionConflictError,
+)
+from tests.utils import wait_for_condition
+
+
+@pytest.fixture(params=["in_memory", "sqlite", "cached", "log_structured", "sharded"])
+async def store(request, tmp_path):
+    if request.param == "in_memory":
+        yield InMemoryMessageHistoryStore()
+    elif request.param == "log_structured":
+        log_store = LogStructuredMessageHistoryStore(tmp_path / "history")
+        yield log_store
+        await log_store.close()
+    elif request.param == "sharded":
+        yield ShardedMessageHistoryStore(
+            {name: InMemoryMessageHistoryStore() for name in ("a", "b", "c")}
+        )
+    elif request.param == "cached":
+        cached_store = CachedMessageHistoryStore(InMemoryMessageHistoryStore())
+        yield cached_store
+        await cached_store.close()
+    else:
+        sqlite_store = SQLiteMessageHistoryStore(tmp_path / "history.db")
+        yield sqlite_store
+        await sqlite_store.close()
+
+
+@pytest.mark.asyncio
+async def test_incremental_reads(store: MessageHistoryStore):
+    a = [ModelRequest.user_text_prompt(f"a{i}") for i in range(4)]
+    b = [ModelResponse(parts=[TextPart(f"b{i}")]) for i in range(2)]
+    await store.append_many("t1", a[:2], scope="a")
+    await store.append_many("t1", b, scope="b")
+    await store.append_many("t1", a[2:], scope="a")
+
+    assert await store.count("t1", scope="a") == 4
+    assert await store.count("t1") == 6
+    assert await store.count("unknown") == 0
+
+    assert await store.get_since("t1", 1, scope="a") == a[1:]
+    assert await store.get_since("t1", 4, scope="a") == []
+    assert await store.get_since("t1", 3) == [b[1], a[2], a[3]]
+
+    assert await store.tail("t1", 2, scope="b") == b
+    assert await store.tail("t1", 10, scope="b") == b
+    assert await store.tail("t1", 3) == [b[1], a[2], a[3]]
+    assert await store.tail("t1", 0) == []
+
+
+@pytest.mark.asyncio
+async def test_version_increases_on_every_write(store: MessageHistoryStore):
+    assert await store.version("t1") == 0
+
+    await store.append("t1", ModelRequest.user_text_prompt("hi"), scope="a")
+    a_version = await store.version("t1", scope="a")
+    thread_version = await store.version("t1")
+    assert a_version > 0
+
+    # Writes to another scope change the thread's version, and the scope's unless the
+    # store only tracks versions per thread
+    await store.append("t1", ModelRequest.user_text_prompt("hi"), scope="b")
+    if not isinstance(store, CachedMessageHistoryStore):
+        assert await store.version("t1", scope="a") == a_version
+    assert await store.version("t1") > thread_version
+
+    # Deleting and appending again never brings a version back to an earlier value
+    await store.delete("t1")
+    deleted_version = await store.version("t1", scope="a")
+    assert deleted_version > a_version
+    await store.append("t1", ModelRequest.user_text_prompt("hi"), scope="a")
+    assert await store.version("t1", scope="a") > deleted_version
+
+
+@pytest.mark.asyncio
+async def test_append_with_expected_version(store: MessageHistoryStore):
+    first, second = ModelRequest.user_text_prompt("1"), ModelRequest.user_text_prompt("2")
+    version = await store.version("t1", scope="a")
+    await store.append_many("t1", [first], scope="a", expected_version=version)
+
+    with pytest.raises(VersionConflictError) as exc_info:
+        await store.append_many("t1", [second], scope="a", expected_version=version)
+    assert exc_info.value.current_version == await store.version("t1", scope="a")
+    assert await store.get("t1", scope="a") == [first]
+
+
+@pytest.mark.asyncio
+async def test_checkpoints(store: MessageHistoryStore):
+    await store.append_many("t1", [ModelRequest.user_text_prompt(str(i)) for i in range(3)], "a")
+    await store.append("t1", ModelRequest.user_text_prompt("b"), scope="b")
+    assert await store.load_checkpoint("t1", scope="a") is None
+
+    await store.save_checkpoint("t1", HistoryCheckpoint(summary="first", covers=1), scope="a")
+    await store.save_checkpoint("t1", HistoryCheckpoint(summary="second", covers=2), scope="a")
+    await store.save_checkpoint("t1", HistoryCheckpoint(summary="b", covers=1), scope="b")
+    assert await store.load_checkpoint("t1", scope="a") == HistoryCheckpoint(
+        summary="second", covers=2
+    )
+
+    # Deleting messages deletes the checkpoints covering them
+    await store.delete("t1", scope="a")
+    assert await store.load_checkpoint("t1", scope="a") is None
+    assert await store.load_checkpoint("t1", scope="b") is not None
+    await store.delete("t1")
+    assert await store.load_checkpoint("t1", scope="b") is None
+
+
+def _fork_id(store: MessageHistoryStore, thread_id: str, name: str) -> str:
+    """A thread id that can be forked to from ``thread_id``: on the same shard, if sharded."""
+    if not isinstance(store, ShardedMessageHistoryStore):
+        return name
+    owner = store.shard_for(thread_id)
+    return next(f"{name}-{i}" for i in range(1_000) if store.shard_for(f"{name}-{i}") == owner)
+
+
+@pytest.mark.asyncio
+async def test_fork(store: MessageHistoryStore):
+    a0, b0, a1, b1, a2, c0 = (ModelRequest.user_text_prompt(text) for text in "12345c")
+    for message, scope in ((a0, "a"), (b0, "b"), (a1, "a"), (b1, "b")):
+        await store.append("t1", message, scope=scope)
+    whole, partial = _fork_id(store, "t1", "whole"), _fork_id(store, "t1", "partial")
+
+    await store.fork("t1", whole)
+    await store.fork("t1", partial, at=3)
+
+    assert await store.get(whole) == [a0, b0, a1, b1]
+    assert await store.get(whole, scope="a") == [a0, a1]
+    assert await store.get(partial) == [a0, b0, a1]
+    assert await store.get(partial, scope="b") == [b0]
+    assert await store.count(partial) == 3
+    assert await store.get_since(partial, 1, scope="a") == [a1]
+    assert await store.tail(partial, 2) == [b0, a1]
+
+    # Forks and the original evolve independently
+    await store.append("t1", a2, scope="a")
+    await store.append(whole, c0, scope="a")
+    assert await store.get("t1", scope="a") == [a0, a1, a2]
+    assert await store.get(whole, scope="a") == [a0, a1, c0]
+    assert await store.version(whole, scope="a") > 0
+    await store.delete("t1")
+    assert await store.get(whole) == [a0, b0, a1, b1, c0]
+    assert await store.get(partial) == [a0, b0, a1]
+
+    with pytest.raises(ValueError):
+        await store.fork(whole, partial)
+
+
+# Test: Bounded in-memory store
+
+
+def _prompt(text: str) -> ModelRequest:
+    return ModelRequest.user_text_prompt(text)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_evicts_least_recently_used_thread():
+    store = InMemoryMessageHistoryStore(max_threads=2)
+    await store.append("t1", _prompt("1"))
+    await store.append("t2", _prompt("2"))
+    await store.get("t1")
+    t2_version = await store.version("t2")
+
+    await store.append("t3", _prompt("3"))
+
+    assert store.num_threads == 2
+    assert await store.get("t2") == []
+    assert await store.version("t2") > t2_version
+    assert await store.count("t1") == await store.count("t3") == 1
+
+
+@pytest.mark.asyncio
+async def test_in_memory_trims_oldest_messages_across_scopes():
+    store = InMemoryMessageHistoryStore(max_messages_per_thread=3)
+    messages = [_prompt(str(i)) for i in range(5)]
+    await store.append("t1", messages[0], scope="a")
+    await store.append("t1", messages[1], scope="b")
+    await store.append("t1", messages[2], scope="a")
+    b_version = await store.version("t1", scope="b")
+
+    await store.append_many("t1", messages[3:], scope="a")
+
+    assert await store.get("t1") == messages[2:]
+    assert await store.get("t1", scope="b") == []
+    assert await store.version("t1", scope="b") > b_version
+
+
+@pytest.mark.asyncio
+async def test_in_memory_trims_tool_calls_with_their_results():
+    store = InMemoryMessageHistoryStore(max_messages_per_thread=3)
+    call = ModelResponse(parts=[ToolCallPart("get_weather", {}, tool_call_id="call-1")])
+    result = ModelRequest(parts=[ToolReturnPart("get_weather", "rain", tool_call_id="call-1")])
+    answer, thanks = ModelResponse(parts=[TextPart("rain")]), _prompt("thanks")
+    await store.append_many("t1", [_prompt("weather?"), call, result], scope="a")
+
+    # Trimming the prompt and the call leaves no orphaned tool result behind
+    await store.append_many("t1", [answer, thanks], scope="a")
+
+    assert await store.get("t1") == [answer, thanks]
+    assert await store.count("t1") == 2
+
+
+@pytest.mark.asyncio
+async def test_in_memory_trimming_shortens_checkpoints():
+    store = InMemoryMessageHistoryStore(max_messages_per_thread=4)
+    await store.append_many("t1", [_prompt(str(i)) for i in range(4)], scope="a")
+    await store.save_checkpoint("t1", HistoryCheckpoint(summary="s", covers=3), scope="a")
+
+    await store.append_many("t1", [_prompt("4"), _prompt("5")], scope="a")
+
+    # Two of the three messages it covered were trimmed
+    checkpoint = await store.load_checkpoint("t1", scope="a")
+    assert checkpoint is not None and checkpoint.covers == 1
+
+
+@pytest.mark.asyncio
+async def test_in_memory_forks_share_history_until_it_changes():
+    store = InMemoryMessageHistoryStore(max_messages_per_thread=4)
+    messages = [_prompt(str(i)) for i in range(6)]
+    await store.append_many("t1", messages[:3], scope="a")
+    await store.fork("t1", "t2")
+    await store.fork("t2", "t3", at=2)
+    assert store.thread_nbytes("t2") == store.thread_nbytes("t3") == 0
+
+    # Trimming the original copies the prefix of its forks first
+    await store.append_many("t1", messages[3:], scope="a")
+    assert await store.get("t1") == messages[2:]
+    assert await store.get("t2") == messages[:3]
+    assert await store.get("t3") == messages[:2]
+    assert store.thread_nbytes("t2") > 0
+
+    # And so does deleting it
+    await store.delete("t2")
+    assert await store.get("t3") == messages[:2]
+
+
+@pytest.mark.asyncio
+async def test_in_memory_caps_approximate_size():
+    store = InMemoryMessageHistoryStore(max_bytes=2_000)
+    await store.append("t1", _prompt("x" * 500))
+    await store.append("t2", _prompt("x" * 500))
+    assert 1_000 < store.nbytes == store.thread_nbytes("t1") + store.thread_nbytes("t2") < 2_000
+
+    # Over the cap, other threads go first, then the written thread's oldest messages
+    big = [_prompt("y" * 800) for _ in range(3)]
+    await store.append_many("t2", big)
+    assert store.num_threads == 1
+    assert await store.get("t2") == big[1:]
+    assert store.nbytes <= 2_000
+
+    # A single message above the cap is still kept
+    huge = _prompt("z" * 5_000)
+    await store.append("t2", huge)
+    assert await store.get("t2") == [huge]
+
+
+@pytest.mark.asyncio
+async def test_in_memory_expires_idle_threads(monkeypatch):
+    import calfkit.stores.in_memory as in_memory_module
+
+    now = 1_000.0
+    monkeypatch.setattr(in_memory_module, "monotonic", lambda: now)
+    store = InMemoryMessageHistoryStore(ttl=60)
+    await store.append("idle", _prompt("1"))
+    await store.append("active", _prompt("2"))
+
+    now += 45
+    await store.get("active")
+    now += 30
+
+    assert await store.get("idle") == []
+    assert await store.count("active") == 1
+    assert store.num_threads == 1
+
+
+def test_in_memory_rejects_non_positive_limits():
+    with pytest.raises(ValueError, match="max_threads"):
+        InMemoryMessageHistoryStore(max_threads=0)
+
+
+# Test: Write-behind caching store
+
+
+class _RecordingStore(InMemoryMessageHistoryStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes: list[tuple[str, str | None, int]] = []
+        self.reads = 0
+        self.fail_next_write = False
+
+    async def append_many(self, thread_id, messages, scope=None, **kwargs):
+        if self.fail_next_write:
+            self.fail_next_write = False
+            raise ConnectionError("backend unavailable")
+        self.writes.append((thread_id, scope, len(messages)))
+        await super().append_many(thread_id, messages, scope, **kwargs)
+
+    async def get(self, thread_id, scope=None):
+        self.reads += 1
+        return await super().get(thread_id, scope)
+
+
+@pytest.mark.asyncio
+async def test_cached_store_coalesces_writes_per_thread_and_scope():
+    backend = _RecordingStore()
+    store = CachedMessageHistoryStore(backend, flush_interval=60)
+    messages = [_prompt(str(i)) for i in range(6)]
+    await store.append("t1", messages[0], scope="a")
+    await store.append_many("t1", messages[1:3], scope="a")
+    await store.append("t1", messages[3], scope="b")
+    await store.append("t1", messages[4], scope="a")
+    await store.append("t2", messages[5], scope="a")
+
+    # Reads see unflushed writes
+    assert await store.get("t1") == messages[:5]
+    assert await store.get("t1", scope="a") == messages[:3] + [messages[4]]
+    assert backend.writes == []
+
+    await store.close()
+    assert backend.writes == [("t1", "a", 3), ("t1", "b", 1), ("t1", "a", 1), ("t2", "a", 1)]
+    assert await backend.get("t1") == messages[:5]
+
+
+@pytest.mark.asyncio
+async def test_cached_store_serves_reads_from_cache():
+    backend = _RecordingStore()
+    await backend.append_many("t1", [_prompt("0"), _prompt("1")], scope="a")
+    store = CachedMessageHistoryStore(backend, flush_interval=0.01)
+
+    assert len(await store.get("t1", scope="a")) == 2
+    await store.append("t1", _prompt("2"), scope="a")
+    assert await store.count("t1", scope="a") == 3
+    assert len(await store.get_since("t1", 2, scope="a")) == 1
+    assert backend.reads == 1
+
+    # Flushed in the background after flush_interval
+    await wait_for_condition(lambda: len(backend.writes) == 1, timeout=1.0)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_store_keeps_version_when_loading_on_read():
+    backend = _RecordingStore()
+    await backend.append_many("t1", [_prompt("0")], scope="a")
+    store = CachedMessageHistoryStore(backend, flush_interval=60)
+
+    # Reading an uncached thread loads it without changing the version a caller already saw
+    version = await store.version("t1", scope="a")
+    assert len(await store.get("t1", scope="a")) == 1
+    assert await store.version("t1", scope="a") == version
+
+    await store.append_many("t1", [_prompt("1")], scope="a", expected_version=version)
+    assert await store.version("t1", scope="a") > version
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_store_keeps_failed_writes_queued():
+    backend = _RecordingStore()
+    store = CachedMessageHistoryStore(backend, flush_interval=60)
+    messages = [_prompt(str(i)) for i in range(3)]
+    await store.append("t1", messages[0])
+    backend.fail_next_write = True
+    with pytest.raises(ConnectionError):
+        await store.flush()
+
+    await store.append_many("t1", messages[1:])
+    await store.close()
+    assert backend.writes == [("t1", None, 3)]
+    assert await backend.get("t1") == messages
+
+
+@pytest.mark.asyncio
+async def test_cached_store_retries_failed_background_flushes(caplog):
+    backend = _RecordingStore()
+    store = CachedMessageHistoryStore(backend, flush_interval=0.01)
+    backend.fail_next_write = True
+    await store.append("t1", _prompt("0"))
+
+    # Retried without waiting for another write
+    await wait_for_condition(lambda: backend.writes == [("t1", None, 1)], timeout=1.0)
+    assert "Flushing queued writes to _RecordingStore failed" in caplog.text
+    assert store.flush_error is None
+    await store.close()
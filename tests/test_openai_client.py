@@ -0,0 +1,47 @@
+from calfkit._vendor.pydantic_ai.models import ModelRequestParameters
+from calfkit.models.tool_bundle import ToolBundle
+from calfkit.nodes.base_tool_node import agent_tool
+from calfkit.providers import OpenAIModelClient
+
+
+@agent_tool
+def lookup(query: str) -> str:
+    """Look something up.
+
+    Args:
+        query (str): What to look up
+
+    Returns:
+        str: The result
+    """
+    return query
+
+
+def test_tool_mapping_is_memoized_per_bundle(monkeypatch):
+    client = OpenAIModelClient("gpt-4o-mini", api_key="test-key")
+    bundle = ToolBundle.from_tools([lookup.tool_schema])
+    mapped: list[str] = []
+    original_map = client._map_tool_definition
+
+    def counting_map(tool_def):
+        mapped.append(tool_def.name)
+        return original_map(tool_def)
+
+    monkeypatch.setattr(client, "_map_tool_definition", counting_map)
+
+    for _ in range(3):
+        _, params = client.prepare_request(None, bundle.parameters)
+        tools = client._get_tools(params)
+        assert [tool["function"]["name"] for tool in tools] == ["lookup"]
+    assert mapped == ["lookup"]
+
+    # An equal but distinct parameters object is mapped again
+    client._get_tools(ModelRequestParameters(function_tools=[lookup.tool_schema]))
+    assert mapped == ["lookup", "lookup"]
+
+
+def test_tool_bundle_digest_is_content_based():
+    first = ToolBundle.from_tools([lookup.tool_schema])
+    second = ToolBundle.from_tools([lookup.tool_schema])
+    assert first.digest == second.digest
+    assert ToolBundle.from_tools([]).digest != first.digest
@@ -0,0 +1,156 @@
+import asyncio
+from contextlib import contextmanager
+from time import monotonic
+
+import pytest
+from faststream.kafka import TestKafkaBroker
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelRequest, ModelResponse, TextPart, models
+from calfkit._vendor.pydantic_ai.exceptions import ModelHTTPError
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit._vendor.pydantic_ai.usage import RequestUsage
+from calfkit.broker.broker import BrokerClient
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.providers import ProviderRateLimiter
+from calfkit.runners.service import NodesService
+from calfkit.runners.service_client import RouterServiceClient
+
+MESSAGES = [ModelRequest.user_text_prompt("hi")]
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+class _WaitRecorder:
+    def __init__(self) -> None:
+        self.waits = 0
+
+    @contextmanager
+    def __call__(self):
+        self.waits += 1
+        yield
+
+
+@pytest.mark.asyncio
+async def test_token_budget_is_settled_with_actual_usage():
+    # 1000 tokens per second; each call is estimated at 100 tokens
+    limiter = ProviderRateLimiter(tokens_per_minute=60_000, estimator=lambda message: 100)
+    recorder = _WaitRecorder()
+
+    async with limiter.limit(MESSAGES, while_waiting=recorder()) as permit:
+        permit.record(RequestUsage(input_tokens=50_000, output_tokens=9_995))
+    assert recorder.waits == 0
+
+    started = monotonic()
+    async with limiter.limit(MESSAGES, while_waiting=recorder()):
+        pass
+    # The first call used nearly the whole budget, so the second waited for a refill
+    assert recorder.waits == 1
+    assert monotonic() - started >= 0.05
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_halves_on_429_and_grows_back():
+    limiter = ProviderRateLimiter(max_concurrency=4, latency_tolerance=100.0)
+
+    with pytest.raises(ModelHTTPError):
+        async with limiter.limit(MESSAGES):
+            raise ModelHTTPError(429, "test-model")
+    assert limiter.concurrency_limit == 2
+
+    release = asyncio.Event()
+    order: list[str] = []
+
+    async def call(label: str) -> None:
+        async with limiter.limit(MESSAGES):
+            order.append(f"{label}-start")
+            await release.wait()
+            await asyncio.sleep(0.01)
+
+    tasks = [asyncio.create_task(call(label)) for label in "abc"]
+    await asyncio.sleep(0.01)
+    # Only two calls are admitted at the new limit
+    assert order == ["a-start", "b-start"] and limiter.in_flight == 2
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order[2] == "c-start"
+    assert 2 < limiter.concurrency_limit <= 4
+
+
+@pytest.mark.asyncio
+async def test_rising_latency_backs_off():
+    limiter = ProviderRateLimiter(max_concurrency=8, latency_tolerance=2.0)
+    async with limiter.limit(MESSAGES):
+        pass
+    async with limiter.limit(MESSAGES):
+        await asyncio.sleep(0.02)
+    assert limiter.concurrency_limit == 4
+
+
+class _FakeConsumer:
+    def __init__(self) -> None:
+        self.partitions = {"p0", "p1"}
+        self.paused_partitions: set[str] = set()
+
+    def assignment(self) -> set[str]:
+        return self.partitions
+
+    def pause(self, *partitions: str) -> None:
+        self.paused_partitions.update(partitions)
+
+    def paused(self) -> set[str]:
+        return set(self.paused_partitions)
+
+    def resume(self, *partitions: str) -> None:
+        self.paused_partitions.difference_update(partitions)
+
+
+class _Message:
+    def __init__(self, consumer: _FakeConsumer) -> None:
+        self.consumer = consumer
+
+
+def test_waiting_calls_pause_the_consumer_until_the_last_one_is_admitted():
+    chat_node = ChatNode(FunctionModel(lambda messages, info: ModelResponse(parts=[])))
+    consumer = _FakeConsumer()
+
+    with chat_node._pause_consumer(_Message(consumer)):
+        assert consumer.paused_partitions == {"p0", "p1"}
+        with chat_node._pause_consumer(_Message(consumer)):
+            pass
+        assert consumer.paused_partitions == {"p0", "p1"}
+    assert consumer.paused_partitions == set()
+
+
+def echo_model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return ModelResponse(parts=[TextPart(f"echo: {messages[-1].parts[0].content}")])
+
+
+@pytest.mark.asyncio
+async def test_chat_node_calls_the_model_through_the_limiter():
+    limiter = ProviderRateLimiter(requests_per_minute=3)
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(echo_model), rate_limiter=limiter)
+    router_node = AgentRouterNode(chat_node=chat_node)
+    service.register_node(chat_node)
+    service.register_node(router_node)
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node)
+        response = await client.request(user_prompt="hello")
+        final_msg = await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+        await client.close()
+
+    assert isinstance(final_msg, ModelResponse)
+    assert final_msg.text == "echo: hello"
+    assert limiter.in_flight == 0
+    assert limiter._requests is not None and limiter._requests.available < 3
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+from faststream.kafka import TestKafkaBroker
+
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    models,
+)
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.broker.broker import BrokerClient
+from calfkit.caches import FileSystemResponseCache, InMemoryResponseCache, response_cache_key
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.runners.service import NodesService
+from calfkit.runners.service_client import RouterServiceClient
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+class CountingModel:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def respond(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        self.calls += 1
+        return ModelResponse(parts=[TextPart(f"answer {self.calls}")])
+
+
+def test_cache_key_ignores_timestamps_but_not_content():
+    first = [ModelRequest.user_text_prompt("hi")]
+    replayed = [ModelRequest.user_text_prompt("hi")]
+
+    key = response_cache_key("test:model", first)
+    assert response_cache_key("test:model", replayed) == key
+    assert response_cache_key("test:other", replayed) != key
+    assert response_cache_key("test:model", [ModelRequest.user_text_prompt("hey")]) != key
+    assert response_cache_key("test:model", replayed, model_settings={"temperature": 1}) != key
+
+
+def test_cache_key_keeps_volatile_named_fields_of_tool_payloads():
+    def tool_round(args: dict, result: dict) -> list[ModelMessage]:
+        return [
+            ModelRequest.user_text_prompt("quote?"),
+            ModelResponse(parts=[ToolCallPart("quote", args, tool_call_id="call-1")]),
+            ModelRequest(parts=[ToolReturnPart("quote", result, tool_call_id="call-1")]),
+        ]
+
+    key = response_cache_key("test:model", tool_round({"usage": 1}, {"timestamp": 1}))
+    assert response_cache_key("test:model", tool_round({"usage": 1}, {"timestamp": 1})) == key
+    assert response_cache_key("test:model", tool_round({"usage": 2}, {"timestamp": 1})) != key
+    assert response_cache_key("test:model", tool_round({"usage": 1}, {"timestamp": 2})) != key
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "filesystem"])
+async def test_cache_entries_expire(backend, tmp_path, monkeypatch):
+    if backend == "memory":
+        cache = InMemoryResponseCache(maxsize=2, ttl=10)
+        clock_name = "calfkit.caches.in_memory.monotonic"
+    else:
+        cache = FileSystemResponseCache(tmp_path, ttl=10)
+        clock_name = "calfkit.caches.filesystem.time"
+    now = 1_000.0
+    monkeypatch.setattr(clock_name, lambda: now)
+    key = "a" * 64
+    response = ModelResponse(parts=[TextPart("cached")])
+
+    await cache.put(key, response)
+    assert await cache.get(key) == response
+    now += 11
+    assert await cache.get(key) is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert cache.stats.hit_rate == 0.5
+
+
+@pytest.mark.asyncio
+async def test_chat_node_serves_repeated_requests_from_cache():
+    model = CountingModel()
+    cache = InMemoryResponseCache()
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(model.respond), response_cache=cache)
+    router_node = AgentRouterNode(chat_node=chat_node, system_prompt="Be brief.")
+    service.register_node(chat_node)
+    service.register_node(router_node)
+
+    async def ask(**kwargs) -> str:
+        response = await client.request(user_prompt="same question", **kwargs)
+        final_msg = await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+        assert isinstance(final_msg, ModelResponse)
+        return final_msg.text or ""
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node)
+        assert await ask() == "answer 1"
+        assert await ask() == "answer 1"
+        assert await ask(bypass_response_cache=True) == "answer 2"
+        # The bypassed request refreshed the cached response
+        assert await ask() == "answer 2"
+        await client.close()
+
+    assert model.calls == 2
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+
+
+class SlowModel:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def respond(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        self.calls += 1
+        answer = f"answer {self.calls}"
+        await asyncio.sleep(0.05)
+        return ModelResponse(parts=[TextPart(answer)])
+
+
+@pytest.mark.asyncio
+async def test_chat_node_single_flight_collapses_identical_concurrent_requests():
+    model = SlowModel()
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(model.respond), single_flight=True)
+    router_node = AgentRouterNode(chat_node=chat_node)
+    service.register_node(chat_node)
+    service.register_node(router_node)
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node)
+        responses = await asyncio.gather(
+            *(client.request(user_prompt="tick 42") for _ in range(5)),
+            client.request(user_prompt="tick 43"),
+        )
+        final_msgs = [
+            await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+            for response in responses
+        ]
+        await client.close()
+
+    assert model.calls == 2
+    assert all(isinstance(msg, ModelResponse) for msg in final_msgs)
+    assert len({msg.text for msg in final_msgs[:5]}) == 1
+    assert final_msgs[5].text != final_msgs[0].text
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from faststream.kafka import TestKafkaBroker
+from faststream.kafka.annotations import KafkaMessage
+
+from calfkit._vendor.pydantic_ai import ModelRequest, ModelResponse, TextPart, ToolCallPart
+from calfkit.broker import (
+    BrokerClient,
+    MsgPackEnvelopeCodec,
+    RoutingHeaders,
+    decode_envelope,
+    defer_envelope_decoding,
+)
+from calfkit.models.delegation import DelegationFrame
+from calfkit.models.envelope_view import EventEnvelopeView
+from calfkit.models.event_envelope import EventEnvelope
+from tests.utils import wait_for_condition
+
+
+def make_envelope() -> EventEnvelope:
+    envelope = EventEnvelope(
+        thread_id="thread-1",
+        agent_name="agent",
+        tool_call_request=ToolCallPart("get_weather", {"location": "Tokyo"}, tool_call_id="c1"),
+        delegation_stack=[
+            DelegationFrame(caller_private_topic="caller", tool_call_id="d1", tool_name="delegate")
+        ],
+        message_history=[
+            ModelRequest.user_text_prompt("hi"),
+            ModelResponse(parts=[TextPart("hello")]),
+        ],
+    )
+    envelope.mark_as_end_of_turn()
+    return envelope
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec", [None, MsgPackEnvelopeCodec(compress=True)])
+async def test_routing_headers_and_deferred_decoding(codec):
+    """Routing metadata is readable from headers, and the body decodes on demand."""
+    broker = BrokerClient(codec=codec)
+    received: list[tuple[RoutingHeaders, EventEnvelope]] = []
+
+    @broker.subscriber("observed", decoder=defer_envelope_decoding)
+    async def observe(message: KafkaMessage) -> None:
+        routing = RoutingHeaders.from_headers(message.headers)
+        received.append((routing, decode_envelope(message.body, message.content_type)))
+
+    envelope = make_envelope()
+    async with TestKafkaBroker(broker) as _:
+        await broker.publish(envelope, topic="observed", correlation_id="routing-1")
+        await wait_for_condition(lambda: len(received) == 1, timeout=5.0)
+
+    routing, decoded = received[0]
+    assert routing == RoutingHeaders(
+        thread_id="thread-1",
+        agent_name="agent",
+        tool_name="get_weather",
+        final_response=True,
+        delegation_depth=1,
+    )
+    assert decoded.latest_message_in_history == envelope.latest_message_in_history
+
+
+def test_envelope_view_validates_history_lazily():
+    envelope = make_envelope()
+    data = json.loads(envelope.model_dump_json())
+    # A history entry the view never touches is never validated
+    data["message_history"][0] = {"kind": "not-a-message"}
+
+    view = EventEnvelopeView.model_validate(data)
+
+    assert view.thread_id == "thread-1"
+    assert view.is_end_of_turn
+    assert view.delegation_stack[0].tool_name == "delegate"
+    assert isinstance(view.latest_message_in_history, ModelResponse)
+    assert view.latest_message_in_history.text == "hello"
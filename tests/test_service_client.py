@@ -0,0 +1,108 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+from faststream.kafka import TestKafkaBroker
+
+from calfkit._vendor.pydantic_ai import ModelMessage, ModelResponse, TextPart, models
+from calfkit._vendor.pydantic_ai.models.function import AgentInfo, FunctionModel
+from calfkit.broker.broker import BrokerClient
+from calfkit.nodes.agent_router_node import AgentRouterNode
+from calfkit.nodes.chat_node import ChatNode
+from calfkit.runners.service import NodesService
+from calfkit.runners.service_client import RouterServiceClient
+
+
+@pytest.fixture(autouse=True)
+def block_model_requests():
+    """Block actual model requests during unit tests."""
+    original_value = models.ALLOW_MODEL_REQUESTS
+    models.ALLOW_MODEL_REQUESTS = False
+    yield
+    models.ALLOW_MODEL_REQUESTS = original_value
+
+
+def echo_model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return ModelResponse(parts=[TextPart(f"echo: {messages[-1].parts[0].content}")])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_reply_subscriber():
+    """Concurrent requests are demultiplexed by correlation_id over a single subscriber."""
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(FunctionModel(echo_model))
+    router_node = AgentRouterNode(chat_node=chat_node)
+    service.register_node(chat_node)
+    service.register_node(router_node)
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node)
+        responses = await asyncio.gather(
+            *(client.request(user_prompt=f"prompt {i}", correlation_id=f"c-{i}") for i in range(5))
+        )
+        subscriber = client._reply_subscriber
+        assert subscriber is not None
+
+        for i, response in enumerate(responses):
+            final_msg = await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+            assert isinstance(final_msg, ModelResponse)
+            assert final_msg.text == f"echo: prompt {i}"
+
+        assert client._reply_subscriber is subscriber
+        assert client._pending == {}
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_request_timeout_evicts_pending_response():
+    """An unanswered request fails with TimeoutError and is evicted from the demux table."""
+    broker = BrokerClient()
+    service = NodesService(broker)
+    # No chat node is registered, so the router never produces a final response
+    router_node = AgentRouterNode(chat_node=ChatNode(FunctionModel(echo_model)))
+    service.register_node(router_node)
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node, request_timeout=0.1)
+        response = await client.request(user_prompt="hello")
+
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+        assert client._pending == {}
+        await client.close()
+
+
+async def stream_echo_model(messages: list[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+    for token in ["Hel", "lo", " there"]:
+        yield token
+
+
+@pytest.mark.asyncio
+async def test_streaming_chat_node_publishes_coalesced_token_deltas():
+    """A streaming chat node publishes deltas that the client iterates before the reply."""
+    broker = BrokerClient()
+    service = NodesService(broker)
+    chat_node = ChatNode(
+        FunctionModel(stream_function=stream_echo_model),
+        stream=True,
+        stream_flush_chars=4,
+        stream_flush_interval=60,
+    )
+    router_node = AgentRouterNode(chat_node=chat_node)
+    service.register_node(chat_node)
+    service.register_node(router_node)
+
+    async with TestKafkaBroker(broker) as _:
+        client = RouterServiceClient(broker, router_node)
+        response = await client.request(user_prompt="hi")
+
+        deltas = [delta async for delta in response.token_stream()]
+        final_msg = await asyncio.wait_for(response.get_final_response(), timeout=5.0)
+
+        assert [delta.text for delta in deltas] == ["Hello", " there", ""]
+        assert deltas[-1].done and deltas[-1].end_of_turn
+        assert isinstance(final_msg, ModelResponse)
+        assert final_msg.text == "Hello there"
+        assert client._pending == {}
+        await client.close()
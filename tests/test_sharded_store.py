@@ -0,0 +1,187 @@
+import pytest
+
+from calfkit._vendor.pydantic_ai import ModelRequest
+from calfkit.models.history_checkpoint import HistoryCheckpoint
+from calfkit.stores import InMemoryMessageHistoryStore, ShardedMessageHistoryStore
+
+
+def _prompt(text: str) -> ModelRequest:
+    return ModelRequest.user_text_prompt(text)
+
+
+def _sharded(*names: str) -> ShardedMessageHistoryStore:
+    return ShardedMessageHistoryStore({name: InMemoryMessageHistoryStore() for name in names})
+
+
+THREADS = [f"thread-{i}" for i in range(2_000)]
+
+
+def test_adding_a_shard_only_moves_threads_to_it():
+    store = _sharded("a", "b", "c")
+    before = {thread_id: store.shard_for(thread_id) for thread_id in THREADS}
+    assert all(300 < list(before.values()).count(name) < 1_050 for name in "abc")
+
+    store.add_shard("d", InMemoryMessageHistoryStore())
+
+    moved = [thread_id for thread_id in THREADS if store.shard_for(thread_id) != before[thread_id]]
+    assert all(store.shard_for(thread_id) == "d" for thread_id in moved)
+    assert 0.1 < len(moved) / len(THREADS) < 0.4
+    with pytest.raises(ValueError):
+        store.add_shard("d", InMemoryMessageHistoryStore())
+
+
+@pytest.mark.asyncio
+async def test_moved_threads_are_served_from_both_shards_until_migrated():
+    store = _sharded("a", "b")
+    messages = [_prompt(str(i)) for i in range(4)]
+    for thread_id in THREADS[:50]:
+        await store.append_many(thread_id, messages[:2], scope="router")
+    removed_store = store.shards["b"]
+
+    assert store.remove_shard("b") is removed_store
+    with pytest.raises(RuntimeError):
+        store.add_shard("c", InMemoryMessageHistoryStore())
+    moved = [thread_id for thread_id in THREADS[:50] if store.moved(thread_id)]
+    assert moved and all(store.shard_for(thread_id) == "a" for thread_id in moved)
+
+    thread_id = moved[0]
+    version = await store.version(thread_id, scope="router")
+    await store.append_many(thread_id, messages[2:], scope="router", expected_version=version)
+    assert await store.get(thread_id, scope="router") == messages
+    assert await store.count(thread_id) == 4
+    assert await store.get_since(thread_id, 1, scope="router") == messages[1:]
+    assert await store.tail(thread_id, 3) == messages[1:]
+
+    for thread_id in moved:
+        await store.migrate(thread_id, scopes=["router"])
+    assert await removed_store.count(moved[0]) == 0
+    assert store.finish_rebalance() == {"b": removed_store}
+    assert await store.get(moved[0], scope="router") == messages
+    assert await store.get(moved[1], scope="router") == messages[:2]
+
+
+@pytest.mark.asyncio
+async def test_migrate_moves_unscoped_messages():
+    store = _sharded("a", "b")
+    messages = [_prompt(str(i)) for i in range(4)]
+    for thread_id in THREADS[:50]:
+        await store.append_many(thread_id, messages[:2], scope="router")
+        await store.append(thread_id, messages[2])
+    removed_store = store.remove_shard("b")
+    moved = [thread_id for thread_id in THREADS[:50] if store.moved(thread_id)]
+
+    await store.migrate(moved[0], scopes=["router"])
+    assert await removed_store.count(moved[0]) == 0
+    assert await store.get(moved[0]) == messages[:3]
+
+    # Unscoped messages on both shards cannot be merged in order: the rebalance waits
+    await store.append(moved[1], messages[3])
+    await store.migrate(moved[1], scopes=["router"])
+    assert await removed_store.count(moved[1]) == 1
+    with pytest.raises(RuntimeError, match=moved[1]):
+        store.finish_rebalance()
+    await store.delete(moved[1])
+    for thread_id in moved:
+        await store.migrate(thread_id, scopes=["router"])
+    assert store.finish_rebalance() == {"b": removed_store}
+    assert await store.get(moved[-1]) == messages[:3]
+
+
+class _RacingStore(InMemoryMessageHistoryStore):
+    """Has a message appended to a thread right after the thread is first read."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.racing: dict[str, ModelRequest] = {}
+
+    async def get(self, thread_id, scope=None):
+        messages = await super().get(thread_id, scope)
+        message = self.racing.pop(thread_id, None)
+        if message is not None:
+            await self.append(thread_id, message, scope)
+        return messages
+
+
+@pytest.mark.asyncio
+async def test_migrate_keeps_appends_racing_with_it():
+    owner = _RacingStore()
+    store = ShardedMessageHistoryStore({"a": owner, "b": InMemoryMessageHistoryStore()})
+    messages = [_prompt(str(i)) for i in range(4)]
+    thread_id = next(t for t in THREADS if store.shard_for(t) == "b")
+    await store.append_many(thread_id, messages[:2], scope="router")
+    store.remove_shard("b")
+    await store.append(thread_id, messages[2], scope="router")
+
+    owner.racing[thread_id] = messages[3]
+    await store.migrate(thread_id, scopes=["router"])
+
+    assert await store.get(thread_id, scope="router") == messages
+
+
+@pytest.mark.asyncio
+async def test_delete_only_touches_the_threads_shard():
+    store = _sharded("a", "b", "c")
+    for thread_id in THREADS[:30]:
+        await store.append(thread_id, _prompt(thread_id))
+    counts = {name: shard.num_threads for name, shard in store.shards.items()}
+
+    await store.delete(THREADS[0])
+
+    owner = store.shard_for(THREADS[0])
+    for name, shard in store.shards.items():
+        expected = counts[name] - 1 if name == owner else counts[name]
+        assert shard.num_threads == expected
+
+
+@pytest.mark.asyncio
+async def test_fork_across_shards_copies_each_scope():
+    store = _sharded("a", "b")
+    source = next(t for t in THREADS if store.shard_for(t) == "a")
+    whole, partial = [t for t in THREADS if store.shard_for(t) == "b"][:2]
+    a0, b0, a1, u0, b1 = (_prompt(text) for text in ("a0", "b0", "a1", "u0", "b1"))
+    for message, scope in ((a0, "a"), (b0, "b"), (a1, "a"), (u0, None), (b1, "b")):
+        await store.append(source, message, scope=scope)
+    await store.save_checkpoint(source, HistoryCheckpoint(summary="s", covers=2), scope="a")
+
+    await store.fork(source, whole, scopes=["a", "b"])
+    await store.fork(source, partial, at=4, scopes=["a", "b"])
+
+    assert await store.get(whole, scope="a") == [a0, a1]
+    assert await store.get(whole, scope="b") == [b0, b1]
+    assert await store.count(whole) == 5
+    assert await store.load_checkpoint(whole, scope="a") == HistoryCheckpoint(summary="s", covers=2)
+    assert await store.get(partial, scope="b") == [b0]
+    assert await store.get(partial) == [a0, a1, b0, u0]
+    # The staging fork on the source shard is gone
+    assert store.shards["a"].num_threads == 1
+    with pytest.raises(ValueError):
+        await store.fork(source, whole, scopes=["a", "b"])
+    # Without the scopes, they would be lost in the copy
+    other = [t for t in THREADS if store.shard_for(t) == "b"][2]
+    with pytest.raises(ValueError, match="scopes"):
+        await store.fork(source, other)
+    assert await store.count(other) == 0
+
+
+class _FailingStore(InMemoryMessageHistoryStore):
+    async def get(self, thread_id, scope=None):
+        raise ConnectionError("shard unavailable")
+
+
+@pytest.mark.asyncio
+async def test_per_shard_latency_stats():
+    store = ShardedMessageHistoryStore(
+        {"up": InMemoryMessageHistoryStore(), "down": _FailingStore()}
+    )
+    up_thread = next(t for t in THREADS if store.shard_for(t) == "up")
+    down_thread = next(t for t in THREADS if store.shard_for(t) == "down")
+
+    await store.append(up_thread, _prompt("hi"))
+    await store.get(up_thread)
+    with pytest.raises(ConnectionError):
+        await store.get(down_thread)
+
+    stats = store.stats()
+    assert stats["up"].calls == 2 and stats["up"].errors == 0
+    assert stats["down"].calls == 1 and stats["down"].errors == 1
+    assert 0 < stats["up"].mean_seconds <= stats["up"].max_seconds
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from calfkit.utils import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_with_the_same_key_share_one_call():
+    flights: SingleFlight[str] = SingleFlight()
+    started: list[str] = []
+
+    async def call(key: str) -> str:
+        started.append(key)
+        await asyncio.sleep(0.01)
+        return f"result {key}"
+
+    results = await asyncio.gather(
+        *(flights.do(key, lambda key=key: call(key)) for key in ["a", "a", "b", "a"])
+    )
+
+    assert started == ["a", "b"]
+    assert [result for result, _ in results] == ["result a", "result a", "result b", "result a"]
+    assert [shared for _, shared in results] == [False, True, False, True]
+    # Nothing is kept once the call completes
+    assert len(flights) == 0
+    assert await flights.do("a", lambda: call("a")) == ("result a", False)
+
+
+@pytest.mark.asyncio
+async def test_call_survives_cancelled_callers_and_shares_exceptions():
+    flights: SingleFlight[str] = SingleFlight()
+    release = asyncio.Event()
+
+    async def call() -> str:
+        await release.wait()
+        raise ConnectionError("provider down")
+
+    first = asyncio.create_task(flights.do("k", call))
+    second = asyncio.create_task(flights.do("k", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    with pytest.raises(ConnectionError):
+        await second
+
+    # Cancelling every caller cancels the call
+    only = asyncio.create_task(flights.do("k", asyncio.Event().wait))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0)
+    assert len(flights) == 0
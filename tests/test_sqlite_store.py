@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from calfkit._vendor.pydantic_ai import (
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from calfkit.stores import SQLiteMessageHistoryStore
+
+
+def _request(text: str) -> ModelRequest:
+    return ModelRequest(parts=[UserPromptPart(content=text)])
+
+
+def _response(text: str) -> ModelResponse:
+    return ModelResponse(parts=[TextPart(content=text)])
+
+
+@pytest.mark.asyncio
+async def test_round_trip_preserves_messages_and_order(tmp_path):
+    store = SQLiteMessageHistoryStore(tmp_path / "history.db")
+    messages = [
+        _request("hi"),
+        ModelResponse(parts=[ToolCallPart(tool_name="lookup", args={"q": "x"})]),
+        # Large enough to be stored compressed
+        _response("long answer " * 200),
+    ]
+    try:
+        await store.append("t1", messages[0])
+        await store.append_many("t1", messages[1:])
+        assert await store.get("t1") == messages
+        assert await store.get("unknown") == []
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_scopes_filter_and_interleave(tmp_path):
+    store = SQLiteMessageHistoryStore(tmp_path / "history.db")
+    a1, b1, a2, shared = _request("a"), _request("b"), _response("a2"), _response("shared")
+    try:
+        await store.append("t1", a1, scope="agent_a")
+        await store.append("t1", b1, scope="agent_b")
+        await store.append("t1", a2, scope="agent_a")
+        await store.append("t1", shared)
+
+        assert await store.get("t1", scope="agent_a") == [a1, a2]
+        assert await store.get("t1", scope="agent_b") == [b1]
+        # Without a scope, every message of the thread comes back in append order
+        assert await store.get("t1") == [a1, b1, a2, shared]
+
+        await store.delete("t1", scope="agent_a")
+        assert await store.get("t1") == [b1, shared]
+        await store.delete("t1")
+        assert await store.get("t1") == []
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_history_survives_reopening(tmp_path):
+    path = tmp_path / "history.db"
+    messages = [_request("hi"), _response("hello"), _request("again")]
+    store = SQLiteMessageHistoryStore(path)
+    await store.append_many("t1", messages[:2], scope="agent")
+    await store.close()
+
+    reopened = SQLiteMessageHistoryStore(path)
+    try:
+        await reopened.append("t1", messages[2], scope="agent")
+        assert await reopened.get("t1", scope="agent") == messages
+    finally:
+        await reopened.close()
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        seqs = [row[0] for row in connection.execute("SELECT seq FROM messages ORDER BY id")]
+    assert seqs == [0, 1, 2]
@@ -2,6 +2,18 @@ import asyncio
 import time
 from collections.abc import Callable
 
+from calfkit._vendor.pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from calfkit.models.event_envelope import EventEnvelope
+
 
 async def wait_for_condition(
     predicate: Callable[[], bool],
@@ -27,3 +39,41 @@ async def wait_for_condition(
         if elapsed > timeout:
             raise asyncio.TimeoutError(f"Condition not met within {timeout}s timeout")
         await asyncio.sleep(poll_interval)
+
+
+def conversation_turn(i: int, *, with_tool: bool = False) -> list[ModelMessage]:
+    """One user turn of about 100 tokens per message."""
+    text = f"turn {i} " + "x" * 400
+    if not with_tool:
+        return [
+            ModelRequest(parts=[UserPromptPart(text)]),
+            ModelResponse(parts=[TextPart(text)]),
+        ]
+    return [
+        ModelRequest(parts=[UserPromptPart(text)]),
+        ModelResponse(parts=[ToolCallPart("lookup", {"q": i}, tool_call_id=f"call-{i}")]),
+        ModelRequest(parts=[ToolReturnPart("lookup", text, tool_call_id=f"call-{i}")]),
+        ModelResponse(parts=[TextPart(text)]),
+    ]
+
+
+def conversation(
+    turns: int, *, with_tool: bool = False, system_prompt: str | None = None
+) -> list[ModelMessage]:
+    """``turns`` conversation turns, after a system prompt if one is given."""
+    messages: list[ModelMessage] = []
+    if system_prompt is not None:
+        messages.append(ModelRequest(parts=[SystemPromptPart(system_prompt)]))
+    for i in range(turns):
+        messages.extend(conversation_turn(i, with_tool=with_tool))
+    return messages
+
+
+class RecordingBroker:
+    """Stands in for a broker, recording the envelopes published to it."""
+
+    def __init__(self) -> None:
+        self.published: list[EventEnvelope] = []
+
+    async def publish(self, message, topic, **kwargs):
+        self.published.append(message)